@@ -1,16 +1,93 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from typing import Dict, Any
+from itertools import islice
+import base64
+import json
+import os
+import time
 from db_engine import *
+from metrics import prometheus
+from sharding import ShardedDB
+from replication import ReplicaDB, ReplicationServer, parse_address
 
 app = Flask(__name__)
-db = SimpleDB("mydb")  # Initialize the database
+
+# Initialize the database. With SIMPLEDB_SHARDS=N (N > 1) tables are
+# partitioned over N worker processes and this process only routes.
+# With SIMPLEDB_REPLICATE_FROM=host:port (or a Unix socket path) this
+# process is a read-only replica of that primary; a primary accepts
+# replicas on SIMPLEDB_REPLICATION_LISTEN. Both sides authenticate with
+# the secret in SIMPLEDB_REPLICATION_KEY, which has no default.
+SHARDS = int(os.environ.get("SIMPLEDB_SHARDS", "1"))
+REPLICATE_FROM = os.environ.get("SIMPLEDB_REPLICATE_FROM")
+REPLICATION_LISTEN = os.environ.get("SIMPLEDB_REPLICATION_LISTEN")
+REPLICATION_KEY = os.environ.get("SIMPLEDB_REPLICATION_KEY", "").encode()
+if (REPLICATE_FROM or REPLICATION_LISTEN) and not REPLICATION_KEY:
+    raise RuntimeError("Replication needs SIMPLEDB_REPLICATION_KEY set to a secret shared by the primary "
+                       "and its replicas")
+replication = None
+if REPLICATE_FROM:
+    db = ReplicaDB("mydb_replica", parse_address(REPLICATE_FROM), REPLICATION_KEY, metrics=True)
+elif SHARDS > 1:
+    db = ShardedDB("mydb", SHARDS, metrics=True)
+else:
+    db = SimpleDB("mydb", metrics=True)
+    if REPLICATION_LISTEN:
+        replication = ReplicationServer(db, parse_address(REPLICATION_LISTEN), REPLICATION_KEY)
+
+# Endpoints a replica serves besides reads: they only tune its own copy
+REPLICA_LOCAL_ENDPOINTS = {"record_cache", "compact"}
+
+# Time every request when the database keeps metrics. Streamed responses
+# are timed until the server closes them after sending the last chunk.
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+# Replicas apply changes from their primary only
+@app.before_request
+def reject_replica_writes():
+    if isinstance(db, ReplicaDB) and request.method != 'GET' and request.endpoint not in REPLICA_LOCAL_ENDPOINTS:
+        return jsonify({"error": "Error: This is a read-only replica; send writes to the primary"}), 403
+
+@app.after_request
+def record_request(response):
+    start = g.pop('request_start', None)
+    if db.metrics is not None and start is not None:
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        method, status = request.method, response.status_code
+        observe = lambda: db.metrics.observe_request(rule, method, status, time.perf_counter() - start)
+        if response.is_streamed:
+            response.call_on_close(observe)
+        else:
+            observe()
+    return response
 
 # Endpoint to create a new table in the database
 @app.route('/create_table', methods=['POST'])
 def create_table():
     table_name = request.json.get('table_name')
-    result = db.create_table(table_name)
-    db.save_db()  # Save the database after creating the table
+    order = request.json.get('order')  # Optional per-table fanout
+    key_type = request.json.get('key_type')  # "int"/"float" packed, "str" prefix-compressed
+    value_codec = request.json.get('value_codec')  # "json" or "json+zlib" to store records as bytes
+    boundaries = request.json.get('boundaries')  # Sharded mode: partition by these key ranges
+    if boundaries is None:
+        result = db.create_table(table_name, order, key_type, value_codec)
+    elif isinstance(db, ShardedDB):
+        result = db.create_table(table_name, order, key_type, value_codec, boundaries)
+    else:
+        return jsonify({"error": "Boundaries are only used when the database is sharded"}), 400
+    if "Error" in result:
+        return jsonify({"error": result}), 400
+    return jsonify({"message": result})
+
+# Endpoint to drop a table and its records
+@app.route('/drop_table', methods=['DELETE'])
+def drop_table():
+    table_name = request.json.get('table_name')
+    result = db.drop_table(table_name)
+    if "Error" in result:
+        return jsonify({"error": result}), 404
     return jsonify({"message": result})
 
 # Endpoint to insert a new record into a table
@@ -29,6 +106,126 @@ def insert_record():
         return jsonify({"error": result}), 400
     return jsonify({"message": result})
 
+def parse_bulk_records(rows):
+    records = []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict) or 'key' not in row:
+            raise ValueError(f"Record {i} must be an object with a 'key'")
+        data = row.get('data', {})
+        if not isinstance(data, dict):
+            raise ValueError(f"Record {i}: data must be a dictionary")
+        records.append((row['key'], data))
+    return records
+
+def iter_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+# Endpoint to load many records at once. Accepts a JSON array (or an object
+# with a "records" array) or an NDJSON stream of {"key": ..., "data": ...}.
+@app.route('/bulk_insert', methods=['POST'])
+def bulk_insert():
+    table_name = request.args.get('table_name')
+    fill_factor = request.args.get('fill_factor', DEFAULT_FILL_FACTOR, type=float)
+
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            rows = iter_ndjson(request.stream)
+        else:
+            body = request.get_json()
+            if isinstance(body, dict):
+                table_name = body.get('table_name', table_name)
+                fill_factor = body.get('fill_factor', fill_factor)
+                rows = body.get('records', [])
+            else:
+                rows = body
+            if not isinstance(rows, list):
+                return jsonify({"error": "Records must be a JSON array"}), 400
+        records = parse_bulk_records(rows)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = db.bulk_insert(table_name, records, fill_factor)
+    if "Error" in result:
+        return jsonify({"error": result}), 400
+    return jsonify({"message": result})
+
+def batch_results(keys, results, field):
+    # One entry per key, carrying either the result under `field` or an error
+    return [{"key": key, "error": result} if isinstance(result, str) and result.startswith("Error")
+            else {"key": key, field: result} for key, result in zip(keys, results)]
+
+# Endpoint to read many records in one request: {"table_name": ..., "keys": [...]}
+@app.route('/multi_get', methods=['POST'])
+def multi_get():
+    table_name = request.json.get('table_name')
+    keys = request.json.get('keys')
+    if not isinstance(keys, list):
+        return jsonify({"error": "Keys must be a JSON array"}), 400
+
+    result = db.multi_get(table_name, keys)
+    if isinstance(result, str):
+        return jsonify({"error": result}), 404
+    return jsonify({"results": batch_results(keys, result, "record")})
+
+# Endpoint to insert or update many records in one request:
+# {"table_name": ..., "records": [{"key": ..., "data": {...}}, ...]}
+@app.route('/multi_put', methods=['PUT'])
+def multi_put():
+    table_name = request.json.get('table_name')
+    rows = request.json.get('records')
+    if not isinstance(rows, list):
+        return jsonify({"error": "Records must be a JSON array"}), 400
+    try:
+        records = parse_bulk_records(rows)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = db.multi_put(table_name, records)
+    if isinstance(result, str):
+        return jsonify({"error": result}), 400
+    return jsonify({"results": batch_results([key for key, _ in records], result, "message")})
+
+# Endpoint to delete many records in one request: {"table_name": ..., "keys": [...]}
+@app.route('/multi_delete', methods=['DELETE'])
+def multi_delete():
+    table_name = request.json.get('table_name')
+    keys = request.json.get('keys')
+    if not isinstance(keys, list):
+        return jsonify({"error": "Keys must be a JSON array"}), 400
+
+    result = db.multi_delete(table_name, keys)
+    if isinstance(result, str):
+        return jsonify({"error": result}), 404
+    return jsonify({"results": batch_results(keys, result, "message")})
+
+# Endpoint to create a secondary index on a record field
+@app.route('/create_index', methods=['POST'])
+def create_index():
+    table_name = request.json.get('table_name')
+    field = request.json.get('field')
+    result = db.create_index(table_name, field)
+    if "Error" in result:
+        return jsonify({"error": result}), 400
+    return jsonify({"message": result})
+
+# Endpoint to find records by an indexed field, e.g.
+# /query?table_name=users&field=age&gte=30&lt=40
+@app.route('/query', methods=['GET'])
+def query():
+    table_name = request.args.get('table_name')
+    field = request.args.get('field')
+    predicates = {op: parse_key(request.args.get(op)) for op in ('eq', 'gt', 'gte', 'lt', 'lte')
+                  if request.args.get(op) is not None}
+    limit = request.args.get('limit', type=int)
+
+    result = db.query(table_name, field, limit=limit, **predicates)
+    if isinstance(result, str):
+        return jsonify({"error": result}), 400
+    return jsonify({"records": result})
+
 # Endpoint to update an existing record in a table
 @app.route('/update_record', methods=['PUT'])
 def update_record():
@@ -41,10 +238,56 @@ def update_record():
         return jsonify({"error": "Data must be a dictionary"}), 400
 
     result = db.update(table_name, key, data)
+    if "does not match the key type" in result:
+        return jsonify({"error": result}), 400
     if "Error" in result:
         return jsonify({"error": result}), 404
     return jsonify({"message": result})
 
+# Endpoint to insert a record or replace an existing one in one step
+@app.route('/upsert_record', methods=['PUT'])
+def upsert_record():
+    table_name = request.json.get('table_name')
+    key = request.json.get('key')
+    data = request.json.get('data', {})
+
+    # Ensure the data is a dictionary
+    if not isinstance(data, dict):
+        return jsonify({"error": "Data must be a dictionary"}), 400
+
+    result = db.upsert(table_name, key, data)
+    if "Error" in result:
+        return jsonify({"error": result}), 400
+    return jsonify({"message": result})
+
+# Endpoint to update a record only if nobody changed it since it was read.
+# Pass either "expected" (the record as read) or "expected_version" (the
+# value of its "version" field, or of "version_field" if given).
+@app.route('/cas_record', methods=['PUT'])
+def cas_record():
+    table_name = request.json.get('table_name')
+    key = request.json.get('key')
+    data = request.json.get('data', {})
+    expected = request.json.get('expected')
+    expected_version = request.json.get('expected_version')
+    version_field = request.json.get('version_field', 'version')
+
+    # Ensure the data is a dictionary
+    if not isinstance(data, dict):
+        return jsonify({"error": "Data must be a dictionary"}), 400
+
+    result = db.compare_and_set(table_name, key, data, expected=expected,
+                                expected_version=expected_version, version_field=version_field)
+    if "changed by another writer" in result:
+        return jsonify({"error": result}), 409
+    if "does not match the key type" in result:
+        return jsonify({"error": result}), 400
+    if "not found" in result or "does not exist" in result:
+        return jsonify({"error": result}), 404
+    if "Error" in result:
+        return jsonify({"error": result}), 400
+    return jsonify({"message": result})
+
 # Endpoint to delete a record from a table
 @app.route('/delete_record', methods=['DELETE'])
 def delete_record():
@@ -52,6 +295,8 @@ def delete_record():
     key = request.json.get('key')
 
     result = db.delete(table_name, key)
+    if "does not match the key type" in result:
+        return jsonify({"error": result}), 400
     if "Error" in result:
         return jsonify({"error": result}), 404
     return jsonify({"message": result})
@@ -60,14 +305,62 @@ def delete_record():
 @app.route('/read_record', methods=['GET'])
 def read_record():
     table_name = request.args.get('table_name')
-    key = request.args.get('key')
+    raw_key = request.args.get('key')
+    key = parse_key(raw_key, key_type_of(table_name))
 
     result = db.read(table_name, key)
+    if isinstance(result, str) and key != raw_key and raw_key is not None:
+        # An untyped table may hold "10" as a string, which ?key=10 misses
+        fallback = db.read(table_name, raw_key)
+        if not isinstance(fallback, str) or "does not match the key type" in result:
+            result = fallback
+    if isinstance(result, str) and "does not match the key type" in result:
+        return jsonify({"error": result}), 400
     if isinstance(result, str) and "Error" in result:
         return jsonify({"error": result}), 404
     return jsonify({"record": result})
 
-# Endpoint to read all records from a table
+# Streamed responses are sent in chunks of roughly this many bytes
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def table_rows(tree, table_name):
+    # Export from a snapshot so concurrent writes neither wait for the scan
+    # nor show up half-applied in it. Paged tables are scanned live.
+    snapshot = db.snapshot([table_name]) if tree.storage == "memory" else None
+    if not isinstance(snapshot, DBSnapshot):
+        return tree.range()
+    return release_after(snapshot, snapshot.tables[table_name].range())
+
+def release_after(snapshot, rows):
+    with snapshot:
+        yield from rows
+
+def json_parts(rows, prefix='[', suffix=']'):
+    yield prefix
+    separator = ''
+    for key, value in rows:
+        yield separator + app.json.dumps({"key": key, "value": value})
+        separator = ','
+    yield suffix
+
+def ndjson_parts(rows):
+    for key, value in rows:
+        yield app.json.dumps({"key": key, "value": value}) + '\n'
+
+def chunked(parts):
+    # Join the small per-record strings into larger writes
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+# Endpoint to read all records from a table. The response is streamed
+# from the leaves, so memory use does not grow with the table.
 @app.route('/read_records', methods=['GET'])
 def read_records():
     table_name = request.args.get('table_name')
@@ -76,26 +369,214 @@ def read_records():
     if not tree:
         return jsonify({"error": "Table not found"}), 404
     
-    records = []
-    node = tree.root
-    
-    # Traverse to the leftmost leaf node
-    while not node.leaf:
-        node = node.children[0]
-    
-    # Collect all key-value pairs from the leaf nodes
-    while node:
-        for i, key in enumerate(node.keys):
-            records.append({"key": key, "value": node.values[i]})
-        node = node.next_leaf
-    
-    return jsonify({"records": records})
+    parts = json_parts(table_rows(tree, table_name), prefix='{"records":[', suffix=']}')
+    return Response(chunked(parts), mimetype='application/json')
+
+# Endpoint to export a whole table as NDJSON (default) or a JSON array,
+# e.g. /export?table_name=users&format=json
+@app.route('/export', methods=['GET'])
+def export():
+    table_name = request.args.get('table_name')
+    export_format = request.args.get('format', 'ndjson').lower()
+    tree = db.tables.get(table_name)
+
+    if not tree:
+        return jsonify({"error": "Table not found"}), 404
+    if export_format not in ('json', 'ndjson'):
+        return jsonify({"error": "Format must be 'json' or 'ndjson'"}), 400
+
+    rows = table_rows(tree, table_name)
+    if export_format == 'json':
+        return Response(chunked(json_parts(rows)), mimetype='application/json')
+    return Response(chunked(ndjson_parts(rows)), mimetype='application/x-ndjson')
+
+def parse_key(raw, key_type=None):
+    # Query-string keys are JSON when possible (so 10 is an int and "10"
+    # a string), otherwise taken as plain strings. Tables with str keys
+    # take them as they are, so ?key=10 finds the key "10".
+    if raw is None or key_type == "str":
+        return raw
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+def key_type_of(table_name):
+    # Sharded tables do not expose one; their keys are parsed untyped
+    return getattr(db.tables.get(table_name), 'key_type', None)
+
+def encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor: str):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+# Endpoint to read a key range from a table, one page at a time
+@app.route('/scan', methods=['GET'])
+def scan():
+    table_name = request.args.get('table_name')
+    tree = db.tables.get(table_name)
+
+    if not tree:
+        return jsonify({"error": "Table not found"}), 404
+
+    try:
+        start = parse_key(request.args.get('start'), getattr(tree, 'key_type', None))
+        end = parse_key(request.args.get('end'), getattr(tree, 'key_type', None))
+        limit = int(request.args.get('limit', 100))
+        reverse = request.args.get('reverse', 'false').lower() == 'true'
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "Invalid scan parameters"}), 400
+    if limit <= 0:
+        return jsonify({"error": "Limit must be positive"}), 400
 
-# Endpoint to save the database to disk
+    try:
+        # The cursor is the last key of the previous page; the next page
+        # resumes just past it in scan direction.
+        if after is not None:
+            if reverse:
+                end = after if end is None else min(end, after)
+            else:
+                start = after if start is None else max(start, after)
+        rows = tree.range(start, end, reverse=reverse)
+        if after is not None and not reverse:
+            rows = ((key, value) for key, value in rows if key != after)
+        page = list(islice(rows, limit + 1))
+    except TypeError:
+        return jsonify({"error": "Scan bounds do not match the table's key type"}), 400
+
+    next_cursor = encode_cursor(page[limit - 1][0]) if len(page) > limit else None
+    records = [{"key": key, "value": value} for key, value in page[:limit]]
+    return jsonify({"records": records, "next_cursor": next_cursor})
+
+# Endpoint to count the records in a key range and, with field, sum/min/max
+# a numeric field over them, e.g. /aggregate?table_name=orders&field=total&start=100&end=200
+@app.route('/aggregate', methods=['GET'])
+def aggregate():
+    table_name = request.args.get('table_name')
+    field = request.args.get('field')
+    start = parse_key(request.args.get('start'), key_type_of(table_name))
+    end = parse_key(request.args.get('end'), key_type_of(table_name))
+
+    if field is None:
+        result = db.count_range(table_name, start, end)
+        if isinstance(result, str):
+            return jsonify({"error": result}), 400
+        return jsonify({"records": result})
+    result = db.aggregate(table_name, field, start, end)
+    if isinstance(result, str):
+        return jsonify({"error": result}), 400
+    return jsonify(result)
+
+# Endpoint to find how many records sort before a key
+@app.route('/rank', methods=['GET'])
+def rank():
+    table_name = request.args.get('table_name')
+    key = parse_key(request.args.get('key'), key_type_of(table_name))
+
+    result = db.rank(table_name, key)
+    if isinstance(result, str):
+        return jsonify({"error": result}), 400
+    return jsonify({"key": key, "rank": result})
+
+# Endpoint to read the record at a position in key order, e.g. the median
+@app.route('/select', methods=['GET'])
+def select():
+    table_name = request.args.get('table_name')
+    k = request.args.get('k', type=int)
+
+    result = db.select(table_name, k)
+    if isinstance(result, str):
+        return jsonify({"error": result}), 400
+    return jsonify(result)
+
+# Endpoint to save the database to disk. The checkpoint runs in the
+# background; poll /checkpoint_status or pass wait=true to block on it.
 @app.route('/save_db', methods=['POST'])
 def save_db():
-    db.save_db()
-    return jsonify({"message": "Database saved successfully"})
+    checkpoint_id = db.request_checkpoint()
+    if request.args.get('wait', 'false').lower() == 'true':
+        db.wait_for_checkpoint(checkpoint_id)
+        return jsonify({"message": "Database saved successfully", "checkpoint_id": checkpoint_id})
+    return jsonify({"message": "Checkpoint scheduled", "checkpoint_id": checkpoint_id}), 202
+
+# Endpoint to report how long the database took to become ready
+@app.route('/startup_report', methods=['GET'])
+def startup_report():
+    report = dict(db.startup_report)
+    report["loaded_tables"] = [name for name, _ in db.tables.loaded()]
+    report["table_load_ms"] = {name: t * 1000 for name, t in db.tables.load_times.items()}
+    return jsonify(report)
+
+# Endpoint to size a table's read cache; 0 turns it off
+@app.route('/record_cache', methods=['POST'])
+def record_cache():
+    table_name = request.json.get('table_name')
+    size = request.json.get('size')
+    result = db.set_record_cache_size(table_name, size)
+    if "Error" in result:
+        return jsonify({"error": result}), 400
+    return jsonify({"message": result})
+
+# Endpoint to report read cache hits, misses and evictions per table
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(db.record_cache_stats())
+
+# Endpoint to add a Bloom filter to a table ({"fp_rate": 0.01}) or remove
+# it ({"fp_rate": null})
+@app.route('/bloom_filter', methods=['POST'])
+def bloom_filter():
+    table_name = request.json.get('table_name')
+    fp_rate = request.json.get('fp_rate')
+    result = db.set_bloom_filter(table_name, fp_rate)
+    if "Error" in result:
+        return jsonify({"error": result}), 400
+    return jsonify({"message": result})
+
+# Endpoint to report how many lookups the Bloom filters answered
+@app.route('/bloom_stats', methods=['GET'])
+def bloom_stats():
+    return jsonify(db.bloom_stats())
+
+# Endpoint to expose operation latencies, tree split/merge/borrow counts and
+# per-table structure, in Prometheus text format or as JSON (format=json)
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    report = db.metrics_report()
+    if request.args.get('format') == 'json':
+        return jsonify(report)
+    return Response(prometheus(report), mimetype='text/plain; version=0.0.4')
+
+# Endpoint to rebuild a table with fuller nodes after heavy deletes;
+# reports the nodes and height reclaimed
+@app.route('/compact', methods=['POST'])
+def compact():
+    table_name = request.json.get('table_name')
+    fill_factor = request.json.get('fill_factor', COMPACT_FILL_FACTOR)
+    result = db.compact(table_name, fill_factor)
+    if isinstance(result, str):
+        return jsonify({"error": result}), 400
+    return jsonify(result)
+
+# Endpoint to report checkpoint progress
+@app.route('/checkpoint_status', methods=['GET'])
+def checkpoint_status():
+    return jsonify(db.checkpoint_status())
+
+# Endpoint to report replication state: on a primary, each replica's
+# acknowledged position and lag; on a replica, its lag behind the primary
+@app.route('/replication', methods=['GET'])
+def replication_status():
+    if isinstance(db, ReplicaDB):
+        return jsonify(db.replication_status())
+    if replication is not None:
+        return jsonify(replication.status())
+    return jsonify({"role": "standalone"})
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    # The reloader runs the module in a second process, which would open
+    # the database directory (and the replication port) twice
+    app.run(debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,381 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import unquote
+import argparse
+import asyncio
+import io
+import signal
+import sys
+
+# Limits of what one request may send
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 256 * 1024 * 1024
+# Requests of one connection read ahead of the one being answered
+MAX_PIPELINE = 32
+# Seconds an idle keep-alive connection is kept open
+IDLE_TIMEOUT = 60.0
+DEFAULT_WORKERS = 16
+# Streamed responses are sent in chunks of about this many bytes
+STREAM_CHUNK = 64 * 1024
+
+_REASONS = {400: "Bad Request", 408: "Request Timeout", 413: "Payload Too Large",
+            431: "Request Header Fields Too Large", 501: "Not Implemented", 505: "HTTP Version Not Supported"}
+
+
+class BadRequest(Exception):
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or _REASONS.get(status, ""))
+        self.status = status
+
+
+class HTTPRequest:
+    __slots__ = ("method", "target", "version", "headers", "body")
+
+    def __init__(self, method: str, target: str, version: str, headers: List[Tuple[str, str]], body: bytes):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers  # (lower-case name, value) pairs in arrival order
+        self.body = body
+
+    def header(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        values = [value for key, value in self.headers if key == name]
+        return ", ".join(values) if values else default
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = (self.header("connection") or "").lower()
+        if self.version == "HTTP/1.0":
+            return "keep-alive" in connection
+        return "close" not in connection
+
+
+class AsyncHTTPServer:
+    """HTTP/1.1 server on asyncio streams in front of a WSGI app
+
+    Connections are handled by the event loop, so thousands of idle or
+    slow clients cost a coroutine each instead of a thread. Requests run
+    on a thread pool (the app calls the database, which blocks), one at a
+    time per connection so pipelined writes apply in order; the next
+    requests are parsed while one runs and responses are flushed together.
+    """
+
+    def __init__(self, wsgi_app: Callable, host: str = "127.0.0.1", port: int = 5000,
+                 workers: int = DEFAULT_WORKERS, max_pipeline: int = MAX_PIPELINE,
+                 idle_timeout: float = IDLE_TIMEOUT):
+        self.app = wsgi_app
+        self.host = host
+        self.port = port
+        self.max_pipeline = max_pipeline
+        self.idle_timeout = idle_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port,
+                                                  limit=MAX_HEADER_BYTES, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]  # Resolved if port 0 was asked for
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        self.executor.shutdown(wait=True)
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        peer = writer.get_extra_info("peername") or ("", 0)
+        queue: "asyncio.Queue[Any]" = asyncio.Queue(self.max_pipeline)
+        responder = asyncio.create_task(self._respond(queue, writer, peer))
+        try:
+            while not responder.done():
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, writer), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except BadRequest as e:
+                    await queue.put(e)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                if request is None:
+                    break
+                await queue.put(request)
+                if not request.keep_alive:
+                    break
+        finally:
+            await queue.put(None)
+            try:
+                await responder
+            except ConnectionError:
+                pass
+            writer.close()
+            self.connections -= 1
+
+    async def _read_request(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> Optional[HTTPRequest]:
+        """Parse the next request; None when the client closed between requests"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise BadRequest(400)
+        except asyncio.LimitOverrunError:
+            raise BadRequest(431)
+
+        lines = head.decode("latin-1").split("\r\n")
+        while lines and not lines[0]:
+            lines.pop(0)  # Stray CRLF between pipelined requests
+        try:
+            method, target, version = lines[0].split(" ")
+        except (IndexError, ValueError):
+            raise BadRequest(400)
+        if version not in ("HTTP/1.1", "HTTP/1.0"):
+            raise BadRequest(505)
+        headers = []
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(":")
+            if not sep or not name or name != name.strip():
+                raise BadRequest(400)
+            headers.append((name.lower(), value.strip()))
+        request = HTTPRequest(method, target, version, headers, b"")
+
+        if request.header("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        encoding = request.header("transfer-encoding")
+        if encoding is not None:
+            if encoding.lower() != "chunked":
+                raise BadRequest(501)
+            request.body = await self._read_chunked(reader)
+        else:
+            try:
+                length = int(request.header("content-length", "0"))
+            except ValueError:
+                raise BadRequest(400)
+            if length < 0:
+                raise BadRequest(400)
+            if length > MAX_BODY_BYTES:
+                raise BadRequest(413)
+            if length:
+                request.body = await reader.readexactly(length)
+        return request
+
+    async def _read_chunked(self, reader: asyncio.StreamReader) -> bytes:
+        parts, size = [], 0
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            try:
+                length = int(line.split(b";", 1)[0], 16)
+            except ValueError:
+                raise BadRequest(400)
+            if length == 0:
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass  # Trailers are ignored
+                return b"".join(parts)
+            size += length
+            if size > MAX_BODY_BYTES:
+                raise BadRequest(413)
+            parts.append(await reader.readexactly(length))
+            await reader.readexactly(2)
+
+    async def _respond(self, queue: "asyncio.Queue[Any]", writer: asyncio.StreamWriter, peer):
+        """Answer queued requests in order, flushing when the queue runs dry"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request = await queue.get()
+                if request is None:
+                    break
+                if isinstance(request, BadRequest):
+                    writer.write(_simple_response(request.status, str(request)))
+                    break
+                environ = self._environ(request, peer)
+                status, headers, body, rest = await loop.run_in_executor(self.executor, _call_app,
+                                                                         self.app, environ)
+                keep_alive = request.keep_alive
+                streamed = rest is not None
+                if streamed and request.version == "HTTP/1.0":
+                    keep_alive = False  # No chunked encoding, so closing ends the body
+                writer.write(_response_head(request, status, headers, body, streamed, keep_alive))
+                if request.method != "HEAD":
+                    await self._write_body(writer, body, rest, request.version == "HTTP/1.1")
+                elif rest is not None:
+                    await loop.run_in_executor(self.executor, _close_body, rest)
+                if not keep_alive:
+                    break
+                if queue.empty():
+                    await writer.drain()
+            await writer.drain()
+        finally:
+            # Unblock the reader: it stops at the closed connection, and a
+            # put it is waiting on finds room
+            while not queue.empty():
+                queue.get_nowait()
+            writer.close()
+
+    async def _write_body(self, writer: asyncio.StreamWriter, body: bytes, rest, chunked: bool):
+        if rest is None:
+            writer.write(body)
+            return
+        # Streamed response: each batch is produced on the pool, and sent
+        # before the next is asked for so a slow client throttles it
+        loop = asyncio.get_running_loop()
+        try:
+            while body:
+                writer.write(b"%x\r\n%s\r\n" % (len(body), body) if chunked else body)
+                await writer.drain()
+                body = await loop.run_in_executor(self.executor, _next_chunk, rest)
+            if chunked:
+                writer.write(b"0\r\n\r\n")
+        finally:
+            await loop.run_in_executor(self.executor, _close_body, rest)
+
+    def _environ(self, request: HTTPRequest, peer) -> Dict[str, Any]:
+        path, _, query = request.target.partition("?")
+        environ = {
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path, "latin-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": request.version,
+            "REMOTE_ADDR": str(peer[0]),
+            "REMOTE_PORT": str(peer[1]),
+            "CONTENT_TYPE": request.header("content-type", ""),
+            "CONTENT_LENGTH": str(len(request.body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(request.body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        # The body is already de-chunked and sized by CONTENT_LENGTH
+        for name in {name for name, _ in request.headers}:
+            if name not in ("content-type", "content-length", "transfer-encoding"):
+                environ["HTTP_" + name.upper().replace("-", "_")] = request.header(name)
+        return environ
+
+
+class _StreamedBody:
+    """A WSGI response body still being produced"""
+    __slots__ = ("iterator", "result")
+
+    def __init__(self, iterator: Iterator[bytes], result: Any):
+        self.iterator = iterator
+        self.result = result
+
+
+def _call_app(app: Callable, environ: Dict[str, Any]):
+    """Run the WSGI app on a pool thread. Returns the status, headers and
+    first part of the body, plus the rest of a streamed body (or None)"""
+    started: List[Any] = []
+
+    def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+        started[:] = [status, headers]
+
+    result = app(environ, start_response)
+    if isinstance(result, (list, tuple)):
+        body = b"".join(result)
+        if hasattr(result, "close"):
+            result.close()
+        return started[0], started[1], body, None
+    rest = _StreamedBody(iter(result), result)
+    body = _next_chunk(rest)
+    if not any(name.lower() == "content-length" for name, _ in started[1]) and body:
+        return started[0], started[1], body, rest
+    # Sized or empty: collect the body so it can go out in one write
+    parts = [body]
+    while body:
+        body = _next_chunk(rest)
+        parts.append(body)
+    _close_body(rest)
+    return started[0], started[1], b"".join(parts), None
+
+
+def _next_chunk(rest: _StreamedBody) -> bytes:
+    parts, size = [], 0
+    for part in rest.iterator:
+        if part:
+            parts.append(part)
+            size += len(part)
+            if size >= STREAM_CHUNK:
+                break
+    return b"".join(parts)
+
+
+def _close_body(rest: _StreamedBody):
+    if hasattr(rest.result, "close"):
+        rest.result.close()
+
+
+def _response_head(request: HTTPRequest, status: str, headers: List[Tuple[str, str]], body: bytes,
+                   streamed: bool, keep_alive: bool) -> bytes:
+    lines = [f"{request.version} {status}"]
+    sized = False
+    for name, value in headers:
+        lower = name.lower()
+        if lower in ("connection", "transfer-encoding"):
+            continue
+        sized = sized or lower == "content-length"
+        lines.append(f"{name}: {value}")
+    code = int(status.split(" ", 1)[0])
+    if not sized and code >= 200 and code not in (204, 304):
+        if not streamed:
+            lines.append(f"Content-Length: {len(body)}")
+        elif request.version == "HTTP/1.1":
+            lines.append("Transfer-Encoding: chunked")
+    lines.append(f"Date: {formatdate(usegmt=True)}")
+    if not keep_alive:
+        lines.append("Connection: close")
+    elif request.version == "HTTP/1.0":
+        lines.append("Connection: keep-alive")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _simple_response(status: int, message: str) -> bytes:
+    body = message.encode()
+    return (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode("latin-1") + body
+
+
+async def serve(host: str, port: int, workers: int):
+    from app import app, db  # Opens the database
+
+    server = AsyncHTTPServer(app, host, port, workers)
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    print(f"Serving on http://{host}:{server.port}", file=sys.stderr)
+    serving = asyncio.create_task(server.serve_forever())
+    await stop.wait()
+    serving.cancel()
+    server.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the database API with the asyncio front end")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Threads running requests against the database")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.workers))
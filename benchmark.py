@@ -0,0 +1,634 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import db_engine
+from db_engine import BPlusTree
+
+# Compare the classic tiny-node configuration against a high-fanout tree.
+ORDERS = [3, 16, 64, 128, 256]
+NUM_KEYS = 200_000
+
+
+def bench_order(order: int, keys):
+    tree = BPlusTree(order)
+
+    start = time.perf_counter()
+    for key in keys:
+        tree.insert(key, {"id": key})
+    insert_time = time.perf_counter() - start
+    height = tree.height()
+
+    start = time.perf_counter()
+    for key in keys:
+        tree.search(key)
+    search_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in keys[: len(keys) // 2]:
+        tree.delete(key)
+    delete_time = time.perf_counter() - start
+
+    return {
+        "order": order,
+        "height": height,
+        "insert_ops": len(keys) / insert_time,
+        "search_ops": len(keys) / search_time,
+        "delete_ops": (len(keys) // 2) / delete_time,
+    }
+
+
+def run_benchmark(num_keys: int = NUM_KEYS):
+    keys = list(range(num_keys))
+    random.seed(42)
+    random.shuffle(keys)
+
+    print(f"{'order':>6} {'height':>6} {'insert/s':>12} {'search/s':>12} {'delete/s':>12}")
+    for order in ORDERS:
+        result = bench_order(order, keys)
+        print(f"{result['order']:>6} {result['height']:>6} {result['insert_ops']:>12.0f} "
+              f"{result['search_ops']:>12.0f} {result['delete_ops']:>12.0f}")
+
+
+def bulk_report(num_keys: int = NUM_KEYS, order: int = 64):
+    keys = list(range(num_keys))
+    random.seed(42)
+    random.shuffle(keys)
+    records = [(key, {"id": key}) for key in keys]
+
+    tree = BPlusTree(order)
+    start = time.perf_counter()
+    for key, value in records:
+        if tree.search(key) is None:  # SimpleDB.insert's duplicate check
+            tree.insert(key, value)
+    row_time = time.perf_counter() - start
+
+    for fill_factor in (1.0, 0.7):
+        tree = BPlusTree(order)
+        start = time.perf_counter()
+        tree.bulk_load(records, fill_factor)
+        bulk_time = time.perf_counter() - start
+        print(f"fill {fill_factor:.1f}: row-by-row {row_time:.2f}s, bulk {bulk_time:.2f}s "
+              f"({row_time / bulk_time:.1f}x), height {tree.height()}")
+
+
+def paged_report(num_keys: int = NUM_KEYS, order: int = 64, cache_sizes=(16, 256, 4096)):
+    from paged_storage import PagedBPlusTree
+
+    keys = list(range(num_keys))
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.pages")
+        tree = PagedBPlusTree(path, order)
+        tree.bulk_load((key, {"id": key}) for key in keys)
+        tree.checkpoint()
+        tree.close()
+
+        for cache_pages in cache_sizes:
+            start = time.perf_counter()
+            tree = PagedBPlusTree.open(path, cache_pages)
+            open_time = time.perf_counter() - start
+            random.shuffle(keys)
+            start = time.perf_counter()
+            for key in keys:
+                tree.search(key)
+            search_time = time.perf_counter() - start
+            print(f"cache {cache_pages:>5} pages: open {open_time * 1000:.1f}ms, "
+                  f"{num_keys / search_time:.0f} searches/s, hit rate "
+                  f"{tree.pool.hits / max(1, tree.pool.hits + tree.pool.misses):.0%}")
+            tree.close()
+
+
+def sharded_report(num_keys: int = NUM_KEYS, shard_counts=(1, 2, 4, 8), threads_per_shard: int = 4):
+    """Insert and read throughput of ShardedDB as shards are added"""
+    import threading
+    from sharding import ShardedDB
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for shards in shard_counts:
+                if shards > (os.cpu_count() or 1):
+                    break
+                db = ShardedDB(f"bench{shards}", shards, sync_policy="off",
+                               checkpoint_interval=None, checkpoint_writes=None)
+                db.create_table("bench")
+                threads = shards * threads_per_shard
+                results = []
+                for op in ("insert", "read"):
+                    def work(n: int):
+                        for key in range(n, num_keys, threads):
+                            if op == "insert":
+                                db.insert("bench", key, {"id": key})
+                            else:
+                                db.read("bench", key)
+
+                    workers = [threading.Thread(target=work, args=(n,)) for n in range(threads)]
+                    start = time.perf_counter()
+                    for worker in workers:
+                        worker.start()
+                    for worker in workers:
+                        worker.join()
+                    results.append(num_keys / (time.perf_counter() - start))
+                db.close()
+                print(f"{shards:>2} shards, {threads:>3} threads: {results[0]:10.0f} inserts/s "
+                      f"{results[1]:10.0f} reads/s")
+        finally:
+            os.chdir(cwd)
+
+
+# Servers the HTTP load test starts, each as "python -c <code>" on a port
+HTTP_SERVERS = {
+    "flask": "from app import app; app.run(port={port}, threaded=True)",
+    "asyncio": "import asyncio, async_server; asyncio.run(async_server.serve('127.0.0.1', {port}, 16))",
+}
+LOAD_KEYS = 10_000
+
+
+async def load_client(port: int, keys: List[str], count: int, depth: int, started,
+                      latencies: List[float], errors: List[int]):
+    """One keep-alive connection sending count reads, depth at a time
+    (depth > 1 pipelines them); a latency runs from sending a batch to
+    reading each of its responses"""
+    import asyncio
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await started.wait()
+    for sent in range(0, count, depth):
+        pending = [b"GET /read_record?table_name=bench&key=%s HTTP/1.1\r\nHost: bench\r\n\r\n"
+                   % random.choice(keys).encode() for _ in range(min(depth, count - sent))]
+        start = time.perf_counter()
+        failures = 0
+        while pending and failures < 3:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"".join(pending))
+                while pending:
+                    head = (await reader.readuntil(b"\r\n\r\n")).lower()
+                    length = int(head.split(b"content-length:", 1)[1].split(b"\r\n", 1)[0])
+                    await reader.readexactly(length)
+                    latencies.append(time.perf_counter() - start)
+                    pending.pop()
+                    if b"connection: close" in head:
+                        # The Flask dev server answers one request per
+                        # connection; unanswered ones are sent again
+                        writer.close()
+                        writer = None
+                        break
+            except (OSError, asyncio.IncompleteReadError):
+                failures += 1
+                if writer is not None:
+                    writer.close()
+                writer = None
+        errors[0] += len(pending)
+    if writer is not None:
+        writer.close()
+
+
+def http_load_report(connection_counts=(10, 100, 1000), depths=(1, 8), total: int = 20_000,
+                     servers=tuple(HTTP_SERVERS)):
+    """Read throughput and tail latency of the Flask dev server and the
+    asyncio front end under many concurrent keep-alive connections"""
+    import asyncio
+    import socket
+    from db_engine import SimpleDB
+
+    keys = [f"k{i:06d}" for i in range(LOAD_KEYS)]
+    repo = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SimpleDB(os.path.join(tmp, "mydb"), checkpoint_interval=None, checkpoint_writes=None)
+        db.create_table("bench")
+        db.bulk_insert("bench", [(key, {"id": key}) for key in keys])
+        db.close()
+        for server in servers:
+            with socket.socket() as probe:
+                probe.bind(("127.0.0.1", 0))
+                port = probe.getsockname()[1]
+            process = subprocess.Popen([sys.executable, "-c", HTTP_SERVERS[server].format(port=port)],
+                                       cwd=tmp, env=dict(os.environ, PYTHONPATH=repo),
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                for _ in range(200):
+                    try:
+                        socket.create_connection(("127.0.0.1", port)).close()
+                        break
+                    except OSError:
+                        time.sleep(0.05)
+                for connections, depth in itertools.product(connection_counts, depths):
+                    latencies: List[float] = []
+                    errors = [0]
+
+                    async def run():
+                        started = asyncio.Event()
+                        clients = [asyncio.create_task(load_client(port, keys, total // connections, depth, started,
+                                                                   latencies, errors))
+                                   for _ in range(connections)]
+                        await asyncio.sleep(0.5)  # Let every connection be accepted
+                        begin = time.perf_counter()
+                        started.set()
+                        await asyncio.gather(*clients)
+                        return time.perf_counter() - begin
+
+                    seconds = asyncio.run(run())
+                    latencies.sort()
+                    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+                    print(f"{server:<8} {connections:>5} conns, depth {depth}: {len(latencies) / seconds:8.0f} req/s "
+                          f"p50 {pick(0.5):7.1f} ms  p99 {pick(0.99):7.1f} ms  p99.9 {pick(0.999):7.1f} ms  "
+                          f"errors {errors[0]}")
+            finally:
+                process.terminate()
+                process.wait()
+
+
+def replica_report(replica_counts=(1, 2, 4), connections: int = 100, total: int = 20_000):
+    """Read throughput spread over read replicas of one primary, while
+    the primary takes a steady stream of inserts, and the replicas' lag"""
+    import asyncio
+    import http.client
+    import socket
+    import threading
+    from db_engine import SimpleDB
+
+    keys = [f"k{i:06d}" for i in range(LOAD_KEYS)]
+    repo = os.path.dirname(os.path.abspath(__file__))
+
+    def free_port() -> int:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            return probe.getsockname()[1]
+
+    def get_json(port: int, path: str) -> Dict[str, Any]:
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request("GET", path)
+        body = json.loads(conn.getresponse().read())
+        conn.close()
+        return body
+
+    for replicas in replica_counts:
+        if replicas + 1 > (os.cpu_count() or 1):
+            break
+        with tempfile.TemporaryDirectory() as tmp:
+            db = SimpleDB(os.path.join(tmp, "mydb"), checkpoint_interval=None, checkpoint_writes=None)
+            db.create_table("bench")
+            db.bulk_insert("bench", [(key, {"id": key}) for key in keys])
+            db.close()
+            listen = os.path.join(tmp, "replication.sock")
+            secret = os.urandom(16).hex()
+            ports = [free_port() for _ in range(replicas + 1)]
+            processes = []
+            try:
+                for n, port in enumerate(ports):
+                    role = {"SIMPLEDB_REPLICATION_LISTEN": listen} if n == 0 else {"SIMPLEDB_REPLICATE_FROM": listen}
+                    processes.append(subprocess.Popen(
+                        [sys.executable, "-c", HTTP_SERVERS["asyncio"].format(port=port)],
+                        cwd=tmp, env=dict(os.environ, PYTHONPATH=repo, SIMPLEDB_REPLICATION_KEY=secret, **role),
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+                    for _ in range(200):
+                        try:
+                            if get_json(port, "/replication").get("lag_records", 0) == 0:
+                                break
+                        except (OSError, ValueError):
+                            pass
+                        time.sleep(0.05)
+
+                stop = threading.Event()
+                writes = [0]
+
+                def writer():
+                    conn = http.client.HTTPConnection("127.0.0.1", ports[0])
+                    while not stop.is_set():
+                        body = json.dumps({"table_name": "bench", "key": f"w{writes[0]:08d}", "data": {"n": 1}})
+                        conn.request("POST", "/insert_record", body, {"Content-Type": "application/json"})
+                        conn.getresponse().read()
+                        writes[0] += 1
+
+                latencies: List[float] = []
+                errors = [0]
+
+                async def run():
+                    started = asyncio.Event()
+                    clients = [asyncio.create_task(load_client(ports[1 + n % replicas], keys, total // connections,
+                                                               1, started, latencies, errors))
+                               for n in range(connections)]
+                    await asyncio.sleep(0.5)
+                    begin = time.perf_counter()
+                    started.set()
+                    await asyncio.gather(*clients)
+                    return time.perf_counter() - begin
+
+                write_thread = threading.Thread(target=writer)
+                write_thread.start()
+                seconds = asyncio.run(run())
+                lag = max(get_json(port, "/replication")["lag_seconds"] for port in ports[1:])
+                stop.set()
+                write_thread.join()
+                latencies.sort()
+                p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000
+                print(f"{replicas} replicas: {len(latencies) / seconds:8.0f} reads/s  p99 {p99:7.1f} ms  "
+                      f"{writes[0] / seconds:6.0f} writes/s on the primary  max lag {lag * 1000:6.1f} ms  "
+                      f"errors {errors[0]}")
+            finally:
+                for process in processes:
+                    process.terminate()
+                    process.wait()
+
+
+@dataclass
+class LegacyNode:
+    """The original dataclass node layout, kept for the memory comparison"""
+    leaf: bool
+    keys: List[Any]
+    children: List['LegacyNode']
+    values: List[Dict[str, Any]]
+    next_leaf: Optional['LegacyNode'] = None
+    epoch: int = 0
+
+
+def tree_bytes(keys, order: int, key_type: Optional[str] = None, node_class=None) -> int:
+    """Bytes allocated by the tree and its keys (records are shared)"""
+    record = {"name": "John Doe", "age": 30}
+    offset = 2 ** 40  # Fresh int objects per key, as when parsed from JSON
+    original = db_engine.Node
+    if node_class is not None:
+        db_engine.Node = node_class
+    try:
+        tracemalloc.start()
+        tree = BPlusTree(order, key_type)
+        for key in keys:
+            tree.insert(key + offset, record)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    finally:
+        db_engine.Node = original
+    return size
+
+
+def memory_report(num_keys: int = NUM_KEYS, orders=(3, 64)):
+    keys = list(range(num_keys))
+    random.seed(42)
+    random.shuffle(keys)
+
+    layouts = [
+        ("dataclass nodes, list keys", dict(node_class=LegacyNode)),
+        ("slotted nodes, list keys", dict()),
+        ("slotted nodes, int array keys", dict(key_type="int")),
+    ]
+    for order in orders:
+        print(f"{num_keys} records, order {order}")
+        for name, options in layouts:
+            size = tree_bytes(keys, order, **options)
+            print(f"  {name:<32} {size / num_keys:8.1f} bytes/record")
+
+
+# Reproducible suite: every run with the same arguments performs the same
+# operations in the same order, and the results are written as JSON so runs
+# on different commits can be diffed.
+DISTRIBUTIONS = ["sequential", "random", "zipfian"]
+SUITE_ORDERS = [16, 64, 256]
+SUITE_SIZES = [10_000, 100_000]
+SUITES = ["tree", "db", "http"]
+ZIPF_EXPONENT = 0.99
+SCAN_LENGTH = 100
+
+
+def zipf_indexes(n: int, count: int, rng: random.Random, exponent: float = ZIPF_EXPONENT) -> List[int]:
+    """count draws from range(n) where index i has weight 1 / (i + 1) ** exponent"""
+    weights = list(itertools.accumulate(1 / (i + 1) ** exponent for i in range(n)))
+    return rng.choices(range(n), cum_weights=weights, k=count)
+
+
+def workload_keys(distribution: str, n: int, seed: int):
+    """Keys in insertion order and the keys to look up, n of each
+
+    Inserts are unique keys: ascending for sequential, shuffled otherwise.
+    Lookups follow the distribution; zipfian lookups hit a few hot keys
+    (scattered over the key space) far more often than the rest.
+    """
+    rng = random.Random(seed)
+    keys = list(range(n))
+    if distribution == "sequential":
+        return keys, list(keys)
+    rng.shuffle(keys)
+    if distribution == "random":
+        return keys, [rng.randrange(n) for _ in range(n)]
+    if distribution == "zipfian":
+        return keys, [keys[i] for i in zipf_indexes(n, n, rng)]
+    raise ValueError(f"Unknown key distribution '{distribution}'")
+
+
+def timed(op: str, count: int, run: Callable[[], Any], **extra) -> Dict[str, Any]:
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    return dict(op=op, count=count, seconds=seconds, ops_per_sec=count / seconds if seconds else None, **extra)
+
+
+def tree_suite(distribution: str, n: int, order: int, seed: int) -> List[Dict[str, Any]]:
+    inserts, lookups = workload_keys(distribution, n, seed)
+    rng = random.Random(seed + 1)
+    starts = [rng.randrange(n) for _ in range(max(1, n // SCAN_LENGTH))]
+    tree = BPlusTree(order)
+    results = []
+
+    def insert():
+        for key in inserts:
+            tree.insert(key, {"id": key})
+
+    def search():
+        for key in lookups:
+            tree.search(key)
+
+    def scan():
+        for start in starts:
+            for _ in itertools.islice(tree.range(start), SCAN_LENGTH):
+                pass
+
+    def delete():
+        for key in lookups[: n // 2]:
+            tree.delete(key)
+
+    results.append(timed("insert", n, insert))
+    results.append(timed("search", n, search, height=tree.height()))
+    results.append(timed("search_many", n, lambda: tree.search_many(lookups)))
+    results.append(timed("range_scan", len(starts) * SCAN_LENGTH, scan))
+    # Counted from subtree counts and cached aggregates, whatever the width
+    results.append(timed("count_range", len(starts), lambda: [tree.count_range(start, start + n // 10)
+                                                              for start in starts]))
+    results.append(timed("aggregate", len(starts), lambda: [tree.aggregate("id", start, start + n // 10)
+                                                            for start in starts]))
+    records = [(key, {"id": key}) for key in inserts]
+    results.append(timed("bulk_load", n, lambda: BPlusTree(order).bulk_load(records)))
+    results.append(timed("delete", n // 2, delete))
+    return results
+
+
+def db_suite(distribution: str, n: int, order: int, seed: int) -> List[Dict[str, Any]]:
+    """One persistence cycle: write, checkpoint, reopen, read back"""
+    from db_engine import SimpleDB
+
+    inserts, lookups = workload_keys(distribution, n, seed)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        name = os.path.join(tmp, "bench")
+        # No background checkpoints, and no fsync per write, so the numbers
+        # measure the engine rather than the disk
+        options = dict(order=order, sync_policy="off", checkpoint_interval=None, checkpoint_writes=None)
+        db = SimpleDB(name, **options)
+        db.create_table("bench")
+
+        def insert():
+            for key in inserts:
+                db.insert("bench", key, {"id": key})
+
+        def read(target):
+            def run():
+                for key in lookups:
+                    target.read("bench", key)
+            return run
+
+        results.append(timed("insert", n, insert))
+        results.append(timed("read", n, read(db)))
+        results.append(timed("save_db", n, db.save_db,
+                             bytes=sum(e.stat().st_size for e in os.scandir(db.db_dir))))
+        db.close()
+
+        holder = {}
+        results.append(timed("reopen", n, lambda: holder.update(db=SimpleDB(name, **options))))
+        db = holder["db"]
+        results.append(timed("first_read", 1, lambda: db.read("bench", lookups[0])))
+        results.append(timed("read_after_reopen", n, read(db)))
+        db.close()
+    return results
+
+
+def http_suite(distribution: str, n: int, order: int, seed: int) -> List[Dict[str, Any]]:
+    """Round trips through the Flask app in-process via its test client"""
+    from db_engine import SimpleDB
+
+    inserts, lookups = workload_keys(distribution, n, seed)
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # Importing app opens its database in the working directory
+        try:
+            import app as app_module
+            app_module.db.close()
+            db = app_module.db = SimpleDB(os.path.join(tmp, "bench"), order=order, sync_policy="off",
+                                          checkpoint_interval=None, checkpoint_writes=None)
+            client = app_module.app.test_client()
+            client.post("/create_table", json={"table_name": "bench"})
+
+            def insert():
+                for key in inserts:
+                    client.post("/insert_record", json={"table_name": "bench", "key": key, "data": {"id": key}})
+
+            def read():
+                for key in lookups:
+                    client.get("/read_record", query_string={"table_name": "bench", "key": key})
+
+            batches = [lookups[i:i + 100] for i in range(0, n, 100)]
+
+            def multi_get():
+                for keys in batches:
+                    client.post("/multi_get", json={"table_name": "bench", "keys": keys})
+
+            results.append(timed("insert_record", n, insert))
+            results.append(timed("read_record", n, read))
+            results.append(timed("multi_get", n, multi_get, batch=100))
+            results.append(timed("read_records", n, lambda: client.get(
+                "/read_records", query_string={"table_name": "bench"}).get_data()))
+            results.append(timed("save_db", n, lambda: client.post("/save_db")))
+            db.close()
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+SUITE_RUNNERS = {"tree": tree_suite, "db": db_suite, "http": http_suite}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(suites=SUITES, distributions=DISTRIBUTIONS, orders=SUITE_ORDERS,
+              sizes=SUITE_SIZES, seed: int = 42, log=None) -> Dict[str, Any]:
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "suites": list(suites),
+            "distributions": list(distributions),
+            "orders": list(orders),
+            "sizes": list(sizes),
+        },
+        "results": [],
+    }
+    for suite, distribution, size, order in itertools.product(suites, distributions, sizes, orders):
+        for result in SUITE_RUNNERS[suite](distribution, size, order, seed):
+            row = dict(suite=suite, distribution=distribution, size=size, order=order, **result)
+            report["results"].append(row)
+            if log is not None:
+                ops = f"{row['ops_per_sec']:.0f}/s" if row["ops_per_sec"] else "-"
+                print(f"{suite:<5} {distribution:<10} n={size:<8} order={order:<4} "
+                      f"{row['op']:<18} {ops:>12}", file=log)
+    return report
+
+
+def suite_main(argv):
+    parser = argparse.ArgumentParser(prog="benchmark.py suite",
+                                     description="Run the benchmark suite and emit JSON results")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--distributions", nargs="+", choices=DISTRIBUTIONS, default=DISTRIBUTIONS)
+    parser.add_argument("--orders", nargs="+", type=int, default=SUITE_ORDERS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SUITE_SIZES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON here instead of to stdout")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.suites, args.distributions, args.orders, args.sizes, args.seed, log=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "suite":
+        suite_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "memory":
+        memory_report()
+    elif len(sys.argv) > 1 and sys.argv[1] == "bulk":
+        bulk_report()
+    elif len(sys.argv) > 1 and sys.argv[1] == "paged":
+        paged_report()
+    elif len(sys.argv) > 1 and sys.argv[1] == "sharded":
+        sharded_report()
+    elif len(sys.argv) > 1 and sys.argv[1] == "http":
+        http_load_report()
+    elif len(sys.argv) > 1 and sys.argv[1] == "replicas":
+        replica_report()
+    else:
+        run_benchmark()
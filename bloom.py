@@ -0,0 +1,100 @@
+from typing import Any, Dict, Iterable, Optional
+from hashlib import blake2b
+import math
+
+DEFAULT_FP_RATE = 0.01
+
+# Filters are sized for at least this many keys, so small tables do not
+# rebuild on every few inserts.
+MIN_CAPACITY = 1024
+
+
+def _key_bytes(key: Any) -> bytes:
+    """Stable encoding of a key; keys that compare equal encode equally
+    (1, 1.0 and True all match the same record in the tree)"""
+    if isinstance(key, (bool, int)) or (isinstance(key, float) and key.is_integer()):
+        return b"n" + str(int(key)).encode()
+    if isinstance(key, float):
+        return b"f" + repr(key).encode()
+    if isinstance(key, str):
+        return b"s" + key.encode("utf-8", "surrogatepass")
+    return b"r" + repr(key).encode()
+
+
+class BloomFilter:
+    """Set membership test with no false negatives
+
+    Sized for `capacity` keys at the requested false-positive rate. Keys
+    cannot be removed, so the owner rebuilds the filter once it has seen
+    many deletes or outgrown its capacity. Hashes are independent of
+    Python's per-process hash seed, so a saved filter stays valid.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float = DEFAULT_FP_RATE):
+        if not 0 < fp_rate < 1:
+            raise ValueError("False-positive rate must be in (0, 1)")
+        capacity = max(capacity, MIN_CAPACITY)
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.keys = 0  # Keys added since the last build
+        self.deletes = 0  # Keys removed from the table since the last build
+        self.changed = True  # Not yet saved
+        self.checks = 0
+        self.negatives = 0  # Lookups answered without touching the tree
+        self.false_positives = 0
+
+    @classmethod
+    def build(cls, keys: Iterable[Any], fp_rate: float = DEFAULT_FP_RATE,
+              count: Optional[int] = None) -> 'BloomFilter':
+        """Filter holding keys, with room to grow to twice their number"""
+        keys = list(keys) if count is None else keys
+        count = len(keys) if count is None else count
+        bloom = cls(2 * count, fp_rate)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def _positions(self, key: Any):
+        digest = blake2b(_key_bytes(key), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, key: Any):
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.keys += 1
+        self.changed = True
+
+    def might_contain(self, key: Any) -> bool:
+        self.checks += 1
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                self.negatives += 1
+                return False
+        return True
+
+    def needs_rebuild(self) -> bool:
+        """Over capacity, or a quarter of the keys it holds were deleted"""
+        return self.keys > self.capacity or self.deletes > max(MIN_CAPACITY, self.keys) // 4
+
+    def stats(self) -> Dict[str, Any]:
+        absent = self.negatives + self.false_positives  # Lookups of keys not in the table
+        return {
+            "fp_rate": self.fp_rate,
+            "capacity": self.capacity,
+            "bits": self.num_bits,
+            "hashes": self.num_hashes,
+            "keys": self.keys,
+            "deletes": self.deletes,
+            "checks": self.checks,
+            "negatives": self.negatives,
+            "false_positives": self.false_positives,
+            "observed_fp_rate": self.false_positives / absent if absent else 0.0,
+        }
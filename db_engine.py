@@ -1,300 +1,2180 @@
-from typing import Any, List, Optional, Dict, Union
-from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Dict, Union, Iterable, Iterator, Tuple
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import ExitStack, contextmanager
+from itertools import groupby
+from operator import itemgetter
+from os.path import commonprefix
+import glob
 import json
 import os
 import pickle
+import threading
+import time
+import weakref
+from bloom import BloomFilter
+from encoded_values import EncodedValues, VALUE_CODECS
+from metrics import Metrics
+from prefix_keys import PrefixKeys
+from wal import WriteAheadLog
+
+# Minimum degree used for new tables. Every node except the root holds
+# between order - 1 and 2 * order - 1 keys, so an order of 64 keeps about a
+# hundred keys per node and a million rows fit in a tree of height 3-4.
+DEFAULT_ORDER = 64
+
+# Key types that can be stored in a packed array instead of a list of
+# boxed Python objects.
+KEY_TYPECODES = {"int": "q", "float": "d"}
+
+# Declared key types: packed numbers, or strings stored with each node's
+# common prefix factored out (for long keys such as tenant:user:uuid)
+KEY_TYPES = ("int", "float", "str")
+
+# Fraction of each node filled by the bulk loader. 1.0 packs nodes fully,
+# which is ideal for read-mostly tables; lower values leave room for
+# later inserts without immediate splits.
+DEFAULT_FILL_FACTOR = 1.0
+
+# Compaction packs nodes to this fill, leaving some room so the next
+# inserts do not split straight away. Tables whose leaves are on average
+# less full than COMPACT_THRESHOLD are compacted at checkpoints.
+COMPACT_FILL_FACTOR = 0.9
+COMPACT_THRESHOLD = 0.55
+
+# Times compaction rebuilds from a fresh snapshot after a concurrent write
+# before rebuilding under the write latch instead
+COMPACT_RETRIES = 3
+
+# Pairs a range scan reads per latch acquisition
+RANGE_BATCH = 256
+
+# Resume marker for range scans; None is a valid bound meaning "open"
+_NO_KEY = object()
+
+# Returned by a BPlusTree.put chooser to leave the tree unchanged
+KEEP = object()
+
+class RWLock:
+    """Writer-preferring reader-writer lock
+
+    The thread holding the write side may re-enter either side, so tree
+    operations can call each other. With exclusive=True reads are
+    serialized too, for trees whose reads mutate shared state.
+    """
+
+    def __init__(self, exclusive: bool = False):
+        lock = threading.Lock()
+        self._read_ok = threading.Condition(lock)
+        self._write_ok = threading.Condition(lock)
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._write_depth = 0
+        # Writers announce themselves under their own lock before queueing
+        # for the shared one, so a stream of readers cannot starve them.
+        self._waiting_lock = threading.Lock()
+        self._waiting_writers = 0
+        self.exclusive = exclusive
+
+    @contextmanager
+    def read(self):
+        if self.exclusive or self._writer == threading.get_ident():
+            with self.write():
+                yield
+            return
+        with self._read_ok:
+            while self._writer is not None or self._waiting_writers:
+                self._read_ok.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._read_ok:
+                self._readers -= 1
+                if not self._readers and self._waiting_writers:
+                    self._write_ok.notify()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._write_depth += 1
+        else:
+            with self._waiting_lock:
+                self._waiting_writers += 1
+            with self._write_ok:
+                while self._writer is not None or self._readers:
+                    self._write_ok.wait()
+                self._writer = me
+                self._write_depth = 1
+                with self._waiting_lock:
+                    self._waiting_writers -= 1
+        try:
+            yield
+        finally:
+            self._write_depth -= 1
+            if not self._write_depth:
+                with self._write_ok:
+                    self._writer = None
+                    # Wake one writer, or every reader once no writer waits
+                    if self._waiting_writers:
+                        self._write_ok.notify()
+                    else:
+                        self._read_ok.notify_all()
 
-@dataclass
 class Node:
-    leaf: bool
-    keys: List[Any]
-    children: List['Node']
-    values: List[Dict[str, Any]]  # Only used in leaf nodes
-    next_leaf: Optional['Node'] = None  # For leaf node linking
+    __slots__ = ("leaf", "keys", "children", "values", "next_leaf", "prev_leaf", "epoch", "counts", "summary")
+
+    def __init__(self, leaf: bool, keys: Union[List[Any], array], children: List['Node'],
+                 values: List[Dict[str, Any]], next_leaf: Optional['Node'] = None,
+                 prev_leaf: Optional['Node'] = None, epoch: int = 0):
+        self.leaf = leaf
+        self.keys = keys
+        self.children = children
+        self.values = values  # Only used in leaf nodes
+        self.next_leaf = next_leaf  # For leaf node linking
+        self.prev_leaf = prev_leaf  # For reverse scans
+        self.epoch = epoch  # Tree epoch the node was created in
+        self.counts: Optional[List[int]] = None  # Keys under each child; internal nodes only
+        self.summary: Optional[Dict[str, Tuple]] = None  # Cached field aggregates of the subtree
+
+    def __repr__(self):
+        return f"Node(leaf={self.leaf}, keys={list(self.keys)})"
+
+    def __getstate__(self):
+        # The leaf chain is rebuilt by BPlusTree.__setstate__; pickling it
+        # would recurse once per leaf.
+        return (self.leaf, self.keys, self.children, self.values, self.counts)
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple) and len(state) == 2:
+            state = state[0] or state[1]  # Default slot state: (None, slots)
+        if isinstance(state, dict):
+            # Pickles written by the old dataclass layout
+            state = (state["leaf"], state["keys"], state["children"], state["values"])
+        if len(state) == 4:
+            state += (None,)  # Saved before subtree counts; BPlusTree recounts
+        self.leaf, self.keys, self.children, self.values, self.counts = state
+        self.next_leaf = None
+        self.prev_leaf = None
+        self.epoch = 0
+        self.summary = None
+
+def _separator(left: Any, right: Any) -> Any:
+    """Shortest key s with left < s <= right to route between two leaves
+
+    For string keys this is right cut just past the first character where
+    it differs from left, so internal nodes hold short separators however
+    long the keys are. Other keys are used whole.
+    """
+    if isinstance(left, str) and isinstance(right, str):
+        return right[:len(commonprefix([left, right])) + 1]
+    return right
+
+def _summarize(values: Iterable[Any], field: str) -> Tuple:
+    """(count, sum, min, max) of the numeric values of field in records"""
+    count, total, low, high = 0, 0, None, None
+    for record in values:
+        value = record.get(field) if isinstance(record, dict) else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            count += 1
+            total += value
+            if low is None or value < low:
+                low = value
+            if high is None or value > high:
+                high = value
+    return count, total, low, high
+
+def _combine(summaries: Iterable[Tuple]) -> Tuple:
+    count, total, low, high = 0, 0, None, None
+    for part_count, part_total, part_low, part_high in summaries:
+        if part_count:
+            count += part_count
+            total += part_total
+            low = part_low if low is None else min(low, part_low)
+            high = part_high if high is None else max(high, part_high)
+    return count, total, low, high
+
+def _comparable_key(key: Any, sample: Any) -> bool:
+    """Whether an untyped tree holding sample can order and hash key"""
+    try:
+        hash(key)
+        key < sample
+        sample < key
+    except TypeError:
+        return False
+    return True
 
 class BPlusTree:
-    def __init__(self, order: int):
-        self.root = Node(leaf=True, keys=[], children=[], values=[])
+    key_type: Optional[str] = None
+    value_codec: Optional[str] = None  # How leaves store records; None keeps the objects
+    storage = "memory"
+    bloom: Optional[BloomFilter] = None  # Answers most lookups of absent keys
+    # Split/merge/borrow counts, kept when the owning database has metrics on
+    counters: Optional[Dict[str, int]] = None
+    # Copy-on-write state: nodes created in an epoch up to _shared_epoch may
+    # be reachable from a live snapshot and are copied before being changed.
+    _epoch = 0
+    _shared_epoch = -1
+
+    def __init__(self, order: int, key_type: Optional[str] = None, value_codec: Optional[str] = None):
+        if order < 2:
+            raise ValueError("B+ tree order must be at least 2")
+        if key_type is not None and key_type not in KEY_TYPES:
+            raise ValueError(f"Unsupported key type '{key_type}'")
+        if value_codec is not None and value_codec not in VALUE_CODECS:
+            raise ValueError(f"Unsupported value codec '{value_codec}'")
         self.order = order
+        self.key_type = key_type
+        self.value_codec = value_codec
+        self.indexes: Dict[str, Any] = {}  # Field name -> SecondaryIndex
+        self.latch = self._new_latch()
+        self._snapshots: "weakref.WeakSet[TreeSnapshot]" = weakref.WeakSet()
+        self.root = self._new_node(leaf=True, keys=self._new_keys(), children=[], values=self._new_values())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("latch", "_snapshots", "_epoch", "_shared_epoch", "counters"):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault("indexes", {})
+        self.__dict__.update(state)
+        self.latch = self._new_latch()
+        self._snapshots = weakref.WeakSet()
+        self._relink_leaves()
+        if not self.root.leaf and self.root.counts is None:
+            self._recount(self.root)
+
+    def _new_latch(self) -> 'RWLock':
+        return RWLock()
+
+    def _new_index_tree(self, field: str) -> 'BPlusTree':
+        """Create the tree backing a secondary index on field"""
+        return BPlusTree(self.order)
+
+    def _new_node(self, leaf: bool, keys: Union[List[Any], array], children: List[Node],
+                  values: List[Dict[str, Any]]) -> Node:
+        """Create a node; storage backends override this to place it"""
+        return Node(leaf=leaf, keys=keys, children=children, values=values, epoch=self._epoch)
+
+    def _new_keys(self) -> Union[List[Any], array, PrefixKeys]:
+        """Empty key container for a new node"""
+        if self.key_type is None:
+            return []
+        if self.key_type == "str":
+            return PrefixKeys()
+        return array(KEY_TYPECODES[self.key_type])
+
+    def _new_values(self) -> Union[List[Dict[str, Any]], EncodedValues]:
+        """Empty value container for a new leaf"""
+        if self.value_codec is None:
+            return []
+        return EncodedValues(compress=self.value_codec == "json+zlib")
+
+    def accepts_key(self, key: Any) -> bool:
+        """Whether key can be stored in this tree's key containers; an
+        untyped tree takes keys that compare with the ones it holds"""
+        if self.key_type is None:
+            with self.latch.read():
+                keys = self.root.keys
+                return _comparable_key(key, keys[0] if len(keys) else key)
+        if self.key_type == "str":
+            return isinstance(key, str)
+        if isinstance(key, bool):
+            return False
+        if self.key_type == "int":
+            return isinstance(key, int) and -2 ** 63 <= key < 2 ** 63
+        return isinstance(key, (int, float))
+
+    def _relink_leaves(self):
+        """Rebuild the leaf chain from the tree structure"""
+        level = [self.root]
+        while not level[0].leaf:
+            level = [child for node in level for child in node.children]
+        for left, right in zip(level, level[1:]):
+            left.next_leaf = right
+            right.prev_leaf = left
+        level[0].prev_leaf = None
+        level[-1].next_leaf = None
+
+    def snapshot(self) -> 'TreeSnapshot':
+        """Freeze the current version of the tree for lock-free reads
+
+        Taking a snapshot is O(1). Afterwards writers copy each node on
+        the path they change instead of changing it in place, so the
+        snapshot keeps seeing the tree exactly as it was. Copies stop once
+        every snapshot has been released or garbage collected.
+        """
+        with self.latch.write():
+            snapshot = TreeSnapshot(self.root, self.order, self.key_type, self._snapshots)
+            self._snapshots.add(snapshot)
+            self._shared_epoch = self._epoch
+            self._epoch += 1
+            return snapshot
+
+    def _begin_write(self):
+        """Called under the write latch before changing any node"""
+        if self._shared_epoch >= 0 and not self._snapshots:
+            self._shared_epoch = -1  # No reader holds an old version any more
+
+    def _own_root(self) -> Node:
+        """Make the root safe to change, copying it if a snapshot shares it"""
+        if self._shared_epoch >= 0 and self.root.epoch <= self._shared_epoch:
+            self.root = self._copy_node(self.root)
+        self.root.summary = None  # The write is about to change the subtree
+        return self.root
+
+    def _own_child(self, parent: Node, index: int) -> Node:
+        """Make a child of an already owned parent safe to change"""
+        child = parent.children[index]
+        if self._shared_epoch >= 0 and child.epoch <= self._shared_epoch:
+            child = parent.children[index] = self._copy_node(child)
+        child.summary = None
+        return child
+
+    def _own_path(self, key: Any) -> Node:
+        """Own every node on the path to key's leaf and return the leaf"""
+        node = self._own_root()
+        while not node.leaf:
+            node = self._own_child(node, bisect_right(node.keys, key))
+        return node
+
+    def _copy_node(self, node: Node) -> Node:
+        copy = self._new_node(leaf=node.leaf, keys=node.keys[:], children=node.children[:],
+                              values=node.values[:])
+        if not node.leaf:
+            copy.counts = node.counts[:]
+        if node.leaf:
+            # Snapshots never follow the leaf chain, so the live chain is
+            # simply rewired to the copy.
+            copy.prev_leaf, copy.next_leaf = node.prev_leaf, node.next_leaf
+            if node.prev_leaf is not None:
+                node.prev_leaf.next_leaf = copy
+            if node.next_leaf is not None:
+                node.next_leaf.prev_leaf = copy
+        return copy
+
     def insert(self, key: Any, value: Dict[str, Any]):
-        # If root is full, create new root
-        if len(self.root.keys) == (2 * self.order) - 1:
-            old_root = self.root
-            self.root = Node(leaf=False, keys=[], children=[old_root], values=[])
-            self._split_child(self.root, 0)
-        self._insert_non_full(self.root, key, value)
+        self.put(key, lambda old: value)
+
+    def insert_if_absent(self, key: Any, value: Dict[str, Any]) -> bool:
+        """Insert only if key is absent; returns whether it was inserted"""
+        return self.put(key, lambda old: value if old is None else KEEP) is None
+
+    def upsert(self, key: Any, value: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Insert or replace key's value; returns the previous value"""
+        return self.put(key, lambda old: value)
+
+    def compare_and_set(self, key: Any, matches: Callable[[Dict[str, Any]], bool],
+                        value: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Replace key's value only if matches(current value) holds
+
+        Returns the value found (None if the key is absent) and whether
+        it was replaced.
+        """
+        swapped = False
+
+        def choose(old):
+            nonlocal swapped
+            if old is None or not matches(old):
+                return KEEP
+            swapped = True
+            return value
+
+        return self.put(key, choose), swapped
+
+    def put(self, key: Any, choose: Callable[[Optional[Dict[str, Any]]], Any]) -> Optional[Dict[str, Any]]:
+        """Insert, replace or keep key's value in a single descent
+
+        choose(old) is called at the leaf with the current value (None if
+        the key is absent) and returns the value to store, or KEEP to
+        leave the record as it is. Returns the previous value.
+        """
+        with self.latch.write():
+            self._begin_write()
+            self._own_root()
+            # If root is full, create new root
+            if len(self.root.keys) == (2 * self.order) - 1:
+                old_root = self.root
+                self.root = self._new_node(leaf=False, keys=self._new_keys(), children=[old_root], values=[])
+                self.root.counts = [self._subtree_count(old_root)]
+                self._split_child(self.root, 0)
+            return self._insert_non_full(self.root, key, choose)
+
     def _split_child(self, parent: Node, child_index: int):
         order = self.order
-        child = parent.children[child_index]
-        new_node = Node(leaf=child.leaf, keys=[], children=[], values=[])
-        
-        # Move half the keys to new node
-        mid = order - 1
-        parent.keys.insert(child_index, child.keys[mid])
-        new_node.keys = child.keys[mid + 1:]
-        child.keys = child.keys[:mid]
-        
-        if not child.leaf:
+        child = self._own_child(parent, child_index)
+        new_node = self._new_node(leaf=child.leaf, keys=self._new_keys(), children=[], values=[])
+
+        if child.leaf:
+            # Leaves keep every key; the first key of the right half is
+            # copied up as the separator.
+            new_node.keys = child.keys[order:]
+            new_node.values = child.values[order:]
+            child.keys = child.keys[:order]
+            child.values = child.values[:order]
+            new_node.next_leaf = child.next_leaf
+            new_node.prev_leaf = child
+            if child.next_leaf is not None:
+                child.next_leaf.prev_leaf = new_node
+            child.next_leaf = new_node
+            separator = _separator(child.keys[-1], new_node.keys[0])
+        else:
+            # Internal nodes move the median key up to the parent.
+            mid = order - 1
+            separator = child.keys[mid]
+            new_node.keys = child.keys[mid + 1:]
             new_node.children = child.children[mid + 1:]
+            new_node.counts = child.counts[mid + 1:]
+            child.keys = child.keys[:mid]
             child.children = child.children[:mid + 1]
-        else:
-            new_node.values = child.values[mid:]
-            child.values = child.values[:mid]
-            
+            child.counts = child.counts[:mid + 1]
+
+        parent.keys.insert(child_index, separator)
         parent.children.insert(child_index + 1, new_node)
-        
-    def _insert_non_full(self, node: Node, key: Any, value: Dict[str, Any]):
-        i = len(node.keys) - 1
-        
-        if node.leaf:
-            while i >= 0 and key < node.keys[i]:
-                i -= 1
-            node.keys.insert(i + 1, key)
-            node.values.insert(i + 1, value)
-        else:
-            while i >= 0 and key < node.keys[i]:
-                i -= 1
-            i += 1
-            
-            if len(node.children[i].keys) == (2 * self.order) - 1:
+        parent.counts[child_index] = self._subtree_count(child)
+        parent.counts.insert(child_index + 1, self._subtree_count(new_node))
+        if self.counters is not None:
+            self.counters["splits"] += 1
+
+    def _insert_non_full(self, node: Node, key: Any, choose: Callable[[Optional[Dict[str, Any]]], Any]):
+        max_keys = (2 * self.order) - 1
+        path = []  # (internal node, child index) pairs whose counts grow with a new key
+        while not node.leaf:
+            i = bisect_right(node.keys, key)
+            if len(node.children[i].keys) == max_keys:
                 self._split_child(node, i)
-                if key > node.keys[i]:
+                if key >= node.keys[i]:
                     i += 1
-            self._insert_non_full(node.children[i], key, value)
+            path.append((node, i))
+            node = self._own_child(node, i)
+
+        i = bisect_left(node.keys, key)
+        found = i < len(node.keys) and node.keys[i] == key
+        old = node.values[i] if found else None
+        value = choose(old)
+        if value is KEEP:
+            return old
+        if found:
+            node.values[i] = value
+        else:
+            node.keys.insert(i, key)
+            node.values.insert(i, value)
+            for parent, index in path:
+                parent.counts[index] += 1
+            if self.bloom is not None:
+                self.bloom.add(key)
+                self._maybe_rebuild_bloom()
+        return old
+
+    def bulk_load(self, items: Iterable[Tuple[Any, Dict[str, Any]]],
+                  fill_factor: float = DEFAULT_FILL_FACTOR) -> int:
+        """Build the tree bottom-up from (key, value) pairs
+
+        The input is sorted once and merged with any existing records;
+        existing keys and the first occurrence of a repeated key win.
+        Returns the number of new keys added.
+        """
+        if not 0 < fill_factor <= 1:
+            raise ValueError("Fill factor must be in (0, 1]")
+        items = list(items)
+        with self.latch.write():
+            existing = list(self.range())
+            # Existing records come first, so the stable sort keeps them ahead
+            # of new records with the same key; timsort merges the two runs.
+            combined = sorted(existing + items, key=itemgetter(0))
+            merged = [next(group) for _, group in groupby(combined, key=itemgetter(0))]
+            added = len(merged) - len(existing)
+
+            self.root = self._build(merged, fill_factor)
+            if self.bloom is not None:
+                self.bloom = BloomFilter.build((key for key, _ in merged), self.bloom.fp_rate, len(merged))
+            return added
+
+    def _build(self, items: List[Tuple[Any, Dict[str, Any]]], fill_factor: float) -> Node:
+        """Pack sorted unique items into leaves, then stack internal levels"""
+        order = self.order
+        leaf_fill = max(order - 1, min(2 * order - 1, round(fill_factor * (2 * order - 1))))
+        level = []
+        min_keys = []  # Lower bound of the keys under each node of the current level
+        for chunk in self._chunks(items, leaf_fill, order - 1):
+            keys = self._new_keys()
+            keys.extend(key for key, _ in chunk)
+            values = self._new_values()
+            values.extend(value for _, value in chunk)
+            leaf = self._new_node(leaf=True, keys=keys, children=[], values=values)
+            if level:
+                level[-1].next_leaf = leaf
+                leaf.prev_leaf = level[-1]
+                min_keys.append(_separator(level[-1].keys[-1], chunk[0][0]))
+            else:
+                min_keys.append(chunk[0][0] if chunk else None)
+            level.append(leaf)
+
+        child_fill = max(order, min(2 * order, round(fill_factor * 2 * order)))
+        while len(level) > 1:
+            parents, parent_min_keys = [], []
+            positions = range(len(level))
+            for chunk in self._chunks(positions, child_fill, order):
+                keys = self._new_keys()
+                keys.extend(min_keys[j] for j in chunk[1:])
+                parent = self._new_node(leaf=False, keys=keys, children=[level[j] for j in chunk], values=[])
+                parent.counts = [self._subtree_count(level[j]) for j in chunk]
+                parents.append(parent)
+                parent_min_keys.append(min_keys[chunk[0]])
+            level, min_keys = parents, parent_min_keys
+        return level[0]
+
+    @staticmethod
+    def _chunks(items, fill: int, minimum: int) -> List:
+        """Split items into nearly equal runs of at most fill (where
+        possible) and at least minimum entries"""
+        n = len(items)
+        count = max(1, -(-n // fill))
+        count = min(count, max(1, n // minimum))
+        base, extra = divmod(n, count)
+        chunks, pos = [], 0
+        for i in range(count):
+            size = base + (1 if i < extra else 0)
+            chunks.append(items[pos:pos + size])
+            pos += size
+        return chunks
+
+    def _find_leaf(self, key: Any) -> Node:
+        """Descend to the leaf that may contain key"""
+        node = self.root
+        while not node.leaf:
+            node = node.children[bisect_right(node.keys, key)]
+        return node
 
     def search(self, key: Any) -> Optional[Dict[str, Any]]:
         """Search for a key and return its associated value"""
+        bloom = self.bloom
+        if bloom is not None and not bloom.might_contain(key):
+            return None
+        with self.latch.read():
+            node = self._find_leaf(key)
+            i = bisect_left(node.keys, key)
+            if i < len(node.keys) and node.keys[i] == key:
+                return node.values[i]
+            if bloom is not None:
+                bloom.false_positives += 1
+            return None
+
+    def enable_bloom(self, fp_rate: Optional[float]):
+        """Build a Bloom filter over the current keys, or drop it if
+        fp_rate is None"""
+        with self.latch.write():
+            if fp_rate is None:
+                self.bloom = None
+            else:
+                self.bloom = self._build_bloom(fp_rate)
+
+    def _build_bloom(self, fp_rate: float) -> BloomFilter:
+        count = 0
+        for _ in self.range():
+            count += 1
+        return BloomFilter.build((key for key, _ in self.range()), fp_rate, count)
+
+    def _maybe_rebuild_bloom(self):
+        """Rebuild an outgrown filter; called under the write latch"""
+        if self.bloom.needs_rebuild():
+            self.bloom = self._build_bloom(self.bloom.fp_rate)
+
+    def range(self, start: Any = None, end: Any = None, reverse: bool = False,
+              limit: Optional[int] = None) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        """Lazily yield (key, value) pairs with start <= key < end
+
+        Either bound may be None for an open range. Only the leaves that
+        overlap the range are visited, following the leaf chain. Pairs are
+        read in batches under the read latch, which is released between
+        batches so a slow consumer never blocks writers.
+        """
+        if limit is not None and limit <= 0:
+            return
+        count = 0
+        after = _NO_KEY
+        while True:
+            max_items = RANGE_BATCH if limit is None else min(RANGE_BATCH, limit - count)
+            with self.latch.read():
+                batch, exhausted = self._range_batch(start, end, reverse, after, max_items)
+            for pair in batch:
+                yield pair
+            count += len(batch)
+            if exhausted or count == limit or not batch:
+                return
+            after = batch[-1][0]  # Resume past the last key from a fresh descent
+
+    def _range_batch(self, start: Any, end: Any, reverse: bool, after: Any,
+                     max_items: int) -> Tuple[List[Tuple[Any, Dict[str, Any]]], bool]:
+        """Collect up to max_items pairs of a range scan, resuming after
+        the key `after`; also reports whether the range is exhausted"""
+        batch = []
+        if not reverse:
+            if after is not _NO_KEY:
+                node = self._find_leaf(after)
+                i = bisect_right(node.keys, after)
+            elif start is None:
+                node = self._leftmost_leaf()
+                i = 0
+            else:
+                node = self._find_leaf(start)
+                i = bisect_left(node.keys, start)
+            while node is not None:
+                keys, values = node.keys, node.values
+                while i < len(keys):
+                    key = keys[i]
+                    if end is not None and key >= end:
+                        return batch, True
+                    batch.append((key, values[i]))
+                    if len(batch) == max_items:
+                        return batch, False
+                    i += 1
+                node, i = node.next_leaf, 0
+        else:
+            if after is not _NO_KEY:
+                node = self._find_leaf(after)
+                i = bisect_left(node.keys, after) - 1
+            elif end is None:
+                node = self._rightmost_leaf()
+                i = len(node.keys) - 1
+            else:
+                node = self._find_leaf(end)
+                i = bisect_left(node.keys, end) - 1
+            while node is not None:
+                keys, values = node.keys, node.values
+                while i >= 0:
+                    key = keys[i]
+                    if start is not None and key < start:
+                        return batch, True
+                    batch.append((key, values[i]))
+                    if len(batch) == max_items:
+                        return batch, False
+                    i -= 1
+                node = node.prev_leaf
+                if node is not None:
+                    i = len(node.keys) - 1
+        return batch, True
+
+    def items(self) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        """Yield every (key, value) pair in key order"""
+        return self.range()
+
+    def _leftmost_leaf(self) -> Node:
         node = self.root
         while not node.leaf:
-            i = 0
-            while i < len(node.keys) and key >= node.keys[i]:
-                i += 1
-            node = node.children[i]
-        
-        for i, k in enumerate(node.keys):
-            if k == key:
-                return node.values[i]
-        return None
+            node = node.children[0]
+        return node
 
-    def update(self, key: Any, value: Dict[str, Any]) -> bool:
-        """Update the value associated with a key"""
+    def _rightmost_leaf(self) -> Node:
         node = self.root
         while not node.leaf:
-            i = 0
-            while i < len(node.keys) and key >= node.keys[i]:
-                i += 1
-            node = node.children[i]
-        
-        for i, k in enumerate(node.keys):
-            if k == key:
+            node = node.children[-1]
+        return node
+
+    def update(self, key: Any, value: Dict[str, Any]) -> bool:
+        """Update the value associated with a key"""
+        with self.latch.write():
+            self._begin_write()
+            node = self._find_leaf(key)
+            i = bisect_left(node.keys, key)
+            if i < len(node.keys) and node.keys[i] == key:
+                # Owning the path also drops the cached aggregates above it
+                node = self._own_path(key)
                 node.values[i] = value
                 return True
-        return False
+            return False
 
     def delete(self, key: Any) -> bool:
         """Delete a key-value pair from the tree"""
-        if not self.root.keys:
-            return False
+        with self.latch.write():
+            if not self.root.keys:
+                return False
+
+            self._begin_write()
+            found = self._delete(self._own_root(), key)
+
+            # If root has no keys and is not a leaf, make its first child the new root
+            if not self.root.leaf and not self.root.keys:
+                self.root = self.root.children[0]
+            if found and self.bloom is not None:
+                self.bloom.deletes += 1
+                self._maybe_rebuild_bloom()
+            return found
 
-        self._delete(self.root, key)
-        
-        # If root has no keys and is not a leaf, make its first child the new root
-        if not self.root.leaf and not self.root.keys:
-            self.root = self.root.children[0]
-        return True
-    
     def read(self, key: Any) -> Optional[Dict[str, Any]]:
         """Read a key-value pair from the tree"""
-        def find_key(node: Node, key: Any) -> int:
-            return next((i for i, k in enumerate(node.keys) if k == key), -1)
+        return self.search(key)
 
-        if not self.root.keys:
-            return None
-        
-        i = find_key(self.root, key)
-        if i == -1:
-            return None
-        
-        node = self.root
+    def search_many(self, keys: Iterable[Any]) -> List[Optional[Dict[str, Any]]]:
+        """Search for many keys at once; values come back in input order
+
+        Keys are looked up in sorted order, so keys in the same leaf share
+        one descent and a key in the next leaf is reached over the chain.
+        """
+        keys = list(keys)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(keys)
+        with self.latch.read():
+            node = None
+            for pos in sorted(range(len(keys)), key=keys.__getitem__):
+                key = keys[pos]
+                if self.bloom is not None and not self.bloom.might_contain(key):
+                    continue
+                if node is None:
+                    node = self._find_leaf(key)
+                elif node.keys and key > node.keys[-1]:
+                    next_leaf = node.next_leaf
+                    if next_leaf is None or key < next_leaf.keys[0]:
+                        continue  # Between this leaf and the next, so absent
+                    node = next_leaf if key <= next_leaf.keys[-1] else self._find_leaf(key)
+                i = bisect_left(node.keys, key)
+                if i < len(node.keys) and node.keys[i] == key:
+                    results[pos] = node.values[i]
+        return results
+
+    def insert_many(self, items: Iterable[Tuple[Any, Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+        """Insert or overwrite many pairs under one latch hold; returns
+        each pair's previous value (None if its key was new), in input order
+
+        Pairs are applied in key order, a repeated key in input order, so
+        its last pair wins. Each pair is still its own descent: the batch
+        saves latch round trips, not tree walks.
+        """
+        items = list(items)
+        olds: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        with self.latch.write():
+            for pos in sorted(range(len(items)), key=lambda pos: items[pos][0]):
+                olds[pos] = self.upsert(*items[pos])
+        return olds
+
+    def delete_many(self, keys: Iterable[Any]) -> List[bool]:
+        """Delete many keys under one latch hold, in key order; returns
+        whether each key was found, in input order"""
+        keys = list(keys)
+        found = [False] * len(keys)
+        with self.latch.write():
+            for pos in sorted(range(len(keys)), key=keys.__getitem__):
+                found[pos] = self.delete(keys[pos])
+        return found
+
+    def height(self) -> int:
+        """Number of nodes visited by a root-to-leaf descent"""
+        with self.latch.read():
+            height, node = 1, self.root
+            while not node.leaf:
+                node = node.children[0]
+                height += 1
+            return height
+
+    @staticmethod
+    def _subtree_count(node: Node) -> int:
+        return len(node.keys) if node.leaf else sum(node.counts)
+
+    def _recount(self, node: Node) -> int:
+        """Recompute the subtree counts below node (trees saved without them)"""
+        if node.leaf:
+            return len(node.keys)
+        node.counts = [self._recount(child) for child in node.children]
+        return sum(node.counts)
+
+    def _count_below(self, key: Any) -> int:
+        """Number of keys less than key, from one descent"""
+        node, count = self.root, 0
         while not node.leaf:
+            i = bisect_right(node.keys, key)
+            count += sum(node.counts[:i])
             node = node.children[i]
-            i = find_key(node, key)
+        return count + bisect_left(node.keys, key)
+
+    def _count_range(self, start: Any, end: Any) -> int:
+        high = self._subtree_count(self.root) if end is None else self._count_below(end)
+        low = 0 if start is None else self._count_below(start)
+        return max(0, high - low)
+
+    def count_range(self, start: Any = None, end: Any = None) -> int:
+        """Number of keys with start <= key < end, in O(log n) from the
+        subtree counts; either bound may be None"""
+        with self.latch.read():
+            return self._count_range(start, end)
+
+    def rank(self, key: Any) -> int:
+        """Number of keys less than key (key's position if present)"""
+        with self.latch.read():
+            return self._count_below(key)
+
+    def select(self, k: int) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """The (key, value) pair at position k in key order, or None"""
+        with self.latch.read():
+            node = self.root
+            if not 0 <= k < self._subtree_count(node):
+                return None
+            while not node.leaf:
+                i = 0
+                while k >= node.counts[i]:
+                    k -= node.counts[i]
+                    i += 1
+                node = node.children[i]
+            return node.keys[k], node.values[k]
+
+    def aggregate(self, field: str, start: Any = None, end: Any = None) -> Dict[str, Any]:
+        """Count, sum, min, max and mean of a numeric field over the
+        records with start <= key < end
+
+        Subtrees wholly inside the range answer from cached per-node
+        aggregates, so only the two boundary paths are read once a field
+        has been aggregated before. Writes drop the cache along the path
+        they change; records where the field is missing or not a number
+        are skipped. "records" counts every record in the range.
+        """
+        with self.latch.read():
+            records = self._count_range(start, end)
+            if records:
+                count, total, low, high = self._aggregate(self.root, field, start, end)
+            else:
+                count, total, low, high = 0, 0, None, None
+        return {
+            "records": records,
+            "count": count,
+            "sum": total,
+            "min": low,
+            "max": high,
+            "avg": total / count if count else None,
+        }
+
+    def _aggregate(self, node: Node, field: str, start: Any, end: Any) -> Tuple:
+        if start is None and end is None:
+            return self._summary(node, field)
+        if node.leaf:
+            first = 0 if start is None else bisect_left(node.keys, start)
+            last = len(node.keys) if end is None else bisect_left(node.keys, end)
+            return _summarize(node.values[first:last], field) if first < last else (0, 0, None, None)
+        first = 0 if start is None else bisect_right(node.keys, start)
+        last = len(node.children) - 1 if end is None else bisect_right(node.keys, end)
+        if first == last:
+            return self._aggregate(node.children[first], field, start, end)
+        parts = [self._aggregate(node.children[first], field, start, None)]
+        parts.extend(self._summary(node.children[i], field) for i in range(first + 1, last))
+        parts.append(self._aggregate(node.children[last], field, None, end))
+        return _combine(parts)
+
+    def _summary(self, node: Node, field: str) -> Tuple:
+        """Aggregates of field over node's subtree, cached on the node"""
+        cache = node.summary
+        if cache is not None and field in cache:
+            return cache[field]
+        if node.leaf:
+            result = _summarize(node.values, field)
+        else:
+            result = _combine(self._summary(child, field) for child in node.children)
+        if cache is None:
+            cache = node.summary = {}
+        cache[field] = result
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Structural health: size, height and how full the nodes are
 
+        Walks every node, so the cost grows with the table; a falling fill
+        ratio or a growing height for the same key count means the tree is
+        degenerating.
+        """
+        capacity = 2 * self.order - 1
+        leaves = internal = leaf_keys = internal_keys = 0
+        with self.latch.read():
+            # Depth first, so only one path of nodes is held at a time; a
+            # paged tree's children are read through its buffer pool
+            stack, height = [iter((self.root,))], 0
+            while stack:
+                node = next(stack[-1], None)
+                if node is None:
+                    stack.pop()
+                    continue
+                height = max(height, len(stack))
+                if node.leaf:
+                    leaves += 1
+                    leaf_keys += len(node.keys)
+                else:
+                    internal += 1
+                    internal_keys += len(node.keys)
+                    stack.append(iter(node.children))
+            stats = {
+                "order": self.order,
+                "storage": self.storage,
+                "height": height,
+                "nodes": leaves + internal,
+                "leaves": leaves,
+                "keys": leaf_keys,
+                "leaf_fill": leaf_keys / (leaves * capacity),
+                "internal_fill": internal_keys / (internal * capacity) if internal else 0.0,
+            }
+            if self.counters is not None:
+                stats.update(self.counters)
+        return stats
 
-    def _delete(self, node: Node, key: Any):
-        def find_key(node: Node, key: Any) -> int:
-            return next((i for i, k in enumerate(node.keys) if k == key), -1)
+    def compact(self, fill_factor: float = COMPACT_FILL_FACTOR) -> Dict[str, Any]:
+        """Rebuild the tree with nodes filled to fill_factor
 
+        Heavy deletes leave nodes barely over half full and stale keys as
+        separators. The new tree is built from a snapshot without holding
+        the latch and swapped in if no write happened meanwhile. Returns
+        the nodes and height reclaimed.
+        """
+        if not 0 < fill_factor <= 1:
+            raise ValueError("Fill factor must be in (0, 1]")
+        before = self.stats()
+        self._rebuild(fill_factor)
+        after = self.stats()
+        return {
+            "nodes_before": before["nodes"],
+            "nodes_after": after["nodes"],
+            "nodes_reclaimed": before["nodes"] - after["nodes"],
+            "height_before": before["height"],
+            "height_after": after["height"],
+            "height_reclaimed": before["height"] - after["height"],
+            "leaf_fill_before": before["leaf_fill"],
+            "leaf_fill_after": after["leaf_fill"],
+        }
+
+    def _rebuild(self, fill_factor: float):
+        for _ in range(COMPACT_RETRIES):
+            # While the snapshot is held every write copies the root, so an
+            # unchanged root means the rebuilt tree is still current
+            with self.snapshot() as snapshot:
+                root = self._build(list(snapshot.items()), fill_factor)
+                with self.latch.write():
+                    if self.root is snapshot.root:
+                        self.root = root
+                        return
+        with self.latch.write():
+            self.root = self._build(list(self.range()), fill_factor)
+
+    def _delete(self, node: Node, key: Any) -> bool:
         def merge(left: Node, right: Node, parent: Node, index: int):
             """Merge two nodes"""
-            if not node.leaf:
-                left.keys.append(parent.keys.pop(index))
-            left.keys.extend(right.keys)
-            if not node.leaf:
+            separator = parent.keys.pop(index)
+            if not left.leaf:
+                left.keys.append(separator)
+                left.keys.extend(right.keys)
                 left.children.extend(right.children)
+                left.counts.extend(right.counts)
             else:
+                left.keys.extend(right.keys)
                 left.values.extend(right.values)
                 left.next_leaf = right.next_leaf
+                if right.next_leaf is not None:
+                    right.next_leaf.prev_leaf = left
             parent.children.pop(index + 1)
+            parent.counts[index] += parent.counts.pop(index + 1)
+            if self.counters is not None:
+                self.counters["merges"] += 1
 
-        min_keys = (self.order - 1) // 2 if not node.leaf else (self.order // 2)
-        key_index = find_key(node, key)
+        min_keys = self.order - 1
+        path = []  # (internal node, child index) pairs whose counts shrink if key is found
 
-        # If we're at a leaf node
-        if node.leaf:
-            if key_index != -1:  # Key found in current node
-                node.keys.pop(key_index)
-                node.values.pop(key_index)
-                return
-            return  # Key not found
-
-        # If we're at an internal node
-        if key_index != -1:
-            # Get predecessor or successor
-            if len(node.children[key_index].keys) >= self.order:
-                pred = self._get_predecessor(node, key_index)
-                node.keys[key_index] = pred
-                self._delete(node.children[key_index], pred)
-            elif len(node.children[key_index + 1].keys) >= self.order:
-                succ = self._get_successor(node, key_index)
-                node.keys[key_index] = succ
-                self._delete(node.children[key_index + 1], succ)
-            else:
-                merge(node.children[key_index], node.children[key_index + 1], node, key_index)
-                self._delete(node.children[key_index], key)
-        else:
-            # Find the child which should contain the key
-            child_index = len(node.keys)
-            for i, k in enumerate(node.keys):
-                if key < k:
-                    child_index = i
-                    break
-            
-            child = node.children[child_index]
-            if len(child.keys) == min_keys:  # Child has minimum number of keys
+        # Walk down, making sure every child we enter can lose a key
+        # without underflowing, so no fix-ups are needed on the way back.
+        while not node.leaf:
+            child_index = bisect_right(node.keys, key)
+            child = self._own_child(node, child_index)
+            if len(child.keys) == min_keys:
                 # Try to borrow from siblings
                 if child_index > 0 and len(node.children[child_index - 1].keys) > min_keys:
                     self._borrow_from_prev(node, child_index)
+                    if self.counters is not None:
+                        self.counters["borrows"] += 1
                 elif child_index < len(node.children) - 1 and len(node.children[child_index + 1].keys) > min_keys:
                     self._borrow_from_next(node, child_index)
+                    if self.counters is not None:
+                        self.counters["borrows"] += 1
                 else:  # Merge with a sibling
                     if child_index > 0:
-                        merge(node.children[child_index - 1], child, node, child_index - 1)
-                        child = node.children[child_index - 1]
+                        left = self._own_child(node, child_index - 1)
+                        merge(left, child, node, child_index - 1)
+                        child, child_index = left, child_index - 1
                     else:
                         merge(child, node.children[child_index + 1], node, child_index)
-            
-            self._delete(child, key)
-
-    def _get_predecessor(self, node: Node, index: int) -> Any:
-        """Get the predecessor of the key at the given index"""
-        current = node.children[index]
-        while not current.leaf:
-            current = current.children[-1]
-        return current.keys[-1]
-
-    def _get_successor(self, node: Node, index: int) -> Any:
-        """Get the successor of the key at the given index"""
-        current = node.children[index + 1]
-        while not current.leaf:
-            current = current.children[0]
-        return current.keys[0]
+            path.append((node, child_index))
+            node = child
+
+        key_index = bisect_left(node.keys, key)
+        if key_index < len(node.keys) and node.keys[key_index] == key:
+            node.keys.pop(key_index)
+            node.values.pop(key_index)
+            for parent, index in path:
+                parent.counts[index] -= 1
+            return True
+        return False  # Key not found
 
     def _borrow_from_prev(self, node: Node, index: int):
         """Borrow a key from the previous sibling"""
         child = node.children[index]
-        sibling = node.children[index - 1]
+        sibling = self._own_child(node, index - 1)
 
         # Move all keys and children in child one step ahead
         if not child.leaf:
             child.keys.insert(0, node.keys[index - 1])
             node.keys[index - 1] = sibling.keys.pop()
             child.children.insert(0, sibling.children.pop())
+            moved = sibling.counts.pop()
+            child.counts.insert(0, moved)
         else:
             child.keys.insert(0, sibling.keys.pop())
             child.values.insert(0, sibling.values.pop())
             node.keys[index - 1] = child.keys[0]
+            moved = 1
+        node.counts[index - 1] -= moved
+        node.counts[index] += moved
 
     def _borrow_from_next(self, node: Node, index: int):
         """Borrow a key from the next sibling"""
         child = node.children[index]
-        sibling = node.children[index + 1]
+        sibling = self._own_child(node, index + 1)
 
         if not child.leaf:
             child.keys.append(node.keys[index])
             node.keys[index] = sibling.keys.pop(0)
             child.children.append(sibling.children.pop(0))
+            moved = sibling.counts.pop(0)
+            child.counts.append(moved)
         else:
             child.keys.append(sibling.keys.pop(0))
             child.values.append(sibling.values.pop(0))
-            node.keys[index] = sibling.keys[0] if sibling.keys else child.keys[-1]
+            node.keys[index] = sibling.keys[0]
+            moved = 1
+        node.counts[index + 1] -= moved
+        node.counts[index] += moved
+
+class TreeSnapshot:
+    """Read-only, point-in-time view of a BPlusTree
+
+    The nodes it reaches are never changed by later writes, so reads need
+    no latch and long scans neither block writers nor see their changes.
+    Scans walk down from the root instead of following the leaf chain,
+    which always links the live tree's leaves.
+    """
+
+    def __init__(self, root: Node, order: int, key_type: Optional[str] = None,
+                 registry: Optional[weakref.WeakSet] = None):
+        self.root = root
+        self.order = order
+        self.key_type = key_type
+        self.created = time.time()
+        self._registry = registry  # The tree's live snapshots
+
+    def release(self):
+        """Drop the frozen version; the tree stops copying nodes once no
+        snapshot is left"""
+        self.root = None
+        if self._registry is not None:
+            self._registry.discard(self)
+
+    def __enter__(self) -> 'TreeSnapshot':
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def _check_open(self) -> Node:
+        if self.root is None:
+            raise ValueError("Snapshot has been released")
+        return self.root
+
+    def search(self, key: Any) -> Optional[Dict[str, Any]]:
+        node = self._check_open()
+        while not node.leaf:
+            node = node.children[bisect_right(node.keys, key)]
+        i = bisect_left(node.keys, key)
+        if i < len(node.keys) and node.keys[i] == key:
+            return node.values[i]
+        return None
+
+    def read(self, key: Any) -> Optional[Dict[str, Any]]:
+        return self.search(key)
+
+    def accepts_key(self, key: Any) -> bool:
+        if self.key_type is None:
+            keys = self._check_open().keys
+            return _comparable_key(key, keys[0] if len(keys) else key)
+        return BPlusTree.accepts_key(self, key)
+
+    def _leaves(self, start: Any, end: Any, reverse: bool) -> Iterator[Node]:
+        """Yield the leaves that may overlap [start, end) in scan order"""
+        stack = [iter((self._check_open(),))]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+            elif node.leaf:
+                yield node
+            else:
+                lo = 0 if start is None else bisect_right(node.keys, start)
+                hi = len(node.keys) if end is None else bisect_left(node.keys, end)
+                children = node.children[lo:hi + 1]
+                stack.append(reversed(children) if reverse else iter(children))
+
+    def range(self, start: Any = None, end: Any = None, reverse: bool = False,
+              limit: Optional[int] = None) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        """Lazily yield (key, value) pairs with start <= key < end, like
+        BPlusTree.range"""
+        if limit is not None and limit <= 0:
+            return
+        count = 0
+        for leaf in self._leaves(start, end, reverse):
+            keys = leaf.keys
+            lo = 0 if start is None else bisect_left(keys, start)
+            hi = len(keys) if end is None else bisect_left(keys, end)
+            positions = range(hi - 1, lo - 1, -1) if reverse else range(lo, hi)
+            for i in positions:
+                yield keys[i], leaf.values[i]
+                count += 1
+                if count == limit:
+                    return
+
+    def items(self) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        return self.range()
+
+class DBSnapshot:
+    """Read-only view of several tables as of one point in time"""
+
+    def __init__(self, tables: Dict[str, TreeSnapshot]):
+        self.tables = tables
+        self.created = time.time()
+
+    def read(self, table_name: str, key: Any):
+        tree = self.tables.get(table_name)
+        if tree is None:
+            return f"Error: Table '{table_name}' is not in the snapshot"
+        record = tree.search(key) if tree.accepts_key(key) else None
+        if record is None:
+            return f"Error: Record with key '{key}' not found"
+        return record
+
+    def release(self):
+        for tree in self.tables.values():
+            tree.release()
+
+    def __enter__(self) -> 'DBSnapshot':
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class TableCatalog(MutableMapping):
+    """Table name -> BPlusTree mapping that opens tables on first access
+
+    Startup only records which snapshot file belongs to each table. The
+    loaded tables are kept in least-recently-used order so the database
+    can drop idle ones when it is over its memory budget.
+    """
+
+    def __init__(self, loader: Callable[[str, str], BPlusTree],
+                 on_load: Optional[Callable[[str], None]] = None):
+        self._loader = loader
+        self._on_load = on_load  # Called after a load, outside the catalog lock
+        self._paths: Dict[str, Optional[str]] = {}  # None until first snapshot
+        self._loaded: "OrderedDict[str, BPlusTree]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.load_times: Dict[str, float] = {}
+
+    def register(self, table_name: str, path: str):
+        with self._lock:
+            self._paths[table_name] = path
+
+    def __getitem__(self, table_name: str) -> BPlusTree:
+        with self._lock:
+            tree = self._loaded.get(table_name)
+            if tree is not None:
+                self._loaded.move_to_end(table_name)
+                return tree
+            path = self._paths.get(table_name)
+            if path is None:
+                raise KeyError(table_name)
+            start = time.perf_counter()
+            tree = self._loader(table_name, path)
+            self.load_times[table_name] = time.perf_counter() - start
+            self._loaded[table_name] = tree
+        if self._on_load is not None:
+            self._on_load(table_name)
+        return tree
+
+    def __setitem__(self, table_name: str, tree: BPlusTree):
+        with self._lock:
+            self._paths.setdefault(table_name, None)
+            self._loaded[table_name] = tree
+            self._loaded.move_to_end(table_name)
+
+    def __delitem__(self, table_name: str):
+        with self._lock:
+            del self._paths[table_name]
+            self._loaded.pop(table_name, None)
+
+    def __contains__(self, table_name) -> bool:
+        return table_name in self._paths
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._paths))
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def is_loaded(self, table_name: str) -> bool:
+        return table_name in self._loaded
+
+    def loaded(self) -> List[Tuple[str, BPlusTree]]:
+        """Loaded tables, least recently used first"""
+        with self._lock:
+            return list(self._loaded.items())
+
+    def unload(self, table_name: str) -> bool:
+        """Forget the in-memory copy of a table that has a snapshot on disk"""
+        with self._lock:
+            if self._paths.get(table_name) is None:
+                return False
+            return self._loaded.pop(table_name, None) is not None
+
+class RecordCache:
+    """Bounded key -> record map for one table, evicting the least
+    recently used entry when full
+
+    Writers invalidate keys after changing the tree. A reader that missed
+    takes a token before its tree lookup and only fills the cache if no
+    invalidation happened since, so it never caches a stale record.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("Cache capacity must be positive")
+        self.capacity = capacity
+        self._entries: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            try:
+                record = self._entries.get(key)
+            except TypeError:  # Unhashable keys are never cached
+                record = None
+            if record is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return record
+
+    def token(self) -> int:
+        return self._generation
+
+    def put(self, key: Any, record: Dict[str, Any], token: int):
+        with self._lock:
+            if token != self._generation:
+                return
+            try:
+                self._entries[key] = record
+            except TypeError:
+                return
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def invalidate(self, key: Any):
+        with self._lock:
+            self._generation += 1
+            try:
+                self._entries.pop(key, None)
+            except TypeError:
+                pass
+
+    def resize(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("Cache capacity must be positive")
+        with self._lock:
+            self.capacity = capacity
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "capacity": self.capacity,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# Table storage backends: "memory" tables are pickled whole by save_db,
+# "paged" tables live in a page file and only keep hot nodes in memory.
+STORAGE_BACKENDS = ("memory", "paged")
+
+# SimpleDB methods timed when metrics are on; all take the table first
+INSTRUMENTED_OPS = ("create_table", "drop_table", "insert", "upsert", "compare_and_set", "bulk_insert",
+                    "update", "read", "delete", "multi_get", "multi_put", "multi_delete", "create_index",
+                    "query", "compact", "count_range", "rank", "select", "aggregate")
 
 class SimpleDB:
-    def __init__(self, db_name: str, order: int = 3):
+    def __init__(self, db_name: str, order: int = DEFAULT_ORDER, wal: bool = True,
+                 sync_policy: str = "always", storage: str = "memory", cache_pages: int = 1024,
+                 checkpoint_interval: Optional[float] = 60.0, checkpoint_writes: Optional[int] = 10000,
+                 memory_budget: Optional[int] = None, record_cache_size: int = 0,
+                 record_cache_sizes: Optional[Dict[str, int]] = None, bloom_fp_rate: Optional[float] = None,
+                 metrics: bool = False, compact_threshold: Optional[float] = COMPACT_THRESHOLD,
+                 paged_tree_stats: bool = False):
+        if storage not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage backend '{storage}'")
+        start = time.perf_counter()
         self.db_name = db_name
-        self.tables: Dict[str, BPlusTree] = {}
+        self.tables = TableCatalog(self._open_table, on_load=self._enforce_memory_budget)
+        # Approximate bytes of loaded tables, measured by snapshot size. When
+        # set, idle tables with no unsaved changes are unloaded to stay under it.
+        self.memory_budget = memory_budget
+        self._table_sizes: Dict[str, int] = {}
+        # Records kept per table by the read cache; 0 disables it. Entries
+        # in record_cache_sizes override the default for single tables.
+        self.record_cache_size = record_cache_size
+        self.record_cache_sizes: Dict[str, int] = dict(record_cache_sizes or {})
+        self._record_caches: Dict[str, RecordCache] = {}
+        # False-positive rate of the Bloom filter given to new tables; None
+        # creates tables without one (see set_bloom_filter)
+        self.bloom_fp_rate = bloom_fp_rate
+        # Latency histograms and tree counters; None when off, in which
+        # case no method is wrapped and nothing is counted
+        self.metrics: Optional[Metrics] = Metrics() if metrics else None
+        # Table structure for metrics_report, measured at checkpoint since
+        # it takes a walk over every node. Paged tables are left out unless
+        # paged_tree_stats is set: the walk reads all their pages.
+        self.paged_tree_stats = paged_tree_stats
+        self._tree_stats: Dict[str, Tuple[BPlusTree, Dict[str, Any]]] = {}
         self.order = order
+        self.storage = storage
+        self.cache_pages = cache_pages
         self.db_dir = f"{db_name}_data"
+        self.wal: Optional[WriteAheadLog] = None
+        # Log shipped to read replicas; set by replication.ReplicationServer
+        self.replication = None
+
+        # Writers hold their table's lock while changing it; _lock guards
+        # the table registry, the dirty set and the checkpoint counters.
+        self._lock = threading.RLock()
+        self._table_locks: Dict[str, threading.RLock] = {}
+        self._dirty: set = set()
+        self._writes_since_checkpoint = 0
+        self._checkpoint_lock = threading.Lock()  # One checkpoint at a time
+        self._checkpoint_cond = threading.Condition(self._lock)
+        self._checkpoint_requested = 0
+        self._checkpoint_completed = 0
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_writes = checkpoint_writes
+        # Checkpoints compact dirty tables whose average leaf fill is below
+        # this; None turns automatic compaction off
+        self.compact_threshold = compact_threshold
+        self._closed = False
+        self.startup_report: Dict[str, Any] = {}
+
+        # One process per directory: a second one would replay the same log
+        # and its checkpoints would delete segments holding the first's writes
+        self._dir_lock = _lock_dir(self.db_dir)
+        if self._dir_lock is None:
+            raise RuntimeError(f"Database '{db_name}' is already open")
         self.load_db()
+        if self.metrics is not None:
+            # Wrapped after recovery, so replayed records are not counted
+            self._instrument()
+            report = self.startup_report
+            self.metrics.observe("load_db", "", (report["catalog_ms"] + report["replay_ms"]) / 1000)
+        if wal:
+            os.makedirs(self.db_dir, exist_ok=True)
+            self.wal = WriteAheadLog(self._wal_path(), sync_policy)
+
+        self._checkpointer = None
+        if checkpoint_interval or checkpoint_writes:
+            self._checkpointer = threading.Thread(target=self._checkpoint_loop, daemon=True)
+            self._checkpointer.start()
+        self.startup_report["total_ms"] = (time.perf_counter() - start) * 1000
+
+    def _wal_path(self) -> str:
+        return os.path.join(self.db_dir, "wal.log")
+
+    def _instrument(self):
+        for op in INSTRUMENTED_OPS:
+            setattr(self, op, self.metrics.timed(op, getattr(self, op)))
+        for op in ("save_db", "checkpoint"):
+            setattr(self, op, self.metrics.timed(op, getattr(self, op), per_table=False))
+
+    def _watch(self, table_name: str, tree: BPlusTree):
+        """Count the splits, merges and borrows of a created or loaded table"""
+        if self.metrics is not None:
+            tree.counters = self.metrics.tree_counters(table_name)
+
+    def _table_lock(self, table_name: str) -> threading.RLock:
+        with self._lock:
+            return self._table_locks.setdefault(table_name, threading.RLock())
+
+    def _log(self, *record) -> Optional[int]:
+        """Log a mutation that has just been applied and mark its table
+        dirty; the caller commits the returned LSN before acknowledging"""
+        with self._lock:
+            self._dirty.add(record[1])
+            self._writes_since_checkpoint += 1
+            if self.checkpoint_writes and self._writes_since_checkpoint >= self.checkpoint_writes:
+                self._checkpoint_cond.notify_all()
+            if self.replication is not None:
+                self.replication.publish(record)
+            if self.wal is not None:
+                return self.wal.append(record, commit=False)
+        return None
+
+    def _commit(self, lsn: Optional[int]):
+        if lsn is not None and self.wal is not None:
+            self.wal.commit(lsn)
+
+    def _apply(self, record):
+        """Re-run a logged mutation during recovery"""
+        op, args = record[0], record[1:]
+        getattr(self, op)(*args)
+
+    def _page_path(self, table_name: str) -> str:
+        return os.path.join(self.db_dir, f"{table_name}.pages")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._checkpoint_cond.notify_all()
+        if self._checkpointer is not None:
+            self._checkpointer.join()
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+        for _, tree in self.tables.loaded():
+            if tree.storage == "paged":
+                tree.close()
+        if self._dir_lock is not None:
+            self._dir_lock.close()  # Releases the directory lock
+            self._dir_lock = None
 
-    def create_table(self, table_name: str):
+    def create_table(self, table_name: str, order: Optional[int] = None, key_type: Optional[str] = None,
+                     value_codec: Optional[str] = None):
+        if order is not None and (not isinstance(order, int) or isinstance(order, bool) or order < 2):
+            return "Error: Order must be an integer of at least 2"
+        if key_type is not None and key_type not in KEY_TYPES:
+            return f"Error: Unsupported key type '{key_type}'"
+        if value_codec is not None and value_codec not in VALUE_CODECS:
+            return f"Error: Unsupported value codec '{value_codec}'"
+        with self._lock:
+            if table_name in self.tables:
+                return f"Error: Table '{table_name}' already exists"
+            if self.storage == "paged":
+                from paged_storage import PagedBPlusTree
+                os.makedirs(self.db_dir, exist_ok=True)
+                self.tables[table_name] = PagedBPlusTree(self._page_path(table_name), order or self.order,
+                                                         key_type, self.cache_pages, value_codec=value_codec)
+            else:
+                self.tables[table_name] = BPlusTree(order or self.order, key_type, value_codec)
+            if self.bloom_fp_rate is not None:
+                self.tables[table_name].enable_bloom(self.bloom_fp_rate)
+            self._watch(table_name, self.tables[table_name])
+            self._table_sizes[table_name] = 0
+            lsn = self._log("create_table", table_name, order, key_type, value_codec)
+        self._commit(lsn)
+        return f"Table '{table_name}' created successfully"
+
+    def drop_table(self, table_name: str):
         if table_name not in self.tables:
-            self.tables[table_name] = BPlusTree(self.order)
-            return f"Table '{table_name}' created successfully"
-        return f"Error: Table '{table_name}' already exists"
+            return f"Error: Table '{table_name}' does not exist"
+
+        with self._table_lock(table_name):
+            with self._lock:
+                if table_name not in self.tables:
+                    return f"Error: Table '{table_name}' does not exist"
+                tree = dict(self.tables.loaded()).get(table_name)
+                del self.tables[table_name]
+                self._table_sizes.pop(table_name, None)
+                self._record_caches.pop(table_name, None)
+                lsn = self._log("drop_table", table_name)
+                self._dirty.discard(table_name)
+            if tree is not None and tree.storage == "paged":
+                tree.close()
+            # Files left by a crash before this point are removed again when
+            # the logged drop is replayed.
+            page_path = self._page_path(table_name)
+            paths = [os.path.join(self.db_dir, f"{table_name}.db"), page_path, page_path + ".journal",
+                     page_path + ".bloom"]
+            paths += glob.glob(glob.escape(page_path) + ".*.idx*")
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            if os.path.exists(self.db_dir):
+                _fsync_dir(self.db_dir)
+        self._commit(lsn)
+        return f"Table '{table_name}' dropped successfully"
 
     def insert(self, table_name: str, key: Any, data: Dict[str, Any]):
         if table_name not in self.tables:
             return f"Error: Table '{table_name}' does not exist"
 
-        if self.tables[table_name].search(key) is not None:
-            return f"Error: Key '{key}' already exists in table '{table_name}'"
-
-        self.tables[table_name].insert(key, data)
+        with self._table_lock(table_name):
+            tree = self.tables[table_name]
+            if not tree.accepts_key(key):
+                return _key_mismatch(table_name, key)
+            if not tree.insert_if_absent(key, data):
+                return f"Error: Key '{key}' already exists in table '{table_name}'"
+            for index in tree.indexes.values():
+                index.add(key, data)
+            lsn = self._log("insert", table_name, key, data)
+        self._commit(lsn)
         return f"Record inserted successfully"
 
+    def upsert(self, table_name: str, key: Any, data: Dict[str, Any]):
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+
+        with self._table_lock(table_name):
+            tree = self.tables[table_name]
+            if not tree.accepts_key(key):
+                return _key_mismatch(table_name, key)
+            old = tree.upsert(key, data)
+            for index in tree.indexes.values():
+                if old is None:
+                    index.add(key, data)
+                else:
+                    index.replace(key, old, data)
+            self._invalidate(table_name, key)
+            lsn = self._log("upsert", table_name, key, data)
+        self._commit(lsn)
+        return f"Record inserted successfully" if old is None else f"Record updated successfully"
+
+    def compare_and_set(self, table_name: str, key: Any, data: Dict[str, Any], expected: Any = None,
+                        expected_version: Any = None, version_field: str = "version"):
+        """Update a record only if it still equals expected, or if its
+        version_field still holds expected_version"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+        if (expected is None) == (expected_version is None):
+            return "Error: Give exactly one of an expected record or an expected version"
+
+        if expected is not None:
+            matches = lambda old: old == expected
+        else:
+            matches = lambda old: old.get(version_field) == expected_version
+        with self._table_lock(table_name):
+            tree = self.tables[table_name]
+            if not tree.accepts_key(key):
+                return _key_mismatch(table_name, key)
+            old, swapped = tree.compare_and_set(key, matches, data)
+            if old is None:
+                return f"Error: Record with key '{key}' not found"
+            if not swapped:
+                return f"Error: Record with key '{key}' was changed by another writer"
+            for index in tree.indexes.values():
+                index.replace(key, old, data)
+            self._invalidate(table_name, key)
+            # Logged as a plain update: replay must not re-check the condition
+            lsn = self._log("update", table_name, key, data)
+        self._commit(lsn)
+        return f"Record updated successfully"
+
+    def bulk_insert(self, table_name: str, records: Iterable[Tuple[Any, Dict[str, Any]]],
+                    fill_factor: float = DEFAULT_FILL_FACTOR):
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+
+        records = list(records)
+        with self._table_lock(table_name):
+            tree = self.tables[table_name]
+            for key, _ in records:
+                if not tree.accepts_key(key):
+                    return _key_mismatch(table_name, key)
+            new_records: Dict[Any, Dict[str, Any]] = {}
+            try:
+                if tree.indexes:
+                    for key, data in records:
+                        if key not in new_records and tree.search(key) is None:
+                            new_records[key] = data
+                added = tree.bulk_load(records, fill_factor)
+            except (TypeError, ValueError) as e:
+                return f"Error: {e}"
+            for index in tree.indexes.values():
+                index.build(new_records.items())
+            lsn = self._log("bulk_insert", table_name, records, fill_factor)
+        self._commit(lsn)
+        return f"{added} records inserted, {len(records) - added} duplicates skipped"
+
     def update(self, table_name: str, key: Any, data: Dict[str, Any]):
         if table_name not in self.tables:
             return f"Error: Table '{table_name}' does not exist"
 
-        if self.tables[table_name].update(key, data):
-            return f"Record updated successfully"
-        return f"Error: Record with key '{key}' not found"
+        with self._table_lock(table_name):
+            tree = self.tables[table_name]
+            if not tree.accepts_key(key):
+                return _key_mismatch(table_name, key)
+            old = tree.search(key) if tree.indexes else None
+            if not tree.update(key, data):
+                return f"Error: Record with key '{key}' not found"
+            for index in tree.indexes.values():
+                index.replace(key, old, data)
+            self._invalidate(table_name, key)
+            lsn = self._log("update", table_name, key, data)
+        self._commit(lsn)
+        return f"Record updated successfully"
 
     def read(self, table_name: str, key: Any):
         if table_name not in self.tables:
             return f"Error: Table '{table_name}' does not exist"
 
-        record = self.tables[table_name].search(key)
+        tree = self.tables[table_name]
+        if not tree.accepts_key(key):
+            return _key_mismatch(table_name, key)
+        cache = self._record_cache(table_name)
+        if cache is not None:
+            record = cache.get(key)
+            if record is not None:
+                return record
+            token = cache.token()
+        record = tree.search(key)
         if record is None:
             return f"Error: Record with key '{key}' not found"
+        if cache is not None:
+            cache.put(key, record, token)
         return record
 
+    def _record_cache(self, table_name: str) -> Optional[RecordCache]:
+        cache = self._record_caches.get(table_name)
+        if cache is None:
+            size = self.record_cache_sizes.get(table_name, self.record_cache_size)
+            if size > 0:
+                with self._lock:
+                    cache = self._record_caches.setdefault(table_name, RecordCache(size))
+        return cache
+
+    def _invalidate(self, table_name: str, key: Any):
+        """Drop a changed record from the read cache; called after the
+        tree change, under the table lock"""
+        cache = self._record_caches.get(table_name)
+        if cache is not None:
+            cache.invalidate(key)
+
+    def set_record_cache_size(self, table_name: str, size: int):
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            return "Error: Cache size must be a non-negative integer"
+        with self._lock:
+            self.record_cache_sizes[table_name] = size
+            if size == 0:
+                self._record_caches.pop(table_name, None)
+            elif table_name in self._record_caches:
+                self._record_caches[table_name].resize(size)
+        return f"Record cache of table '{table_name}' set to {size} records"
+
+    def set_bloom_filter(self, table_name: str, fp_rate: Optional[float]):
+        """Build a Bloom filter for a table, or remove it with fp_rate=None"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+        if fp_rate is not None and (not isinstance(fp_rate, (int, float)) or not 0 < fp_rate < 1):
+            return "Error: False-positive rate must be between 0 and 1"
+
+        with self._table_lock(table_name):
+            self.tables[table_name].enable_bloom(fp_rate)
+            lsn = self._log("set_bloom_filter", table_name, fp_rate)
+        self._commit(lsn)
+        if fp_rate is None:
+            return f"Bloom filter of table '{table_name}' removed"
+        return f"Bloom filter of table '{table_name}' built with a {fp_rate} false-positive rate"
+
+    def bloom_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Filter statistics of the loaded tables that have one"""
+        return {table_name: tree.bloom.stats() for table_name, tree in self.tables.loaded()
+                if tree.bloom is not None}
+
+    def metrics_report(self) -> Dict[str, Any]:
+        """Operation latencies, if metrics are on, and the structure of
+        every loaded table as of its last checkpoint; tables on disk are
+        not loaded for this"""
+        if self.metrics is not None:
+            report = self.metrics.to_dict()
+        else:
+            report = {"ops": {}, "requests": {}, "responses": {}}
+        report["enabled"] = self.metrics is not None
+        report["tables"] = {table_name: self._table_stats(table_name, tree)
+                            for table_name, tree in self.tables.loaded()}
+        report["table_load_seconds"] = dict(self.tables.load_times)
+        report["startup_seconds"] = self.startup_report.get("total_ms", 0) / 1000
+        return report
+
+    def _table_stats(self, table_name: str, tree: BPlusTree) -> Dict[str, Any]:
+        """Cached structure of a table, measured now if it has not been
+        since it was loaded or created, plus its live counters"""
+        if tree.storage != "paged" or self.paged_tree_stats:
+            cached = self._tree_stats.get(table_name)
+            if cached is None or cached[0] is not tree:
+                cached = self._tree_stats[table_name] = (tree, tree.stats())
+            stats = dict(cached[1])
+        else:
+            stats = {"order": tree.order, "storage": tree.storage}
+        if tree.counters is not None:
+            stats.update(tree.counters)
+        return stats
+
+    def record_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            caches = list(self._record_caches.items())
+        return {table_name: cache.stats() for table_name, cache in caches}
+
     def delete(self, table_name: str, key: Any):
         if table_name not in self.tables:
             return f"Error: Table '{table_name}' does not exist"
 
-        if not self.tables[table_name].delete(key):
-            return f"Error: Record with key '{key}' not found"
+        with self._table_lock(table_name):
+            tree = self.tables[table_name]
+            if not tree.accepts_key(key):
+                return _key_mismatch(table_name, key)
+            old = tree.search(key) if tree.indexes else None
+            if not tree.delete(key):
+                return f"Error: Record with key '{key}' not found"
+            for index in tree.indexes.values():
+                index.remove(key, old)
+            self._invalidate(table_name, key)
+            lsn = self._log("delete", table_name, key)
+        self._commit(lsn)
         return f"Record deleted successfully"
 
-    def save_db(self):
-        if not os.path.exists(self.db_dir):
-            os.makedirs(self.db_dir)
+    def multi_get(self, table_name: str, keys: Iterable[Any]):
+        """Read many records; one result per key, as read() would return"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+
+        tree = self.tables[table_name]
+        keys = list(keys)
+        results: List[Any] = [f"Error: Record with key '{key}' not found" for key in keys]
+        positions = [pos for pos, key in enumerate(keys) if tree.accepts_key(key)]
+        try:
+            values = tree.search_many([keys[pos] for pos in positions])
+        except TypeError:
+            return f"Error: Keys do not match the key type of table '{table_name}'"
+        for pos, value in zip(positions, values):
+            if value is not None:
+                results[pos] = value
+        return results
+
+    def multi_put(self, table_name: str, records: Iterable[Tuple[Any, Dict[str, Any]]]):
+        """Insert or update many records; one result message per record"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+
+        records = list(records)
+        results: List[str] = [_key_mismatch(table_name, key) for key, _ in records]
+        with self._table_lock(table_name):
+            tree = self.tables[table_name]
+            positions = [pos for pos, (key, _) in enumerate(records) if tree.accepts_key(key)]
+            if not positions:
+                return results
+            accepted = [records[pos] for pos in positions]
+            try:
+                olds = tree.insert_many(accepted)  # Sorts first, so mismatched keys change nothing
+            except TypeError:
+                return f"Error: Keys do not match the key type of table '{table_name}'"
+            # A repeated key's old value is its previous pair's, so indexes
+            # follow the same order
+            for pos, (key, data), old in zip(positions, accepted, olds):
+                for index in tree.indexes.values():
+                    if old is None:
+                        index.add(key, data)
+                    else:
+                        index.replace(key, old, data)
+                results[pos] = "Record inserted successfully" if old is None else "Record updated successfully"
+                self._invalidate(table_name, key)
+            lsn = self._log("multi_put", table_name, accepted)
+        self._commit(lsn)
+        return results
+
+    def multi_delete(self, table_name: str, keys: Iterable[Any]):
+        """Delete many records; one result message per key"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+
+        keys = list(keys)
+        results = [f"Error: Record with key '{key}' not found" for key in keys]
+        with self._table_lock(table_name):
+            tree = self.tables[table_name]
+            positions = [pos for pos, key in enumerate(keys) if tree.accepts_key(key)]
+            if not positions:
+                return results
+            accepted = [keys[pos] for pos in positions]
+            try:
+                olds = tree.search_many(accepted)  # Also rejects mismatched keys before any delete
+            except TypeError:
+                return f"Error: Keys do not match the key type of table '{table_name}'"
+            found = tree.delete_many(accepted)
+            deleted = []
+            for pos, old, was_found in zip(positions, olds, found):
+                if was_found:
+                    for index in tree.indexes.values():
+                        index.remove(keys[pos], old)
+                    self._invalidate(table_name, keys[pos])
+                    results[pos] = "Record deleted successfully"
+                    deleted.append(keys[pos])
+            if not deleted:
+                return results
+            lsn = self._log("multi_delete", table_name, deleted)
+        self._commit(lsn)
+        return results
+
+    def compact(self, table_name: str, fill_factor: float = COMPACT_FILL_FACTOR):
+        """Rebuild a table and its indexes to fill_factor; returns what
+        was reclaimed. Readers and writers are not held up by in-memory
+        tables, which are rebuilt from a snapshot."""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+        if not isinstance(fill_factor, (int, float)) or not 0 < fill_factor <= 1:
+            return "Error: Fill factor must be in (0, 1]"
+
+        tree = self.tables[table_name]
+        report = tree.compact(fill_factor)
+        report["indexes"] = {field: index.tree.compact(fill_factor) for field, index in list(tree.indexes.items())}
+        # Nothing to log: the records are unchanged, but the next checkpoint
+        # should save the smaller tree
+        with self._lock:
+            self._dirty.add(table_name)
+        return report
+
+    def _maybe_compact(self, tree: BPlusTree) -> Optional[Dict[str, Any]]:
+        """Compact a sparse table; called by checkpoints under its lock.
+        Returns the structure it measured on the way, or None for paged
+        tables: they would have to read every page to find out, so they
+        are only compacted on request."""
+        if tree.storage == "paged":
+            return None
+        stats = tree.stats()
+        if (self.compact_threshold is not None and stats["leaves"] > 1
+                and stats["leaf_fill"] < self.compact_threshold):
+            tree.compact()
+            stats = tree.stats()
+        return stats
+
+    def create_index(self, table_name: str, field: str):
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+        if not isinstance(field, str) or not field or "/" in field or "\\" in field:
+            return f"Error: Invalid index field '{field}'"
+
+        from indexes import SecondaryIndex
+        with self._table_lock(table_name):
+            tree = self.tables[table_name]
+            if field in tree.indexes:
+                return f"Error: Index on '{field}' already exists in table '{table_name}'"
+            index = SecondaryIndex(field, tree._new_index_tree(field))
+            index.build(tree.range())
+            tree.indexes[field] = index
+            lsn = self._log("create_index", table_name, field)
+        self._commit(lsn)
+        return f"Index on '{field}' created successfully"
+
+    def query(self, table_name: str, field: str, limit: Optional[int] = None, **predicates):
+        """Records whose indexed field matches eq/gt/gte/lt/lte predicates"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+
+        tree = self.tables[table_name]
+        index = tree.indexes.get(field)
+        if index is None:
+            return f"Error: No index on '{field}' in table '{table_name}'"
+        try:
+            keys = list(index.keys(limit=limit, **predicates))
+        except ValueError as e:
+            return f"Error: {e}"
+        records = []
+        for key in keys:
+            value = tree.search(key)
+            if value is not None:
+                records.append({"key": key, "value": value})
+        return records
+
+    def count_range(self, table_name: str, start: Any = None, end: Any = None):
+        """Number of records with start <= key < end"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+        try:
+            return self.tables[table_name].count_range(start, end)
+        except TypeError:
+            return f"Error: Range bounds do not match the keys of table '{table_name}'"
+
+    def rank(self, table_name: str, key: Any):
+        """Number of records whose key is less than key"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+        try:
+            return self.tables[table_name].rank(key)
+        except TypeError:
+            return f"Error: Key '{key}' does not match the keys of table '{table_name}'"
+
+    def select(self, table_name: str, k: int):
+        """The record at position k (from 0) in key order"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+        if not isinstance(k, int) or isinstance(k, bool):
+            return f"Error: Invalid position '{k}'"
+        pair = self.tables[table_name].select(k)
+        if pair is None:
+            return f"Error: Position {k} is out of range"
+        return {"key": pair[0], "value": pair[1]}
+
+    def aggregate(self, table_name: str, field: str, start: Any = None, end: Any = None):
+        """Count, sum, min, max and mean of a numeric field over the
+        records with start <= key < end"""
+        if table_name not in self.tables:
+            return f"Error: Table '{table_name}' does not exist"
+        if not isinstance(field, str) or not field:
+            return f"Error: Invalid aggregate field '{field}'"
+        try:
+            return self.tables[table_name].aggregate(field, start, end)
+        except TypeError:
+            return f"Error: Range bounds do not match the keys of table '{table_name}'"
+
+    def snapshot(self, table_names: Optional[Iterable[str]] = None):
+        """Point-in-time, read-only view of the given tables; release it
+        when done so writers stop copying
+
+        By default it covers the loaded in-memory tables. Tables still on
+        disk are not loaded for it, so it does not include them.
+        """
+        with self._lock:
+            if table_names is None:
+                names, explicit = sorted(name for name, _ in self.tables.loaded()), False
+            else:
+                names, explicit = sorted(set(table_names)), True
+            for table_name in names:
+                if table_name not in self.tables:
+                    return f"Error: Table '{table_name}' does not exist"
+
+        # Writers hold one table lock at a time, so taking them all in
+        # sorted order cannot deadlock; holding them together makes the
+        # views consistent across tables.
+        with ExitStack() as stack:
+            for table_name in names:
+                stack.enter_context(self._table_lock(table_name))
+            views = {}
+            for table_name in names:
+                if not explicit and not self.tables.is_loaded(table_name):
+                    continue  # Dropped or unloaded before its lock was taken
+                tree = self.tables[table_name]
+                if tree.storage == "paged":
+                    if explicit:
+                        for view in views.values():
+                            view.release()
+                        return f"Error: Table '{table_name}' does not support snapshots"
+                    continue
+                views[table_name] = tree.snapshot()
+        return DBSnapshot(views)
+
+    def request_checkpoint(self) -> int:
+        """Ask the background thread for a checkpoint and return its id"""
+        with self._lock:
+            self._checkpoint_requested += 1
+            checkpoint_id = self._checkpoint_requested
+            self._checkpoint_cond.notify_all()
+        if self._checkpointer is None:
+            self.checkpoint()
+        return checkpoint_id
+
+    def wait_for_checkpoint(self, checkpoint_id: int, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            return self._checkpoint_cond.wait_for(lambda: self._checkpoint_completed >= checkpoint_id, timeout)
 
-        for table_name, tree in self.tables.items():
-            file_path = os.path.join(self.db_dir, f"{table_name}.db")
-            with open(file_path, 'wb') as f:
-                pickle.dump(tree, f)
+    def checkpoint_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requested": self._checkpoint_requested,
+                "completed": self._checkpoint_completed,
+                "dirty_tables": sorted(self._dirty),
+                "writes_since_checkpoint": self._writes_since_checkpoint,
+            }
+
+    def _checkpoint_loop(self):
+        last = time.monotonic()
+        while True:
+            with self._lock:
+                while not self._closed:
+                    due = self.checkpoint_interval and time.monotonic() - last >= self.checkpoint_interval
+                    if (self._checkpoint_requested > self._checkpoint_completed
+                            or (self.checkpoint_writes and self._writes_since_checkpoint >= self.checkpoint_writes)
+                            or (due and self._dirty)):
+                        break
+                    if due:
+                        last = time.monotonic()
+                    self._checkpoint_cond.wait(self.checkpoint_interval or None)
+                if self._closed:
+                    return
+            self.checkpoint()
+            last = time.monotonic()
+
+    def checkpoint(self) -> int:
+        """Persist the tables changed since the last checkpoint
+
+        Only the dirty set is captured and the log rotated under the
+        registry lock; each table is then written under its own lock, so
+        writers to other tables are never blocked.
+        """
+        with self._checkpoint_lock:
+            with self._lock:
+                checkpoint_id = self._checkpoint_requested
+                dirty, self._dirty = self._dirty, set()
+                self._writes_since_checkpoint = 0
+                sealed = self.wal.rotate() if self.wal is not None else None
+
+            os.makedirs(self.db_dir, exist_ok=True)
+            try:
+                for table_name in sorted(dirty):
+                    with self._table_lock(table_name):
+                        tree = self.tables.get(table_name)
+                        if tree is not None:
+                            stats = self._maybe_compact(tree)
+                            self._write_table(table_name, tree)
+                            if stats is None and self.paged_tree_stats:
+                                stats = tree.stats()
+                            if stats is not None:
+                                self._tree_stats[table_name] = (tree, stats)
+            except BaseException:
+                with self._lock:
+                    self._dirty |= dirty  # Retry these on the next checkpoint
+                raise
+            _fsync_dir(self.db_dir)
+
+            # Every change in the sealed segments is now in a snapshot
+            if sealed is not None:
+                WriteAheadLog.remove_segments(sealed)
+            with self._lock:
+                self._checkpoint_completed = max(self._checkpoint_completed, checkpoint_id)
+                self._checkpoint_cond.notify_all()
+        return checkpoint_id
+
+    def _write_table(self, table_name: str, tree: BPlusTree):
+        if tree.storage == "paged":
+            tree.checkpoint()  # Paged tables write back only dirty pages
+            return
+        file_path = os.path.join(self.db_dir, f"{table_name}.db")
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'wb') as f, tree.latch.read():
+            pickle.dump(tree, f)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(tmp_path, file_path)
+        self.tables.register(table_name, file_path)
+        self._table_sizes[table_name] = size
+
+    def save_db(self) -> int:
+        with self._lock:
+            self._checkpoint_requested += 1
+        return self.checkpoint()
 
     def load_db(self):
-        if not os.path.exists(self.db_dir):
+        """Register the tables on disk and replay the log
+
+        Snapshots are not read here; each table is opened the first time
+        it is used, so startup cost does not grow with the data size.
+        """
+        start = time.perf_counter()
+        if os.path.exists(self.db_dir):
+            for entry in os.scandir(self.db_dir):
+                if entry.name.endswith('.db'):
+                    self.tables.register(entry.name[:-3], entry.path)
+                elif entry.name.endswith('.pages'):
+                    from paged_storage import page_file_initialized
+                    if page_file_initialized(entry.path):
+                        self.tables.register(entry.name[:-6], entry.path)
+                    else:
+                        # Creation never completed; the log replay recreates it
+                        os.remove(entry.path)
+        self.startup_report["catalog_ms"] = (time.perf_counter() - start) * 1000
+        self.startup_report["tables"] = len(self.tables)
+
+        # Replay changes made since the last checkpoint. Replay is
+        # idempotent, so a crash part-way through a checkpoint is harmless.
+        start = time.perf_counter()
+        replayed = 0
+        for record in WriteAheadLog.replay(self._wal_path()):
+            self._apply(record)
+            replayed += 1
+        self.startup_report["replayed_records"] = replayed
+        self.startup_report["replay_ms"] = (time.perf_counter() - start) * 1000
+
+    def _open_table(self, table_name: str, path: str) -> BPlusTree:
+        """Catalog loader: read one table's snapshot"""
+        if path.endswith('.pages'):
+            from paged_storage import PagedBPlusTree
+            tree = PagedBPlusTree.open(path, self.cache_pages)
+            self._table_sizes[table_name] = self.cache_pages * tree.pager.page_size
+        else:
+            with open(path, 'rb') as f:
+                tree = pickle.load(f)
+            self._table_sizes[table_name] = os.path.getsize(path)
+        self._watch(table_name, tree)
+        return tree
+
+    def loaded_bytes(self) -> int:
+        return sum(self._table_sizes.get(name, 0) for name, _ in self.tables.loaded())
+
+    def _enforce_memory_budget(self, keep: Optional[str] = None):
+        """Unload least recently used clean tables while over budget"""
+        if self.memory_budget is None:
             return
+        for table_name, tree in self.tables.loaded():
+            if self.loaded_bytes() <= self.memory_budget:
+                return
+            if table_name == keep:
+                continue
+            lock = self._table_lock(table_name)
+            # Skip tables in use by a writer or with unsaved changes
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                with self._lock:
+                    if table_name in self._dirty:
+                        continue
+                    # Paged tables close their file once unreferenced
+                    self.tables.unload(table_name)
+            finally:
+                lock.release()
+
+def _key_mismatch(table_name: str, key: Any) -> str:
+    return f"Error: Key '{key}' does not match the key type of table '{table_name}'"
 
-        for file_name in os.listdir(self.db_dir):
-            if file_name.endswith('.db'):
-                table_name = file_name[:-3]
-                file_path = os.path.join(self.db_dir, file_name)
-                with open(file_path, 'rb') as f:
-                    self.tables[table_name] = pickle.load(f)
+def _lock_dir(path: str):
+    """Lock a database directory for this process; returns the open lock
+    file, which holds the lock until closed, or None if it is taken"""
+    os.makedirs(path, exist_ok=True)
+    lock_file = open(os.path.join(path, "LOCK"), "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
 
+def _fsync_dir(path: str):
+    """Make renames inside a directory durable"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,108 @@
+from typing import Any, Iterable, Iterator, List, Optional, Union
+from array import array
+import json
+import zlib
+
+# Value encodings a table can choose instead of keeping record objects:
+# compact JSON per record, optionally zlib-compressed per leaf at rest
+VALUE_CODECS = ("json", "json+zlib")
+
+_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, check_circular=False)
+
+
+def encode_value(value: Any) -> bytes:
+    return _encoder.encode(value).encode("utf-8")
+
+
+def decode_value(data: bytes) -> Any:
+    return json.loads(data)
+
+
+class EncodedValues:
+    """Leaf value container holding each record as compact JSON bytes
+
+    It behaves like the list of records it replaces, but a record is only
+    decoded when it is read, and every read returns a fresh copy. With
+    compression on, pickling packs the leaf's records into one zlib block
+    and the leaf stays packed, in memory too, until it is next used.
+    """
+
+    __slots__ = ("compress", "_items", "_packed")
+
+    def __init__(self, values: Iterable[Any] = (), compress: bool = False):
+        self.compress = compress
+        self._items: Optional[List[bytes]] = [encode_value(value) for value in values]
+        self._packed = None  # (lengths, zlib block) until first use after loading
+
+    def __getstate__(self):
+        if not self.compress:
+            return False, self._items
+        if self._packed is None:
+            lengths = array("L", map(len, self._items))
+            self._packed = (lengths, zlib.compress(b"".join(self._items)))
+            self._items = None
+        return True, self._packed
+
+    def __setstate__(self, state):
+        self.compress, data = state
+        if self.compress:
+            self._items, self._packed = None, data
+        else:
+            self._items, self._packed = data, None
+
+    def _raw(self) -> List[bytes]:
+        """Encoded records, unpacking a loaded leaf on first use"""
+        items = self._items
+        if items is None:
+            lengths, block = self._packed
+            data, items, pos = zlib.decompress(block), [], 0
+            for length in lengths:
+                items.append(data[pos:pos + length])
+                pos += length
+            self._items = items
+        return items
+
+    def _changed(self) -> List[bytes]:
+        items = self._raw()
+        self._packed = None
+        return items
+
+    def __repr__(self):
+        return f"EncodedValues({list(self)!r})"
+
+    def __len__(self) -> int:
+        if self._items is None:
+            return len(self._packed[0])
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Any]:
+        return map(decode_value, self._raw())
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            part = EncodedValues(compress=self.compress)
+            part._items = self._raw()[index]
+            return part
+        return decode_value(self._raw()[index])
+
+    def __setitem__(self, index: int, value: Any):
+        data = encode_value(value)
+        self._changed()[index] = data
+
+    def insert(self, index: int, value: Any):
+        data = encode_value(value)
+        self._changed().insert(index, data)
+
+    def append(self, value: Any):
+        data = encode_value(value)
+        self._changed().append(data)
+
+    def extend(self, values: Iterable[Any]):
+        if isinstance(values, EncodedValues):
+            encoded = values._raw()  # Merging leaves moves the bytes as they are
+        else:
+            encoded = [encode_value(value) for value in values]
+        self._changed().extend(encoded)
+
+    def pop(self, index: int = -1) -> Any:
+        return decode_value(self._changed().pop(index))
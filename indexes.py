@@ -0,0 +1,116 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from functools import total_ordering
+
+from db_engine import BPlusTree
+
+
+@total_ordering
+class _Max:
+    """Sorts after every other value; used to close index key ranges"""
+
+    def __eq__(self, other):
+        return isinstance(other, _Max)
+
+    def __lt__(self, other):
+        return False
+
+    def __hash__(self):
+        return 0
+
+    def __repr__(self):
+        return "MAX"
+
+MAX = _Max()
+
+
+def _rank(value: Any) -> Optional[int]:
+    """Group indexable values so values of different types never compare"""
+    if isinstance(value, (bool, int, float)):
+        return 0
+    if isinstance(value, str):
+        return 1
+    return None  # None, lists and objects are not indexed
+
+
+class SecondaryIndex:
+    """Index of one record field, kept in its own B+ tree
+
+    Entries are (type rank, field value, primary key) tuples, so records
+    sharing a field value stay unique and come back in primary key order.
+    """
+
+    def __init__(self, field: str, tree: BPlusTree):
+        self.field = field
+        self.tree = tree
+
+    def entry(self, key: Any, record: Dict[str, Any]) -> Optional[Tuple[int, Any, Any]]:
+        if not isinstance(record, dict) or self.field not in record:
+            return None
+        value = record[self.field]
+        rank = _rank(value)
+        if rank is None:
+            return None
+        return (rank, value, key)
+
+    def add(self, key: Any, record: Dict[str, Any]):
+        entry = self.entry(key, record)
+        if entry is not None:
+            self.tree.insert(entry, None)
+
+    def remove(self, key: Any, record: Dict[str, Any]):
+        entry = self.entry(key, record)
+        if entry is not None:
+            self.tree.delete(entry)
+
+    def replace(self, key: Any, old: Dict[str, Any], new: Dict[str, Any]):
+        old_entry, new_entry = self.entry(key, old), self.entry(key, new)
+        if old_entry == new_entry:
+            return
+        if old_entry is not None:
+            self.tree.delete(old_entry)
+        if new_entry is not None:
+            self.tree.insert(new_entry, None)
+
+    def build(self, items: Iterable[Tuple[Any, Dict[str, Any]]]):
+        entries = (self.entry(key, record) for key, record in items)
+        self.tree.bulk_load((entry, None) for entry in entries if entry is not None)
+
+    def keys(self, eq: Any = None, gt: Any = None, gte: Any = None, lt: Any = None,
+             lte: Any = None, limit: Optional[int] = None) -> Iterator[Any]:
+        """Yield primary keys of records whose field matches the predicate
+
+        eq may not be combined with range bounds; lower and upper bounds
+        must be of the same kind (numbers or strings).
+        """
+        bounds = [v for v in (eq, gt, gte, lt, lte) if v is not None]
+        if eq is not None and len(bounds) > 1:
+            raise ValueError("eq cannot be combined with range predicates")
+        if (gt is not None and gte is not None) or (lt is not None and lte is not None):
+            raise ValueError("Use only one lower and one upper bound")
+        ranks = {_rank(v) for v in bounds}
+        if None in ranks:
+            raise ValueError("Predicates must be numbers or strings")
+        if len(ranks) > 1:
+            raise ValueError("Predicate values must be of the same type")
+        if not ranks:
+            raise ValueError("At least one predicate is required")
+        rank = ranks.pop()
+
+        if eq is not None:
+            start, end = (rank, eq), (rank, eq, MAX)
+        else:
+            if gte is not None:
+                start = (rank, gte)
+            elif gt is not None:
+                start = (rank, gt, MAX)
+            else:
+                start = (rank,)
+            if lte is not None:
+                end = (rank, lte, MAX)
+            elif lt is not None:
+                end = (rank, lt)
+            else:
+                end = (rank, MAX)
+
+        for entry, _ in self.tree.range(start, end, limit=limit):
+            yield entry[2]
@@ -0,0 +1,191 @@
+from typing import Any, Callable, Dict, List, Tuple
+from bisect import bisect_left
+import threading
+import time
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tree-health gauges, as (stats field, metric name, help text)
+TREE_GAUGES = [
+    ("height", "simpledb_tree_height", "Nodes on a root-to-leaf path"),
+    ("nodes", "simpledb_tree_nodes", "Nodes in the tree"),
+    ("leaves", "simpledb_tree_leaves", "Leaf nodes in the tree"),
+    ("keys", "simpledb_tree_keys", "Records in the tree"),
+    ("leaf_fill", "simpledb_tree_leaf_fill_ratio", "Average leaf occupancy, as a fraction of capacity"),
+    ("internal_fill", "simpledb_tree_internal_fill_ratio",
+     "Average internal node occupancy, as a fraction of capacity"),
+]
+TREE_COUNTERS = [
+    ("splits", "simpledb_tree_splits_total", "Node splits"),
+    ("merges", "simpledb_tree_merges_total", "Node merges"),
+    ("borrows", "simpledb_tree_borrows_total", "Keys moved between siblings to avoid a merge"),
+]
+
+
+class Histogram:
+    """Latency distribution over fixed buckets"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def buckets(self) -> List[Tuple[str, int]]:
+        """Cumulative (upper bound, count) pairs, as Prometheus reports them"""
+        total, result = 0, []
+        for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], self.counts):
+            total += count
+            result.append((str(bound), total))
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "buckets": dict(self.buckets()),
+        }
+
+
+class Metrics:
+    """Operation counters and latency histograms of one database
+
+    Operations are keyed by name and table, HTTP requests by endpoint and
+    method. Structural counters are dicts shared with the trees, which
+    bump them while holding their write latch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ops: Dict[Tuple[str, str], Histogram] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        self.requests: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Dict[Tuple[str, str], int] = {}
+        self.trees: Dict[str, Dict[str, int]] = {}
+
+    def observe(self, op: str, table: Any, seconds: float, error: bool = False):
+        key = (op, "" if table is None else str(table))
+        with self._lock:
+            histogram = self.ops.get(key)
+            if histogram is None:
+                histogram = self.ops[key] = Histogram()
+            histogram.observe(seconds)
+            if error:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float):
+        with self._lock:
+            histogram = self.requests.get((endpoint, method))
+            if histogram is None:
+                histogram = self.requests[(endpoint, method)] = Histogram()
+            histogram.observe(seconds)
+            key = (endpoint, str(status))
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def timed(self, op: str, method: Callable, per_table: bool = True) -> Callable:
+        """Wrap a SimpleDB method so each call is observed; the table is
+        its first argument, and an "Error: ..." result counts as an error"""
+        observe, clock = self.observe, time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            table = (args[0] if args else kwargs.get("table_name")) if per_table else ""
+            start = clock()
+            try:
+                result = method(*args, **kwargs)
+            except BaseException:
+                observe(op, table, clock() - start, True)
+                raise
+            observe(op, table, clock() - start, isinstance(result, str) and result.startswith("Error"))
+            return result
+        return wrapper
+
+    def tree_counters(self, table: str) -> Dict[str, int]:
+        """Split/merge/borrow counters for a table; they outlive unloads"""
+        with self._lock:
+            return self.trees.setdefault(table, {name: 0 for name, _, _ in TREE_COUNTERS})
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            ops: Dict[str, Dict[str, Any]] = {}
+            for (op, table), histogram in sorted(self.ops.items()):
+                entry = histogram.to_dict()
+                entry["errors"] = self.errors.get((op, table), 0)
+                ops.setdefault(op, {})[table] = entry
+            requests: Dict[str, Dict[str, Any]] = {}
+            for (endpoint, method), histogram in sorted(self.requests.items()):
+                requests.setdefault(endpoint, {})[method] = histogram.to_dict()
+            responses: Dict[str, Dict[str, int]] = {}
+            for (endpoint, status), count in sorted(self.responses.items()):
+                responses.setdefault(endpoint, {})[status] = count
+            return {"ops": ops, "requests": requests, "responses": responses}
+
+
+def _labels(**labels) -> str:
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _histogram_lines(name: str, stats: Dict[str, Any], **labels) -> List[str]:
+    lines = [f"{name}_bucket{_labels(**labels, le=bound)} {count}" for bound, count in stats["buckets"].items()]
+    lines.append(f"{name}_sum{_labels(**labels)} {stats['sum']}")
+    lines.append(f"{name}_count{_labels(**labels)} {stats['count']}")
+    return lines
+
+
+def prometheus(report: Dict[str, Any]) -> str:
+    """Render SimpleDB.metrics_report() in the Prometheus text format"""
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    family("simpledb_op_duration_seconds", "histogram", "Latency of database operations")
+    for op, tables in report["ops"].items():
+        for table, stats in tables.items():
+            lines.extend(_histogram_lines("simpledb_op_duration_seconds", stats, op=op, table=table))
+    family("simpledb_op_errors_total", "counter", "Operations that returned an error")
+    for op, tables in report["ops"].items():
+        for table, stats in tables.items():
+            lines.append(f"simpledb_op_errors_total{_labels(op=op, table=table)} {stats['errors']}")
+
+    family("simpledb_http_request_duration_seconds", "histogram", "Latency of HTTP requests")
+    for endpoint, methods in report["requests"].items():
+        for method, stats in methods.items():
+            lines.extend(_histogram_lines("simpledb_http_request_duration_seconds", stats,
+                                          endpoint=endpoint, method=method))
+    family("simpledb_http_responses_total", "counter", "HTTP responses by status code")
+    for endpoint, statuses in report["responses"].items():
+        for status, count in statuses.items():
+            lines.append(f"simpledb_http_responses_total{_labels(endpoint=endpoint, status=status)} {count}")
+
+    tables = report["tables"]
+    for field, name, help_text in TREE_COUNTERS:
+        family(name, "counter", help_text)
+        for table, stats in tables.items():
+            if field in stats:
+                lines.append(f"{name}{_labels(table=table)} {stats[field]}")
+    for field, name, help_text in TREE_GAUGES:
+        family(name, "gauge", help_text)
+        for table, stats in tables.items():
+            if field in stats:  # Paged tables are only measured on request
+                lines.append(f"{name}{_labels(table=table)} {stats[field]}")
+
+    family("simpledb_table_load_seconds", "gauge", "Time taken to load each table from disk")
+    for table, seconds in report["table_load_seconds"].items():
+        lines.append(f"simpledb_table_load_seconds{_labels(table=table)} {seconds}")
+    family("simpledb_startup_seconds", "gauge", "Time taken to open the database")
+    lines.append(f"simpledb_startup_seconds {report['startup_seconds']}")
+    return "\n".join(lines) + "\n"
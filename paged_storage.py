@@ -0,0 +1,752 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+from array import array
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
+import mmap
+import os
+import pickle
+import struct
+import zlib
+
+from bloom import BloomFilter
+from db_engine import BPlusTree, DEFAULT_FILL_FACTOR, RWLock, _separator
+
+DEFAULT_PAGE_SIZE = 8192
+DEFAULT_CACHE_PAGES = 1024
+
+# Page 0 starts the metadata blob, so 0 doubles as the "no page" link.
+META_PAGE = 0
+NO_PAGE = 0
+
+# Every page starts with <bytes used in this page><next page of the blob>.
+# Nodes larger than one page continue on overflow pages.
+_PAGE_HEADER = struct.Struct("<II")
+# The rollback journal starts with the page count at the last checkpoint,
+# followed by <page id><crc32> + original page image entries.
+_JOURNAL_HEADER = struct.Struct("<Q")
+_JOURNAL_ENTRY = struct.Struct("<II")
+_GROW_PAGES = 256
+
+
+def page_file_initialized(path: str) -> bool:
+    """Whether a page file has been checkpointed at least once"""
+    if os.path.exists(path + ".journal"):
+        return True
+    with open(path, "rb") as f:
+        header = f.read(_PAGE_HEADER.size)
+    return len(header) == _PAGE_HEADER.size and _PAGE_HEADER.unpack(header)[0] > 0
+
+
+class Pager:
+    """Fixed-size pages in a single file, read and written through mmap
+
+    Pages that were part of the last checkpoint are copied to a rollback
+    journal before they are first overwritten, so a crash between
+    checkpoints rolls the file back to the checkpoint and the write-ahead
+    log is replayed on top of it.
+    """
+
+    def __init__(self, path: str, page_size: int = DEFAULT_PAGE_SIZE):
+        self.path = path
+        self.journal_path = path + ".journal"
+        created = not os.path.exists(path)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if created:
+            self.page_size = page_size
+            os.ftruncate(self._fd, page_size)
+        else:
+            if os.path.exists(self.journal_path):
+                self._rollback()
+            header = os.pread(self._fd, _PAGE_HEADER.size + 64, 0)
+            self.page_size = struct.unpack_from("<I", header, _PAGE_HEADER.size)[0]
+        self._map()
+        self.page_count = 1
+        # Nothing in a new file needs journaling before its first checkpoint
+        self.checkpoint_page_count = 0 if created else 1
+        self.free_pages: List[int] = []
+        self._journaled: Set[int] = set()
+        self._journal = None
+
+    def _map(self):
+        self._size = os.fstat(self._fd).st_size
+        self._mm = mmap.mmap(self._fd, self._size)
+
+    def _ensure_size(self, pages: int):
+        needed = pages * self.page_size
+        if needed <= self._size:
+            return
+        self._mm.close()
+        os.ftruncate(self._fd, max(needed, self._size + _GROW_PAGES * self.page_size))
+        self._map()
+
+    @property
+    def payload_size(self) -> int:
+        return self.page_size - _PAGE_HEADER.size
+
+    def allocate(self) -> int:
+        if self.free_pages:
+            return self.free_pages.pop()
+        pid = self.page_count
+        self.page_count += 1
+        self._ensure_size(self.page_count)
+        self._mm[pid * self.page_size:pid * self.page_size + _PAGE_HEADER.size] = _PAGE_HEADER.pack(0, NO_PAGE)
+        return pid
+
+    def free(self, pids: Iterable[int]):
+        self.free_pages.extend(pids)
+
+    def read_blob(self, pid: int) -> Tuple[bytes, List[int]]:
+        """Read a blob and the chain of pages holding it"""
+        chunks, chain = [], []
+        while True:
+            offset = pid * self.page_size
+            used, next_pid = _PAGE_HEADER.unpack_from(self._mm, offset)
+            start = offset + _PAGE_HEADER.size
+            chunks.append(self._mm[start:start + used])
+            chain.append(pid)
+            if next_pid == NO_PAGE:
+                return b"".join(chunks), chain
+            pid = next_pid
+
+    def fit_chain(self, chain: List[int], length: int, extend_only: bool = False) -> List[int]:
+        """Grow or shrink a page chain to hold length bytes"""
+        needed = max(1, -(-length // self.payload_size))
+        while len(chain) < needed:
+            if extend_only:
+                chain.append(self.page_count)
+                self.page_count += 1
+                self._ensure_size(self.page_count)
+            else:
+                chain.append(self.allocate())
+        if len(chain) > needed:
+            self.free(chain[needed:])
+            del chain[needed:]
+        return chain
+
+    def write_blobs(self, blobs: List[Tuple[List[int], bytes]]):
+        """Write (chain, data) pairs, journaling checkpointed pages first"""
+        to_journal = [pid for chain, _ in blobs for pid in chain
+                      if pid < self.checkpoint_page_count and pid not in self._journaled]
+        if to_journal:
+            self._journal_pages(to_journal)
+
+        payload = self.payload_size
+        for chain, data in blobs:
+            for i, pid in enumerate(chain):
+                chunk = data[i * payload:(i + 1) * payload]
+                next_pid = chain[i + 1] if i + 1 < len(chain) else NO_PAGE
+                offset = pid * self.page_size
+                self._mm[offset:offset + _PAGE_HEADER.size] = _PAGE_HEADER.pack(len(chunk), next_pid)
+                self._mm[offset + _PAGE_HEADER.size:offset + _PAGE_HEADER.size + len(chunk)] = chunk
+
+    def _journal_pages(self, pids: List[int]):
+        if self._journal is None:
+            self._journal = open(self.journal_path, "wb")
+            self._journal.write(_JOURNAL_HEADER.pack(self.checkpoint_page_count))
+        for pid in set(pids):
+            image = self._mm[pid * self.page_size:(pid + 1) * self.page_size]
+            self._journal.write(_JOURNAL_ENTRY.pack(pid, zlib.crc32(image)) + image)
+            self._journaled.add(pid)
+        # The original images must be durable before they are overwritten
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _rollback(self):
+        """Restore the page images saved since the last checkpoint"""
+        with open(self.journal_path, "rb") as f:
+            header = f.read(_JOURNAL_HEADER.size)
+            if len(header) == _JOURNAL_HEADER.size:
+                page_count = _JOURNAL_HEADER.unpack(header)[0]
+                first = os.pread(self._fd, _PAGE_HEADER.size + 4, 0)
+                page_size = struct.unpack_from("<I", first, _PAGE_HEADER.size)[0]
+                while True:
+                    entry = f.read(_JOURNAL_ENTRY.size)
+                    if len(entry) < _JOURNAL_ENTRY.size:
+                        break
+                    pid, checksum = _JOURNAL_ENTRY.unpack(entry)
+                    image = f.read(page_size)
+                    if len(image) < page_size or zlib.crc32(image) != checksum:
+                        break  # Torn entry; its page was never overwritten
+                    os.pwrite(self._fd, image, pid * page_size)
+                os.ftruncate(self._fd, page_count * page_size)
+                os.fsync(self._fd)
+        os.remove(self.journal_path)
+
+    def checkpoint(self):
+        """Make every written page durable and forget the journal"""
+        self._mm.flush()
+        os.fsync(self._fd)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            os.remove(self.journal_path)
+        self._journaled.clear()
+        self.checkpoint_page_count = self.page_count
+
+    def close(self):
+        if self._fd is None:
+            return
+        self._mm.close()
+        os.close(self._fd)
+        self._fd = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def __del__(self):
+        if getattr(self, "_fd", None) is not None:
+            self.close()
+
+
+class BufferPool:
+    """Bounded LRU cache of decoded nodes with dirty-page write-back"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.nodes: "OrderedDict[int, PagedNode]" = OrderedDict()
+        self.dirty: Set[int] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pid: int) -> Optional['PagedNode']:
+        node = self.nodes.get(pid)
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.nodes.move_to_end(pid)
+        return node
+
+    def put(self, node: 'PagedNode', dirty: bool = False):
+        self.nodes[node.page_id] = node
+        self.nodes.move_to_end(node.page_id)
+        if dirty:
+            self.dirty.add(node.page_id)
+
+    def discard(self, pid: int):
+        self.nodes.pop(pid, None)
+        self.dirty.discard(pid)
+
+    def evict(self) -> List['PagedNode']:
+        """Drop least recently used nodes over capacity; returns dirty ones"""
+        victims = []
+        while len(self.nodes) > self.capacity:
+            pid, node = self.nodes.popitem(last=False)
+            if pid in self.dirty:
+                self.dirty.discard(pid)
+                victims.append(node)
+        return victims
+
+    def take_dirty(self) -> List['PagedNode']:
+        nodes = [self.nodes[pid] for pid in self.dirty]
+        self.dirty.clear()
+        return nodes
+
+
+class ChildList:
+    """Child page ids of an internal node, resolved to nodes on access
+
+    Lists owned by a node report every reference they gain or lose, so the
+    tree can free the pages of nodes dropped by merges and root collapses.
+    """
+    __slots__ = ("tree", "ids", "owned")
+
+    def __init__(self, tree: 'PagedBPlusTree', ids: List[int], owned: bool):
+        self.tree = tree
+        self.ids = ids
+        self.owned = owned
+        if owned:
+            for pid in ids:
+                tree._ref(pid)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ChildList(self.tree, self.ids[index], owned=False)
+        return self.tree._get(self.ids[index])
+
+    def __iter__(self):
+        for pid in self.ids:
+            yield self.tree._get(pid)
+
+    def pop(self, index: int = -1) -> 'PagedNode':
+        pid = self.ids.pop(index)
+        if self.owned:
+            self.tree._unref(pid)
+        return self.tree._get(pid)
+
+    def insert(self, index: int, node: 'PagedNode'):
+        self.ids.insert(index, node.page_id)
+        if self.owned:
+            self.tree._ref(node.page_id)
+
+    def append(self, node: 'PagedNode'):
+        self.insert(len(self.ids), node)
+
+    def extend(self, nodes: Union['ChildList', List['PagedNode']]):
+        ids = nodes.ids if isinstance(nodes, ChildList) else [node.page_id for node in nodes]
+        self.ids.extend(ids)
+        if self.owned:
+            for pid in ids:
+                self.tree._ref(pid)
+
+    def release(self):
+        if self.owned:
+            for pid in self.ids:
+                self.tree._unref(pid)
+
+
+class PagedNode:
+    """A tree node stored in a page chain; links are page ids"""
+    __slots__ = ("tree", "page_id", "chain", "leaf", "keys", "values", "_children", "_next", "_prev",
+                 "counts", "summary")
+
+    def __init__(self, tree: 'PagedBPlusTree', page_id: int, chain: List[int], leaf: bool,
+                 keys, child_ids: List[int], values: List[Dict[str, Any]],
+                 next_id: int = NO_PAGE, prev_id: int = NO_PAGE, owned: bool = True,
+                 counts: Optional[List[int]] = None):
+        self.tree = tree
+        self.page_id = page_id
+        self.chain = chain
+        self.leaf = leaf
+        self.keys = keys
+        self.values = values
+        self._children = ChildList(tree, child_ids, owned=owned)
+        self._next = next_id
+        self._prev = prev_id
+        self.counts = counts
+        self.summary = None  # Aggregates cached while the node stays in the pool
+
+    def __repr__(self):
+        return f"PagedNode(page={self.page_id}, leaf={self.leaf}, keys={list(self.keys)})"
+
+    @property
+    def children(self) -> ChildList:
+        return self._children
+
+    @children.setter
+    def children(self, nodes):
+        self._children.release()
+        ids = nodes.ids if isinstance(nodes, ChildList) else [node.page_id for node in nodes]
+        self._children = ChildList(self.tree, list(ids), owned=True)
+
+    @property
+    def next_leaf(self) -> Optional['PagedNode']:
+        return self.tree._get(self._next) if self._next != NO_PAGE else None
+
+    @next_leaf.setter
+    def next_leaf(self, node: Optional['PagedNode']):
+        self._next = node.page_id if node is not None else NO_PAGE
+
+    @property
+    def prev_leaf(self) -> Optional['PagedNode']:
+        return self.tree._get(self._prev) if self._prev != NO_PAGE else None
+
+    @prev_leaf.setter
+    def prev_leaf(self, node: Optional['PagedNode']):
+        self._prev = node.page_id if node is not None else NO_PAGE
+
+    def encode(self) -> bytes:
+        return pickle.dumps((self.leaf, self.keys, self._children.ids, self.values, self._next, self._prev,
+                             self.counts), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class PagedBPlusTree(BPlusTree):
+    """BPlusTree whose nodes live in a page file behind a buffer pool
+
+    Only the metadata page is read when the table is opened; nodes are
+    decoded on first access and at most cache_pages of them stay in
+    memory. The tree algorithms are the in-memory ones, running on nodes
+    whose links resolve through the pool.
+    """
+    storage = "paged"
+
+    def __init__(self, path: str, order: int, key_type: Optional[str] = None,
+                 cache_pages: int = DEFAULT_CACHE_PAGES, page_size: int = DEFAULT_PAGE_SIZE,
+                 value_codec: Optional[str] = None):
+        if os.path.exists(path):
+            raise FileExistsError(f"Page file '{path}' already exists")
+        self._attach(path, cache_pages, page_size)
+        with self._write_op():
+            super().__init__(order, key_type, value_codec)
+        self.checkpoint()
+
+    @classmethod
+    def open(cls, path: str, cache_pages: int = DEFAULT_CACHE_PAGES) -> 'PagedBPlusTree':
+        """Open an existing page file; only its metadata is read"""
+        tree = cls.__new__(cls)
+        tree._attach(path, cache_pages)
+        tree._load_meta()
+        return tree
+
+    def _attach(self, path: str, cache_pages: int, page_size: int = DEFAULT_PAGE_SIZE):
+        self.path = path
+        self.pool = BufferPool(cache_pages)
+        self._touched: Optional[Dict[int, PagedNode]] = None  # Nodes used by the current write
+        self._refs: Counter = Counter()
+        self._extra_free: Set[int] = set()
+        self.indexes: Dict[str, Any] = {}
+        self.latch = self._new_latch()
+        self._bloom_meta: Optional[Tuple[str, float]] = None  # (stamp, fp rate) of the saved filter
+        self.pager = Pager(path, page_size)
+
+    def _new_latch(self) -> RWLock:
+        # Reads update the buffer pool, so they are serialized as well
+        return RWLock(exclusive=True)
+
+    def __reduce__(self):
+        raise TypeError("Paged tables are persisted by checkpoint(), not pickled")
+
+    def _load_meta(self):
+        data, _ = self.pager.read_blob(META_PAGE)
+        if len(data) <= 4:
+            self.pager.close()
+            raise ValueError(f"Page file '{self.path}' was never checkpointed")
+        meta = pickle.loads(data[4:])
+        self.order = meta["order"]
+        self.key_type = meta["key_type"]
+        self.value_codec = meta.get("value_codec")
+        self._root_id = meta["root"]
+        self.pager.page_count = meta["page_count"]
+        self.pager.checkpoint_page_count = meta["page_count"]
+        self.pager.free_pages = list(meta["free_pages"])
+        from indexes import SecondaryIndex
+        for field in meta.get("indexes", []):
+            index_tree = PagedBPlusTree.open(self._index_path(field), self.pool.capacity)
+            self.indexes[field] = SecondaryIndex(field, index_tree)
+        self._bloom_meta = meta.get("bloom")
+        if self._bloom_meta is not None:
+            self.bloom = self._read_bloom(*self._bloom_meta)
+        if not meta.get("counted"):
+            # Written before subtree counts: count once, every node is
+            # rewritten by the next checkpoint
+            with self._write_op():
+                self._recount(self.root)
+
+    def _bloom_path(self) -> str:
+        return f"{self.path}.bloom"
+
+    def _read_bloom(self, stamp: str, fp_rate: float) -> BloomFilter:
+        """Load the saved filter, or rebuild it if the file does not match
+        the checkpoint (a crash can land between the two writes)"""
+        try:
+            with open(self._bloom_path(), "rb") as f:
+                saved_stamp, bloom = pickle.load(f)
+            if saved_stamp == stamp:
+                bloom.changed = False
+                return bloom
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        bloom = self._build_bloom(fp_rate)
+        bloom.changed = True
+        return bloom
+
+    def _write_bloom(self):
+        """Save a changed filter under a new stamp; the stamp becomes
+        current when the metadata naming it is checkpointed"""
+        if self.bloom is None:
+            self._bloom_meta = None
+            return
+        if not self.bloom.changed and self._bloom_meta is not None:
+            return
+        stamp = os.urandom(8).hex()
+        tmp_path = self._bloom_path() + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((stamp, self.bloom), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._bloom_path())
+        self.bloom.changed = False
+        self._bloom_meta = (stamp, self.bloom.fp_rate)
+
+    def _maybe_rebuild_bloom(self):
+        """Rebuild an outgrown filter; called inside a write, so the scan
+        reads nodes without adding them to the pool or the touched set"""
+        if self.bloom.needs_rebuild():
+            self.bloom = BloomFilter.build(self._scan_keys(self._root_id), self.bloom.fp_rate,
+                                           self._subtree_count(self.root))
+
+    def _scan_keys(self, pid: int) -> Iterable[Any]:
+        node = (self._touched or {}).get(pid) or self.pool.nodes.get(pid) or self._decode(pid)
+        if node.leaf:
+            yield from node.keys
+        else:
+            for child_id in node.children.ids:
+                yield from self._scan_keys(child_id)
+
+    def _index_path(self, field: str) -> str:
+        return f"{self.path}.{field}.idx"
+
+    def _new_index_tree(self, field: str) -> 'PagedBPlusTree':
+        path = self._index_path(field)
+        for stale in (path, path + ".journal"):
+            # Left behind by a crash before the index was checkpointed
+            if os.path.exists(stale):
+                os.remove(stale)
+        return PagedBPlusTree(path, self.order, cache_pages=self.pool.capacity)
+
+    def _write_meta(self):
+        pager = self.pager
+        chain = [META_PAGE]
+        # Metadata pages only ever come from extending the file, so sizing
+        # the chain cannot change the free list being written.
+        while True:
+            meta = {
+                "order": self.order,
+                "key_type": self.key_type,
+                "value_codec": self.value_codec,
+                "root": self._root_id,
+                "page_count": pager.page_count,
+                "free_pages": array("I", pager.free_pages),
+                "indexes": list(self.indexes),
+                "bloom": self._bloom_meta,
+                "counted": True,
+            }
+            # The page size leads the blob so it can be read before the
+            # metadata is decoded.
+            data = struct.pack("<I", pager.page_size) + pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL)
+            before = pager.page_count
+            pager.fit_chain(chain, len(data), extend_only=True)
+            if pager.page_count == before:
+                break
+        pager.write_blobs([(chain, data)])
+
+    # Node access
+
+    @property
+    def root(self) -> PagedNode:
+        return self._get(self._root_id)
+
+    @root.setter
+    def root(self, node: PagedNode):
+        if getattr(self, "_root_id", None) is not None:
+            self._unref(self._root_id)
+        self._ref(node.page_id)
+        self._root_id = node.page_id
+
+    def _get(self, pid: int) -> PagedNode:
+        if self._touched is not None and pid in self._touched:
+            return self._touched[pid]
+        node = self.pool.get(pid)
+        if node is None:
+            node = self._decode(pid)
+            self.pool.put(node)
+            self._write_back(self.pool.evict())
+        if self._touched is not None:
+            self._touched[pid] = node
+        return node
+
+    def _decode(self, pid: int) -> PagedNode:
+        data, chain = self.pager.read_blob(pid)
+        # Pages written before subtree counts hold six fields
+        leaf, keys, child_ids, values, next_id, prev_id, *counts = pickle.loads(data)
+        node = PagedNode(self, pid, chain, leaf, keys, child_ids, values, next_id, prev_id, owned=False,
+                         counts=counts[0] if counts else None)
+        node._children.owned = True
+        return node
+
+    def _new_node(self, leaf: bool, keys, children, values) -> PagedNode:
+        pid = self.pager.allocate()
+        node = PagedNode(self, pid, [pid], leaf, keys, [], values)
+        node.children = children
+        self._touched[pid] = node
+        return node
+
+    def _ref(self, pid: int):
+        if self._touched is not None:
+            self._refs[pid] += 1
+
+    def _unref(self, pid: int):
+        if self._touched is not None:
+            self._refs[pid] -= 1
+
+    @contextmanager
+    def _write_op(self):
+        """Track the nodes a mutation touches and write them back after it"""
+        if self._touched is not None:
+            yield  # Nested call from another write operation
+            return
+        self._touched = {}
+        self._refs = Counter()
+        self._extra_free = set()
+        try:
+            yield
+        finally:
+            touched, refs, extra = self._touched, self._refs, self._extra_free
+            self._touched = None
+            dropped = {pid for pid, count in refs.items() if count < 0} | extra
+            for pid, node in touched.items():
+                if pid in dropped:
+                    self.pool.discard(pid)
+                    self.pager.free(node.chain)
+                else:
+                    self.pool.put(node, dirty=True)
+            self._write_back(self.pool.evict())
+
+    def _write_back(self, nodes: List[PagedNode]):
+        if not nodes:
+            return
+        blobs = []
+        for node in nodes:
+            data = node.encode()
+            self.pager.fit_chain(node.chain, len(data))
+            blobs.append((node.chain, data))
+        self.pager.write_blobs(blobs)
+
+    # Mutations
+
+    def put(self, key: Any, choose) -> Optional[Dict[str, Any]]:
+        with self.latch.write(), self._write_op():
+            return super().put(key, choose)
+
+    def update(self, key: Any, value: Dict[str, Any]) -> bool:
+        with self.latch.write(), self._write_op():
+            return super().update(key, value)
+
+    def delete(self, key: Any) -> bool:
+        with self.latch.write(), self._write_op():
+            return super().delete(key)
+
+    def bulk_load(self, items: Iterable[Tuple[Any, Dict[str, Any]]],
+                  fill_factor: float = DEFAULT_FILL_FACTOR) -> int:
+        """Merge items into the tree by streaming it into a new one
+
+        The old tree is read leaf by leaf and its pages are freed once
+        read; the new tree is written out as its nodes are built. Only the
+        new items and one entry per node of the level being built stay in
+        memory, so tables larger than the buffer pool can be loaded and
+        compacted.
+        """
+        if not 0 < fill_factor <= 1:
+            raise ValueError("Fill factor must be in (0, 1]")
+        # The stable sort keeps the first occurrence of a repeated key first
+        items = [next(group) for _, group in groupby(sorted(items, key=itemgetter(0)), key=itemgetter(0))]
+        with self.latch.write():
+            existing = self._subtree_count(self.root)
+            # Existing records come first in the merge, so they win ties
+            pairs = merge(self._drain(self._root_id), items, key=itemgetter(0))
+            merged = (next(group) for _, group in groupby(pairs, key=itemgetter(0)))
+            bloom = None
+            if self.bloom is not None:
+                bloom = BloomFilter(2 * (existing + len(items)), self.bloom.fp_rate)
+            total = self._stream_build(merged, fill_factor, bloom)
+            if bloom is not None:
+                self.bloom = bloom
+        return total - existing
+
+    def _drain(self, pid: int) -> Iterable[Tuple[Any, Dict[str, Any]]]:
+        """Yield the pairs under a node in key order, dropping each node
+        from the pool and freeing its pages once it has been read"""
+        node = self.pool.nodes.get(pid) or self._decode(pid)
+        if node.leaf:
+            yield from zip(node.keys, node.values)
+        else:
+            for child_id in list(node.children.ids):
+                yield from self._drain(child_id)
+        self.pool.discard(pid)
+        self.pager.free(node.chain)
+
+    def _stream_build(self, pairs: Iterable[Tuple[Any, Dict[str, Any]]], fill_factor: float,
+                      bloom: Optional[BloomFilter]) -> int:
+        """Pack sorted unique pairs into leaves, then stack internal levels
+        like BPlusTree._build, writing nodes out in batches of the pool size;
+        returns the number of pairs"""
+        order = self.order
+        leaf_fill = max(order - 1, min(2 * order - 1, round(fill_factor * (2 * order - 1))))
+        level: List[Tuple[int, Any, int]] = []  # (page id, lower bound of its keys, key count) per node
+        unwritten: List[PagedNode] = []
+        prev: Optional[PagedNode] = None  # Built leaf waiting for the page id of the next one
+
+        def write(node: Optional[PagedNode]):
+            if node is not None:
+                unwritten.append(node)
+            if node is None or len(unwritten) >= self.pool.capacity:
+                self._write_back(unwritten)
+                unwritten.clear()
+
+        def add_leaf(chunk: List[Tuple[Any, Dict[str, Any]]]):
+            nonlocal prev
+            keys = self._new_keys()
+            keys.extend(key for key, _ in chunk)
+            values = self._new_values()
+            values.extend(value for _, value in chunk)
+            pid = self.pager.allocate()
+            leaf = PagedNode(self, pid, [pid], True, keys, [], values, owned=False)
+            if prev is not None:
+                prev._next, leaf._prev = pid, prev.page_id
+                level.append((pid, _separator(prev.keys[-1], chunk[0][0]), len(chunk)))
+                write(prev)
+            else:
+                level.append((pid, chunk[0][0] if chunk else None, len(chunk)))
+            prev = leaf
+
+        # Leaves are cut at leaf_fill while enough pairs follow to fill a
+        # minimal last leaf; the rest makes one or two leaves at the end
+        total, run = 0, []
+        for key, value in pairs:
+            run.append((key, value))
+            total += 1
+            if bloom is not None:
+                bloom.add(key)
+            if len(run) >= leaf_fill + order - 1:
+                add_leaf(run[:leaf_fill])
+                del run[:leaf_fill]
+        if len(run) > 2 * order - 1:
+            half = len(run) // 2
+            add_leaf(run[:half])
+            add_leaf(run[half:])
+        elif run or not level:
+            add_leaf(run)
+        write(prev)
+
+        child_fill = max(order, min(2 * order, round(fill_factor * 2 * order)))
+        while len(level) > 1:
+            parents = []
+            for chunk in self._chunks(range(len(level)), child_fill, order):
+                keys = self._new_keys()
+                keys.extend(level[j][1] for j in chunk[1:])
+                pid = self.pager.allocate()
+                parent = PagedNode(self, pid, [pid], False, keys, [level[j][0] for j in chunk], [], owned=False,
+                                   counts=[level[j][2] for j in chunk])
+                write(parent)
+                parents.append((pid, level[chunk[0]][1], sum(parent.counts)))
+            level = parents
+        write(None)
+        self._root_id = level[0][0]
+        return total
+
+    def _rebuild(self, fill_factor: float):
+        # No snapshots to build from, so rebuild in place under the latch
+        self.bulk_load([], fill_factor)
+
+    def snapshot(self):
+        """Paged tables have no snapshots: pages are rewritten in place, and
+        a frozen version would need page-level copy-on-write and deferred
+        frees. SimpleDB.snapshot leaves paged tables out, or rejects them
+        when asked for by name, and exports scan them live."""
+        raise TypeError("Snapshots are not supported for paged tables")
+
+    # Persistence
+
+    def checkpoint(self):
+        """Write back dirty nodes and the metadata, then sync the file"""
+        for index in self.indexes.values():
+            index.tree.checkpoint()
+        with self.latch.write():
+            if self.bloom is not None and self.bloom.needs_rebuild():
+                self.bloom = self._build_bloom(self.bloom.fp_rate)
+            self._write_bloom()
+            self._write_back(self.pool.take_dirty())
+            self._write_meta()
+            self.pager.checkpoint()
+
+    def close(self):
+        for index in self.indexes.values():
+            index.tree.close()
+        with self.latch.write():
+            self.pager.close()
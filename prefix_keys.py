@@ -0,0 +1,89 @@
+from typing import Iterable, Iterator, List, Union
+from os.path import commonprefix
+
+
+class PrefixKeys:
+    """Key container for string-keyed nodes that stores the keys' common
+    prefix once and only the remaining suffix of each key
+
+    It behaves like the list of full keys it replaces: indexing returns
+    whole strings, so bisect, comparisons and scans see the same keys.
+    The prefix shrinks when a key that does not share it is added, and
+    grows back when a node is split or copied.
+    """
+
+    __slots__ = ("prefix", "suffixes")
+
+    def __init__(self, keys: Iterable[str] = ()):
+        keys = list(keys)
+        self.prefix = commonprefix(keys)
+        cut = len(self.prefix)
+        self.suffixes: List[str] = [key[cut:] for key in keys]
+
+    def __getstate__(self):
+        return self.prefix, self.suffixes
+
+    def __setstate__(self, state):
+        self.prefix, self.suffixes = state
+
+    def __repr__(self):
+        return f"PrefixKeys({list(self)!r})"
+
+    def __len__(self) -> int:
+        return len(self.suffixes)
+
+    def __iter__(self) -> Iterator[str]:
+        prefix = self.prefix
+        return (prefix + suffix for suffix in self.suffixes)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PrefixKeys):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            part = PrefixKeys.__new__(PrefixKeys)
+            part.prefix, part.suffixes = self.prefix, self.suffixes[index]
+            part._tighten()
+            return part
+        return self.prefix + self.suffixes[index]
+
+    def __setitem__(self, index: int, key: str):
+        self._widen(key)
+        self.suffixes[index] = key[len(self.prefix):]
+
+    def insert(self, index: int, key: str):
+        self._widen(key)
+        self.suffixes.insert(index, key[len(self.prefix):])
+
+    def append(self, key: str):
+        self._widen(key)
+        self.suffixes.append(key[len(self.prefix):])
+
+    def extend(self, keys: Iterable[str]):
+        for key in keys:
+            self.append(key)
+
+    def pop(self, index: int = -1) -> str:
+        return self.prefix + self.suffixes.pop(index)
+
+    def _widen(self, key: str):
+        """Shorten the prefix until key starts with it"""
+        if not isinstance(key, str):
+            raise TypeError(f"PrefixKeys holds str keys, not {type(key).__name__}")
+        if not self.suffixes:
+            self.prefix = key
+        elif not key.startswith(self.prefix):
+            prefix = commonprefix([self.prefix, key])
+            moved = self.prefix[len(prefix):]
+            self.prefix = prefix
+            self.suffixes = [moved + suffix for suffix in self.suffixes]
+
+    def _tighten(self):
+        """Move any prefix all suffixes share into the prefix"""
+        extra = commonprefix(self.suffixes)
+        if extra:
+            self.prefix += extra
+            cut = len(extra)
+            self.suffixes = [suffix[cut:] for suffix in self.suffixes]
@@ -0,0 +1,363 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+from collections import deque
+from contextlib import ExitStack
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import os
+import socket
+import threading
+import time
+
+from db_engine import SimpleDB
+
+# Logged records kept in memory for replicas that reconnect or fall
+# behind; a replica further behind than this is sent a fresh snapshot
+REPLICATION_BACKLOG = 100_000
+# Records sent per message, and per batch of a snapshot table
+SEND_BATCH = 1000
+# Seconds between heartbeats on an idle stream, and between a replica's
+# attempts to reach its primary
+HEARTBEAT_INTERVAL = 0.5
+RECONNECT_INTERVAL = 1.0
+
+Address = Union[Tuple[str, int], str]
+
+
+def _check_authkey(authkey: bytes):
+    # Messages are pickles, so whoever passes the handshake can run code
+    # on the other side; there is deliberately no default key
+    if not isinstance(authkey, bytes) or not authkey:
+        raise ValueError("Replication needs a non-empty shared secret as authkey")
+
+
+def parse_address(text: str) -> Address:
+    """"host:port" for TCP, anything else is a Unix socket path"""
+    host, sep, port = text.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return text
+
+
+class ReplicationLog:
+    """Sequence-numbered tail of a database's mutation log
+
+    The database appends every record it logs while holding its registry
+    lock, so sequence numbers follow the write-ahead log order. Appending
+    is a deque push; senders read the tail from their own threads.
+    """
+
+    def __init__(self, backlog: int = REPLICATION_BACKLOG):
+        self.session = os.urandom(8).hex()  # Sequence numbers restart with the primary
+        self.records: "deque[Tuple[int, float, Tuple[Any, ...]]]" = deque(maxlen=backlog)
+        self.last_seq = 0
+        self.last_time = time.time()
+        self._cond = threading.Condition()
+
+    def publish(self, record: Tuple[Any, ...]):
+        with self._cond:
+            self.last_seq += 1
+            self.last_time = time.time()
+            self.records.append((self.last_seq, self.last_time, record))
+            self._cond.notify_all()
+
+    def read_after(self, seq: int, timeout: float) -> Optional[List[Tuple[int, float, Tuple[Any, ...]]]]:
+        """Up to SEND_BATCH records after seq, waiting up to timeout for
+        one; None if some of them have already left the backlog"""
+        with self._cond:
+            if self.last_seq <= seq:
+                self._cond.wait(timeout)
+            if self.last_seq <= seq:
+                return []
+            first = self.records[0][0]
+            if seq + 1 < first:
+                return None
+            start = seq + 1 - first
+            return [self.records[i] for i in range(start, min(start + SEND_BATCH, len(self.records)))]
+
+    def time_of(self, seq: int) -> Optional[float]:
+        """When record seq was logged; for a record no longer in the
+        backlog, when the oldest one kept was, as a lower bound"""
+        with self._cond:
+            if not self.records or seq > self.last_seq:
+                return None
+            return self.records[max(seq - self.records[0][0], 0)][1]
+
+
+class ReplicationServer:
+    """Streams a primary SimpleDB's mutation log to read replicas
+
+    Replicas connect over TCP or a Unix socket, authenticated with a
+    shared secret key. Messages are pickled, so the key must be kept
+    secret and the listener reachable only from trusted hosts.
+
+    A replica that is new, or too far behind for the backlog, first gets
+    a copy of every table, then each record as it is logged. Writers only
+    append to the backlog; a copy holds every table lock just long enough
+    to freeze the in-memory tables, and paged tables are scanned in
+    batches like any reader. Replication is asynchronous: a write is
+    acknowledged before any replica has applied it.
+    """
+
+    def __init__(self, db: SimpleDB, address: Address, authkey: bytes, backlog: int = REPLICATION_BACKLOG):
+        _check_authkey(authkey)
+        self.db = db
+        self.log = ReplicationLog(backlog)
+        self.replicas: Dict[int, Dict[str, Any]] = {}
+        self._conns: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        db.replication = self.log
+        self._acceptor = threading.Thread(target=self._accept_loop, daemon=True)
+        self._acceptor.start()
+
+    def close(self):
+        self._closed = True
+        if self.db.replication is self.log:
+            self.db.replication = None
+        # A thread blocked in accept() keeps the socket bound, so wake it
+        # with a connection that fails the handshake
+        family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+        try:
+            with socket.socket(family) as wake:
+                wake.connect(self.address)
+        except OSError:
+            pass
+        self._acceptor.join()
+        self._listener.close()
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+
+    def _accept_loop(self):
+        replica_id = 0
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue  # A client that failed the handshake
+            if self._closed:
+                conn.close()
+                return
+            replica_id += 1
+            threading.Thread(target=self._serve_replica, args=(replica_id, conn), daemon=True).start()
+
+    def _serve_replica(self, replica_id: int, conn):
+        state = {"address": str(self._listener.last_accepted or self.address), "connected_at": time.time(),
+                 "acked_seq": 0}
+        with self._lock:
+            self.replicas[replica_id] = state
+            self._conns[replica_id] = conn
+        try:
+            _, session, seq = conn.recv()  # ("subscribe", session, last applied seq)
+            if session != self.log.session:
+                seq = None
+            while not self._closed:
+                if seq is None:
+                    seq = self._send_snapshot(conn)
+                    state["snapshots"] = state.get("snapshots", 0) + 1
+                batch = self.log.read_after(seq, HEARTBEAT_INTERVAL)
+                if batch is None:
+                    seq = None  # Fell out of the backlog
+                    continue
+                if batch:
+                    conn.send(("records", self.log.last_seq, batch))
+                    seq = batch[-1][0]
+                else:
+                    conn.send(("heartbeat", self.log.last_seq, time.time()))
+                while conn.poll():
+                    _, acked = conn.recv()
+                    state["acked_seq"] = acked
+        except (OSError, EOFError):
+            pass
+        finally:
+            conn.close()
+            with self._lock:
+                self.replicas.pop(replica_id, None)
+                self._conns.pop(replica_id, None)
+
+    def _send_snapshot(self, conn) -> int:
+        """Send every table as records that recreate it; returns the
+        sequence number the replica's tables match once the records after
+        it are applied"""
+        db = self.db
+        while True:
+            names = sorted(db.tables)
+            with ExitStack() as stack:
+                # Writers log while holding their table lock, so with all of
+                # them held no change is applied but not yet published
+                for table_name in names:
+                    stack.enter_context(db._table_lock(table_name))
+                with db._lock:
+                    if sorted(db.tables) != names:
+                        continue  # A table was created or dropped meanwhile
+                    seq = self.log.last_seq
+                    tables = [(table_name, db.tables[table_name]) for table_name in names]
+                    # Freezing an in-memory table is O(1); paged tables have
+                    # no snapshots and are scanned after the locks are let go
+                    views = {table_name: tree.snapshot() for table_name, tree in tables if tree.storage != "paged"}
+            break
+
+        try:
+            conn.send(("reset", self.log.session))
+            for table_name, tree in tables:
+                conn.send(("apply", [("create_table", table_name, tree.order, tree.key_type, tree.value_codec)]))
+                view = views.pop(table_name, None)
+                # A live scan may already include changes logged after seq.
+                # Replaying those records on top converges on the primary's
+                # state, as WAL replay does over a fuzzy checkpoint.
+                rows = view.items() if view is not None else tree.range()
+                batch = []
+                try:
+                    for row in rows:
+                        batch.append(row)
+                        if len(batch) == SEND_BATCH:
+                            conn.send(("rows", table_name, batch))
+                            batch = []
+                except ValueError:
+                    batch = []  # Dropped during the scan; its drop_table record follows
+                finally:
+                    if view is not None:
+                        view.release()
+                if batch:
+                    conn.send(("rows", table_name, batch))
+                setup = [("create_index", table_name, field) for field in tree.indexes]
+                if tree.bloom is not None:
+                    setup.append(("set_bloom_filter", table_name, tree.bloom.fp_rate))
+                conn.send(("apply", setup))
+            conn.send(("synced", seq, self.log.time_of(seq) or self.log.last_time))
+        finally:
+            for view in views.values():
+                view.release()
+        return seq
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        last_seq = self.log.last_seq
+        replicas = []
+        with self._lock:
+            for replica_id, state in sorted(self.replicas.items()):
+                acked = state["acked_seq"]
+                behind_since = self.log.time_of(acked + 1) if acked < last_seq else None
+                replicas.append({
+                    "id": replica_id,
+                    "address": state["address"],
+                    "acked_seq": acked,
+                    "lag_records": last_seq - acked,
+                    "lag_seconds": now - behind_since if behind_since is not None else 0.0,
+                    "snapshots": state.get("snapshots", 0),
+                })
+        return {"role": "primary", "session": self.log.session, "seq": last_seq, "replicas": replicas}
+
+
+class ReplicaDB(SimpleDB):
+    """A read replica: a SimpleDB kept up to date from a primary's log
+
+    Records are applied the way recovery replays the write-ahead log, so
+    tables, indexes and Bloom filters match the primary's. The replica
+    keeps no log or snapshots of its own and resyncs from the primary
+    when restarted. Writes should only come from the primary; the HTTP
+    app rejects them on a replica.
+    """
+
+    def __init__(self, db_name: str, primary: Address, authkey: bytes, **options):
+        _check_authkey(authkey)
+        options.update(wal=False, checkpoint_interval=None, checkpoint_writes=None)
+        super().__init__(db_name, **options)
+        self.primary = primary
+        self.authkey = authkey
+        self.session: Optional[str] = None
+        self._resync_session: Optional[str] = None
+        self.applied_seq = 0
+        self.applied_time: Optional[float] = None  # When the last applied record was logged
+        self.primary_seq = 0
+        self.last_contact: Optional[float] = None
+        self.connected = False
+        self._pending_rows: Dict[str, List[Tuple[Any, Dict[str, Any]]]] = {}
+        self._synced = threading.Event()
+        self._follower = threading.Thread(target=self._follow, daemon=True)
+        self._follower.start()
+
+    def close(self):
+        self._closed = True
+        super().close()
+
+    def wait_synced(self, timeout: Optional[float] = None) -> bool:
+        """Block until the initial snapshot or catch-up has been applied"""
+        return self._synced.wait(timeout)
+
+    def _follow(self):
+        while not self._closed:
+            try:
+                conn = Client(self.primary, authkey=self.authkey)
+            except (OSError, EOFError, AuthenticationError):
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+            try:
+                conn.send(("subscribe", self.session, self.applied_seq))
+                self.connected = True
+                while not self._closed:
+                    if not conn.poll(HEARTBEAT_INTERVAL * 4):
+                        break  # The primary went quiet; reconnect
+                    self._handle(conn, conn.recv())
+            except (OSError, EOFError):
+                pass
+            finally:
+                self.connected = False
+                conn.close()
+            time.sleep(RECONNECT_INTERVAL)
+
+    def _handle(self, conn, message):
+        kind = message[0]
+        self.last_contact = time.time()
+        if kind == "records":
+            _, self.primary_seq, batch = message
+            for seq, logged_at, record in batch:
+                self._apply(record)
+                self.applied_seq, self.applied_time = seq, logged_at
+            conn.send(("ack", self.applied_seq))
+            if self.applied_seq >= self.primary_seq:
+                self._synced.set()
+        elif kind == "heartbeat":
+            _, self.primary_seq, _ = message
+            if self.applied_seq >= self.primary_seq:
+                self._synced.set()
+        elif kind == "reset":
+            # Until "synced" the tables match no sequence number, so a
+            # reconnect before then asks for a fresh snapshot
+            self.session, self._resync_session = None, message[1]
+            self._pending_rows.clear()
+            for table_name in list(self.tables):
+                self.drop_table(table_name)
+        elif kind == "rows":
+            # Snapshot rows arrive in batches and are bulk loaded at once
+            self._pending_rows.setdefault(message[1], []).extend(message[2])
+        elif kind == "apply":
+            for table_name, rows in self._pending_rows.items():
+                self.bulk_insert(table_name, rows)
+            self._pending_rows.clear()
+            for record in message[1]:
+                self._apply(record)
+        elif kind == "synced":
+            _, self.applied_seq, self.applied_time = message
+            self.session = self._resync_session
+            self.primary_seq = self.applied_seq
+            conn.send(("ack", self.applied_seq))
+
+    def replication_status(self) -> Dict[str, Any]:
+        now = time.time()
+        behind = self.primary_seq - self.applied_seq
+        return {
+            "role": "replica",
+            "primary": self.primary if isinstance(self.primary, str) else "%s:%d" % self.primary,
+            "connected": self.connected,
+            "session": self.session,
+            "applied_seq": self.applied_seq,
+            "primary_seq": self.primary_seq,
+            "lag_records": behind,
+            # Age of the newest applied change while records are waiting,
+            # so an idle primary does not look like a lagging replica
+            "lag_seconds": now - self.applied_time if behind > 0 and self.applied_time else 0.0,
+            "last_contact_seconds": now - self.last_contact if self.last_contact else None,
+        }
@@ -0,0 +1,602 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from bisect import bisect_right
+from hashlib import blake2b
+from itertools import islice
+from operator import itemgetter
+import heapq
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+from bloom import _key_bytes
+from db_engine import SimpleDB, RANGE_BATCH
+from metrics import Metrics
+
+# Pairs a shard returns per request while a range scan is being merged
+SCAN_BATCH = 4 * RANGE_BATCH
+
+# Workers are forked where possible: spawned ones re-import the main
+# module, which for app.py would open the database again
+_mp = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+
+
+def _scan(db: SimpleDB, table_name: str, start: Any, end: Any, reverse: bool, after: Any,
+          has_after: bool, count: int):
+    """One batch of a shard's part of a range scan, resuming past after"""
+    tree = db.tables.get(table_name)
+    if tree is None:
+        return f"Error: Table '{table_name}' does not exist"
+    if has_after:
+        if reverse:
+            end = after  # The end bound is exclusive
+        else:
+            start = after
+    rows = tree.range(start, end, reverse=reverse)
+    if has_after and not reverse:
+        rows = ((key, value) for key, value in rows if key != after)
+    return list(islice(rows, count))
+
+
+def _serve(conn, db_name: str, options: Dict[str, Any]):
+    """Worker process: own one SimpleDB and run the router's calls on it"""
+    db = SimpleDB(db_name, **options)
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if request is None:
+                break
+            method, args, kwargs = request
+            try:
+                if method == "scan":
+                    result = _scan(db, *args)
+                else:
+                    result = getattr(db, method)(*args, **kwargs)
+                conn.send((True, result))
+            except Exception as e:
+                conn.send((False, e))
+    finally:
+        db.close()
+        conn.close()
+
+
+class Shard:
+    """Connection to one worker process; one call at a time"""
+
+    def __init__(self, index: int, db_name: str, options: Dict[str, Any]):
+        self.index = index
+        self.lock = threading.Lock()
+        self.conn, child = _mp.Pipe()
+        self.process = _mp.Process(target=_serve, args=(child, db_name, options), daemon=True,
+                                   name=f"{db_name}-worker")
+        self.process.start()
+        child.close()
+
+    def send(self, method: str, *args, **kwargs):
+        self.conn.send((method, args, kwargs))
+
+    def receive(self):
+        ok, result = self.conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def call(self, method: str, *args, **kwargs):
+        with self.lock:
+            self.send(method, *args, **kwargs)
+            return self.receive()
+
+    def close(self):
+        with self.lock:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join()
+            self.conn.close()
+
+
+class Partitioner:
+    """Maps a table's keys to shards by hash, or by sorted range
+    boundaries (shard i holds boundaries[i - 1] <= key < boundaries[i])"""
+
+    def __init__(self, shards: int, boundaries: Optional[List[Any]] = None):
+        self.shards = shards
+        self.boundaries = boundaries
+
+    def shard_for(self, key: Any) -> int:
+        """Raises TypeError if key cannot be compared with the boundaries"""
+        if self.boundaries is not None:
+            return bisect_right(self.boundaries, key)
+        digest = blake2b(_key_bytes(key), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.shards
+
+    def shards_for_range(self, start: Any, end: Any) -> List[int]:
+        if self.boundaries is None:
+            return list(range(self.shards))
+        first = 0 if start is None else bisect_right(self.boundaries, start)
+        last = self.shards - 1 if end is None else bisect_right(self.boundaries, end)
+        return list(range(first, last + 1))
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.boundaries is None:
+            return {"partitioning": "hash"}
+        return {"partitioning": "range", "boundaries": self.boundaries}
+
+
+class ShardedTable:
+    """What db.tables.get() returns for a sharded table: enough of a tree
+    for scans, which merge the shards' sorted streams"""
+
+    storage = "sharded"
+
+    def __init__(self, db: 'ShardedDB', table_name: str):
+        self.db = db
+        self.table_name = table_name
+
+    def _stream(self, shard: 'Shard', start: Any, end: Any, reverse: bool) -> Iterator[Tuple[Any, Any]]:
+        after, has_after = None, False
+        while True:
+            batch = shard.call("scan", self.table_name, start, end, reverse, after, has_after, SCAN_BATCH)
+            if isinstance(batch, str):
+                raise KeyError(batch)
+            yield from batch
+            if len(batch) < SCAN_BATCH:
+                return
+            after, has_after = batch[-1][0], True
+
+    def range(self, start: Any = None, end: Any = None, reverse: bool = False,
+              limit: Optional[int] = None) -> Iterator[Tuple[Any, Any]]:
+        """Lazily yield (key, value) pairs with start <= key < end, in key
+        order across all shards (a k-way merge of the shards' scans)"""
+        if limit is not None and limit <= 0:
+            return iter(())
+        partitioner = self.db.partitions[self.table_name]
+        streams = [self._stream(self.db.shards[i], start, end, reverse)
+                   for i in partitioner.shards_for_range(start, end)]
+        merged = heapq.merge(*streams, key=itemgetter(0), reverse=reverse)
+        return islice(merged, limit)
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        return self.range()
+
+
+class ShardedTables:
+    """Read-only table registry of a ShardedDB, shaped like TableCatalog"""
+
+    def __init__(self, db: 'ShardedDB'):
+        self.db = db
+        self.load_times: Dict[str, float] = {}
+
+    def get(self, table_name: str, default=None):
+        if table_name in self.db.partitions:
+            return ShardedTable(self.db, table_name)
+        return default
+
+    def __contains__(self, table_name) -> bool:
+        return table_name in self.db.partitions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.db.partitions))
+
+    def __len__(self) -> int:
+        return len(self.db.partitions)
+
+    def loaded(self) -> List[Tuple[str, ShardedTable]]:
+        return [(table_name, ShardedTable(self.db, table_name)) for table_name in self]
+
+
+_BULK_RESULT = re.compile(r"(\d+) records inserted, (\d+) duplicates skipped")
+
+
+class ShardedDB:
+    """SimpleDB partitioned over worker processes to use several cores
+
+    Each of the worker processes owns a SimpleDB named <db_name>_shard<i>,
+    with its own <db_name>_shard<i>_data directory. Tables are split over
+    all shards by key hash, or by key range when created with boundaries.
+    Single-key calls go to the owning shard; batches are split, sent to
+    their shards together and reassembled; scans merge the shards' sorted
+    streams. The method names and results match SimpleDB, so the HTTP
+    app can use either.
+    """
+
+    def __init__(self, db_name: str, shards: Optional[int] = None, **options):
+        start = time.perf_counter()
+        shards = shards or os.cpu_count() or 1
+        self.db_name = db_name
+        self.catalog_path = f"{db_name}_shards.json"
+        self.partitions: Dict[str, Partitioner] = {}
+        if os.path.exists(self.catalog_path):
+            with open(self.catalog_path) as f:
+                catalog = json.load(f)
+            if catalog["shards"] != shards:
+                raise ValueError(f"Database '{db_name}' has {catalog['shards']} shards, not {shards}")
+            for table_name, spec in catalog["tables"].items():
+                self.partitions[table_name] = Partitioner(shards, spec.get("boundaries"))
+        self.metrics: Optional[Metrics] = Metrics() if options.get("metrics") else None  # HTTP timings
+        self.tables = ShardedTables(self)
+        self._lock = threading.Lock()  # Guards the catalog
+        self.shards = [Shard(i, f"{db_name}_shard{i}", options) for i in range(shards)]
+        self.startup_report: Dict[str, Any] = {"shards": shards, "tables": len(self.partitions),
+                                               "total_ms": (time.perf_counter() - start) * 1000}
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def _save_catalog(self):
+        catalog = {"shards": len(self.shards),
+                   "tables": {name: p.to_dict() for name, p in self.partitions.items()}}
+        tmp_path = self.catalog_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(catalog, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.catalog_path)
+
+    def _call_many(self, calls: Dict[int, Tuple[str, tuple, dict]]) -> Dict[int, Any]:
+        """Run one call on each of several shards concurrently"""
+        shards = [self.shards[i] for i in sorted(calls)]
+        # Locks are always taken in shard order, so batches cannot deadlock
+        for shard in shards:
+            shard.lock.acquire()
+        try:
+            for shard in shards:
+                method, args, kwargs = calls[shard.index]
+                shard.send(method, *args, **kwargs)
+            results, error = {}, None
+            for shard in shards:
+                try:
+                    results[shard.index] = shard.receive()
+                except Exception as e:  # Keep reading so every pipe is drained
+                    error = error or e
+            if error is not None:
+                raise error
+            return results
+        finally:
+            for shard in shards:
+                shard.lock.release()
+
+    def _broadcast(self, method: str, *args, **kwargs) -> List[Any]:
+        results = self._call_many({i: (method, args, kwargs) for i in range(len(self.shards))})
+        return [results[i] for i in range(len(self.shards))]
+
+    def _first_error(self, results: Iterable[Any]) -> Optional[str]:
+        return next((r for r in results if isinstance(r, str) and r.startswith("Error")), None)
+
+    def _missing(self, table_name: str) -> Optional[str]:
+        if table_name not in self.partitions:
+            return f"Error: Table '{table_name}' does not exist"
+        return None
+
+    def _shard_for(self, table_name: str, key: Any) -> Optional['Shard']:
+        try:
+            return self.shards[self.partitions[table_name].shard_for(key)]
+        except TypeError:
+            return None
+
+    # Tables
+
+    def create_table(self, table_name: str, order: Optional[int] = None, key_type: Optional[str] = None,
+                     value_codec: Optional[str] = None, boundaries: Optional[List[Any]] = None):
+        """Create a table on every shard; boundaries (one fewer than the
+        shards, sorted) partition it by key range instead of by hash"""
+        if boundaries is not None:
+            if not isinstance(boundaries, list) or len(boundaries) != len(self.shards) - 1:
+                return f"Error: Range partitioning needs {len(self.shards) - 1} boundaries"
+            try:
+                if boundaries != sorted(boundaries):
+                    return "Error: Boundaries must be sorted"
+            except TypeError:
+                return "Error: Boundaries must be of one comparable type"
+        with self._lock:
+            if table_name in self.partitions:
+                return f"Error: Table '{table_name}' already exists"
+            results = self._broadcast("create_table", table_name, order, key_type, value_codec)
+            error = self._first_error(results)
+            if error is not None:
+                return error
+            self.partitions[table_name] = Partitioner(len(self.shards), boundaries)
+            self._save_catalog()
+        return results[0]
+
+    def drop_table(self, table_name: str):
+        with self._lock:
+            if table_name not in self.partitions:
+                return f"Error: Table '{table_name}' does not exist"
+            results = self._broadcast("drop_table", table_name)
+            del self.partitions[table_name]
+            self._save_catalog()
+        return results[0]
+
+    def create_index(self, table_name: str, field: str):
+        return self._broadcast_table("create_index", table_name, field)
+
+    def set_record_cache_size(self, table_name: str, size: int):
+        return self._broadcast_table("set_record_cache_size", table_name, size)
+
+    def set_bloom_filter(self, table_name: str, fp_rate: Optional[float]):
+        return self._broadcast_table("set_bloom_filter", table_name, fp_rate)
+
+    def _broadcast_table(self, method: str, table_name: str, *args):
+        error = self._missing(table_name)
+        if error is not None:
+            return error
+        results = self._broadcast(method, table_name, *args)
+        return self._first_error(results) or results[0]
+
+    def compact(self, table_name: str, *args):
+        error = self._missing(table_name)
+        if error is not None:
+            return error
+        results = self._broadcast("compact", table_name, *args)
+        return self._first_error(results) or {"shards": results}
+
+    # Single records
+
+    def _keyed(self, method: str, table_name: str, key: Any, *args, **kwargs):
+        error = self._missing(table_name)
+        if error is not None:
+            return error
+        shard = self._shard_for(table_name, key)
+        if shard is None:
+            # Same answer SimpleDB gives for a key of the wrong type
+            return f"Error: Key '{key}' does not match the key type of table '{table_name}'"
+        return shard.call(method, table_name, key, *args, **kwargs)
+
+    def insert(self, table_name: str, key: Any, data: Dict[str, Any]):
+        return self._keyed("insert", table_name, key, data)
+
+    def upsert(self, table_name: str, key: Any, data: Dict[str, Any]):
+        return self._keyed("upsert", table_name, key, data)
+
+    def update(self, table_name: str, key: Any, data: Dict[str, Any]):
+        return self._keyed("update", table_name, key, data)
+
+    def compare_and_set(self, table_name: str, key: Any, data: Dict[str, Any], *args, **kwargs):
+        return self._keyed("compare_and_set", table_name, key, data, *args, **kwargs)
+
+    def delete(self, table_name: str, key: Any):
+        return self._keyed("delete", table_name, key)
+
+    def read(self, table_name: str, key: Any):
+        return self._keyed("read", table_name, key)
+
+    # Batches
+
+    def _split(self, table_name: str, keys: List[Any]) -> Tuple[Dict[int, List[int]], List[int]]:
+        """Positions of keys grouped by shard, and positions of keys that
+        fit no shard"""
+        groups: Dict[int, List[int]] = {}
+        unroutable = []
+        partitioner = self.partitions[table_name]
+        for pos, key in enumerate(keys):
+            try:
+                groups.setdefault(partitioner.shard_for(key), []).append(pos)
+            except TypeError:
+                unroutable.append(pos)
+        return groups, unroutable
+
+    def _scatter(self, method: str, table_name: str, items: List[Any], keys: List[Any],
+                 mismatch: Callable[[Any], str]):
+        """Send each shard its share of items and put the per-item results
+        back in input order"""
+        error = self._missing(table_name)
+        if error is not None:
+            return error
+        groups, unroutable = self._split(table_name, keys)
+        results: List[Any] = [None] * len(items)
+        for pos in unroutable:
+            results[pos] = mismatch(keys[pos])
+        calls = {i: (method, (table_name, [items[pos] for pos in positions]), {})
+                 for i, positions in groups.items()}
+        replies = self._call_many(calls) if calls else {}
+        for i, reply in replies.items():
+            if isinstance(reply, str):
+                return reply
+            for pos, result in zip(groups[i], reply):
+                results[pos] = result
+        return results
+
+    def multi_get(self, table_name: str, keys: Iterable[Any]):
+        keys = list(keys)
+        return self._scatter("multi_get", table_name, keys, keys,
+                             lambda key: f"Error: Record with key '{key}' not found")
+
+    def multi_put(self, table_name: str, records: Iterable[Tuple[Any, Dict[str, Any]]]):
+        records = list(records)
+        return self._scatter("multi_put", table_name, records, [key for key, _ in records],
+                             lambda key: f"Error: Key '{key}' does not match the key type of table '{table_name}'")
+
+    def multi_delete(self, table_name: str, keys: Iterable[Any]):
+        keys = list(keys)
+        return self._scatter("multi_delete", table_name, keys, keys,
+                             lambda key: f"Error: Record with key '{key}' not found")
+
+    def bulk_insert(self, table_name: str, records: Iterable[Tuple[Any, Dict[str, Any]]], *args):
+        error = self._missing(table_name)
+        if error is not None:
+            return error
+        records = list(records)
+        groups, unroutable = self._split(table_name, [key for key, _ in records])
+        if unroutable:
+            key = records[unroutable[0]][0]
+            return f"Error: Key '{key}' does not match the key type of table '{table_name}'"
+        calls = {i: ("bulk_insert", (table_name, [records[pos] for pos in positions]) + args, {})
+                 for i, positions in groups.items()}
+        replies = list(self._call_many(calls).values()) if calls else []
+        error = self._first_error(replies)
+        if error is not None:
+            return error
+        counts = [_BULK_RESULT.match(reply).groups() for reply in replies]
+        added = sum(int(added) for added, _ in counts)
+        return f"{added} records inserted, {len(records) - added} duplicates skipped"
+
+    def query(self, table_name: str, field: str, limit: Optional[int] = None, **predicates):
+        error = self._missing(table_name)
+        if error is not None:
+            return error
+        results = self._broadcast("query", table_name, field, limit, **predicates)
+        error = self._first_error(results)
+        if error is not None:
+            return error
+        # Every match has a value of the predicates' type, so values compare
+        records = sorted((r for part in results for r in part), key=lambda r: (r["value"][field], r["key"]))
+        return records[:limit] if limit is not None else records
+
+    # Order statistics
+
+    def _ranged(self, method: str, table_name: str, start: Any, end: Any, **kwargs) -> List[Any]:
+        """Run method on the shards that can hold keys in [start, end);
+        returns their results or the first error"""
+        error = self._missing(table_name)
+        if error is not None:
+            return error
+        try:
+            ids = self.partitions[table_name].shards_for_range(start, end)
+        except TypeError:
+            return f"Error: Range bounds do not match the keys of table '{table_name}'"
+        kwargs.update(start=start, end=end)
+        results = self._call_many({i: (method, (table_name,), kwargs) for i in ids})
+        return self._first_error(results.values()) or list(results.values())
+
+    def count_range(self, table_name: str, start: Any = None, end: Any = None):
+        results = self._ranged("count_range", table_name, start, end)
+        return results if isinstance(results, str) else sum(results)
+
+    def rank(self, table_name: str, key: Any):
+        error = self._missing(table_name)
+        if error is not None:
+            return error
+        try:
+            ids = self.partitions[table_name].shards_for_range(None, key)
+        except TypeError:
+            return f"Error: Key '{key}' does not match the keys of table '{table_name}'"
+        results = self._call_many({i: ("rank", (table_name, key), {}) for i in ids}).values()
+        return self._first_error(results) or sum(results)
+
+    def select(self, table_name: str, k: int):
+        """The record at position k across all shards
+
+        Each shard keeps a window of positions that may still hold the
+        answer. A round picks the middle record of the widest window and
+        asks every shard for its rank, which narrows every window, so the
+        answer is found in O(shards * log n) rounds without a scan.
+        """
+        error = self._missing(table_name)
+        if error is not None:
+            return error
+        if not isinstance(k, int) or isinstance(k, bool):
+            return f"Error: Invalid position '{k}'"
+        high = self._broadcast("count_range", table_name)
+        error = self._first_error(high)
+        if error is not None:
+            return error
+        if not 0 <= k < sum(high):
+            return f"Error: Position {k} is out of range"
+        low = [0] * len(high)
+        while True:
+            open_windows = [i for i in range(len(high)) if high[i] > low[i]]
+            if not open_windows:
+                return f"Error: Table '{table_name}' changed during select"
+            if len(open_windows) == 1:
+                # Every other shard's window is closed, so its records below
+                # the window are exactly the ones before the answer
+                i = open_windows[0]
+                return self.shards[i].call("select", table_name, k - sum(low) + low[i])
+            i = max(open_windows, key=lambda j: high[j] - low[j])
+            pivot = self.shards[i].call("select", table_name, (low[i] + high[i]) // 2)
+            if isinstance(pivot, str):
+                return pivot
+            ranks = self._broadcast("rank", table_name, pivot["key"])
+            position = sum(ranks)
+            if position == k:
+                return pivot
+            for j, rank in enumerate(ranks):
+                if position < k:
+                    low[j] = max(low[j], rank + (j == i))  # Past the pivot itself
+                else:
+                    high[j] = min(high[j], rank)
+
+    def aggregate(self, table_name: str, field: str, start: Any = None, end: Any = None):
+        results = self._ranged("aggregate", table_name, start, end, field=field)
+        if isinstance(results, str):
+            return results
+        present = [r for r in results if r["count"]]
+        total = sum(r["sum"] for r in present)
+        count = sum(r["count"] for r in present)
+        return {
+            "records": sum(r["records"] for r in results),
+            "count": count,
+            "sum": total,
+            "min": min((r["min"] for r in present), default=None),
+            "max": max((r["max"] for r in present), default=None),
+            "avg": total / count if count else None,
+        }
+
+    # Persistence and reporting
+
+    def save_db(self) -> List[int]:
+        return self._broadcast("save_db")
+
+    def request_checkpoint(self) -> List[int]:
+        """Checkpoint every shard; returns the per-shard checkpoint ids"""
+        return self._broadcast("request_checkpoint")
+
+    def wait_for_checkpoint(self, checkpoint_ids: List[int], timeout: Optional[float] = None) -> bool:
+        calls = {i: ("wait_for_checkpoint", (checkpoint_id, timeout), {})
+                 for i, checkpoint_id in enumerate(checkpoint_ids)}
+        return all(self._call_many(calls).values())
+
+    def checkpoint_status(self) -> Dict[str, Any]:
+        return {"shards": self._broadcast("checkpoint_status")}
+
+    def record_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return self._per_shard_tables("record_cache_stats")
+
+    def bloom_stats(self) -> Dict[str, Dict[str, Any]]:
+        return self._per_shard_tables("bloom_stats")
+
+    def _per_shard_tables(self, method: str) -> Dict[str, Any]:
+        """Merge per-table reports of the shards as "<table>#<shard>" entries"""
+        merged = {}
+        for i, report in enumerate(self._broadcast(method)):
+            for table_name, stats in report.items():
+                merged[f"{table_name}#{i}"] = stats
+        return merged
+
+    def metrics_report(self) -> Dict[str, Any]:
+        """The shards' reports combined: op histograms summed over shards,
+        tables listed per shard, HTTP timings from this process"""
+        reports = self._broadcast("metrics_report")
+        ops: Dict[str, Dict[str, Any]] = {}
+        for report in reports:
+            for op, tables in report["ops"].items():
+                for table_name, stats in tables.items():
+                    total = ops.setdefault(op, {}).get(table_name)
+                    if total is None:
+                        ops[op][table_name] = dict(stats, buckets=dict(stats["buckets"]))
+                        continue
+                    for field in ("count", "sum", "errors"):
+                        total[field] += stats[field]
+                    for bound, count in stats["buckets"].items():
+                        total["buckets"][bound] += count
+                    total["mean"] = total["sum"] / total["count"] if total["count"] else 0.0
+        local = self.metrics.to_dict() if self.metrics is not None else {"requests": {}, "responses": {}}
+        return {
+            "ops": ops,
+            "requests": local["requests"],
+            "responses": local["responses"],
+            "enabled": self.metrics is not None,
+            "tables": {f"{name}#{i}": stats for i, report in enumerate(reports)
+                       for name, stats in report["tables"].items()},
+            "table_load_seconds": {f"{name}#{i}": seconds for i, report in enumerate(reports)
+                                   for name, seconds in report["table_load_seconds"].items()},
+            "startup_seconds": max([r["startup_seconds"] for r in reports], default=0.0),
+        }
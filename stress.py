@@ -0,0 +1,120 @@
+import random
+import sys
+import threading
+import time
+from db_engine import BPlusTree
+
+# Hammer one tree from many threads, some reading through snapshots, and
+# check it is still a valid B+ tree holding exactly the records the
+# writers left behind.
+WRITERS = 8
+READERS = 8
+OPS_PER_WRITER = 20_000
+KEYS_PER_WRITER = 2_000
+
+
+def check_tree(tree: BPlusTree):
+    """Raise AssertionError if the tree's structure is inconsistent"""
+    leaves = []
+
+    def walk(node, low, high, depth, is_root):
+        keys = list(node.keys)
+        assert keys == sorted(keys), "unsorted node"
+        if not is_root:
+            assert tree.order - 1 <= len(keys) <= 2 * tree.order - 1, "node under/overflow"
+        assert all((low is None or k >= low) and (high is None or k < high) for k in keys), "key out of range"
+        if node.leaf:
+            assert len(node.values) == len(keys), "leaf values out of step"
+            leaves.append((node, depth))
+            return
+        assert len(node.children) == len(keys) + 1, "child count mismatch"
+        bounds = [low] + keys + [high]
+        for i, child in enumerate(node.children):
+            walk(child, bounds[i], bounds[i + 1], depth + 1, False)
+
+    walk(tree.root, None, None, 0, True)
+    assert len({depth for _, depth in leaves}) == 1, "leaves at different depths"
+    for (left, _), (right, _) in zip(leaves, leaves[1:]):
+        assert left.next_leaf is right and right.prev_leaf is left, "broken leaf chain"
+
+
+def run_stress(order: int = 4, writers: int = WRITERS, readers: int = READERS,
+               ops: int = OPS_PER_WRITER, seed: int = 7) -> float:
+    tree = BPlusTree(order)
+    expected = [dict() for _ in range(writers)]
+    errors = []
+    done = threading.Event()
+
+    def writer(n: int):
+        rng = random.Random(seed + n)
+        own = expected[n]
+        try:
+            for _ in range(ops):
+                # Writers own disjoint key ranges, so each knows its final state
+                key = n * KEYS_PER_WRITER + rng.randrange(KEYS_PER_WRITER)
+                if rng.random() < 0.6:
+                    value = {"writer": n, "key": key}
+                    tree.insert(key, value)
+                    own[key] = value
+                else:
+                    assert tree.delete(key) == (key in own), "delete result mismatch"
+                    own.pop(key, None)
+        except Exception as e:
+            errors.append(e)
+
+    def reader(n: int):
+        rng = random.Random(seed - n)
+        try:
+            while not done.is_set():
+                key = rng.randrange(writers * KEYS_PER_WRITER)
+                value = tree.search(key)
+                assert value is None or value["key"] == key, "search returned a foreign record"
+                start = rng.randrange(writers * KEYS_PER_WRITER)
+                keys = [k for k, _ in tree.range(start, start + 500)]
+                assert keys == sorted(set(keys)), "scan out of order"
+        except Exception as e:
+            errors.append(e)
+
+    def snapshot_reader():
+        try:
+            while not done.is_set():
+                # A snapshot must not change while the writers keep going
+                with tree.snapshot() as snapshot:
+                    first = list(snapshot.range())
+                    time.sleep(0.001)
+                    assert list(snapshot.range()) == first, "snapshot changed under a reader"
+                    assert [k for k, _ in first] == sorted({k for k, _ in first}), "snapshot out of order"
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    reader_threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    reader_threads.append(threading.Thread(target=snapshot_reader))
+    started = time.perf_counter()
+    for thread in threads + reader_threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if errors:
+        raise errors[0]
+    check_tree(tree)
+    final = {}
+    for own in expected:
+        final.update(own)
+    assert [k for k, _ in tree.range()] == sorted(final), "records lost or duplicated"
+    for key, value in final.items():
+        assert tree.search(key) is value, "stale value"
+    return elapsed
+
+
+if __name__ == "__main__":
+    for order in (2, 4, 64):
+        elapsed = run_stress(order)
+        print(f"order {order:>3}: {WRITERS} writers x {OPS_PER_WRITER} ops with {READERS} readers "
+              f"in {elapsed:.2f}s - ok")
+    sys.exit(0)
@@ -0,0 +1,132 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+from flask import Flask, Response, request
+
+from async_server import AsyncHTTPServer
+
+
+def make_app():
+    app = Flask(__name__)
+    seen = []
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return request.get_data()
+
+    @app.route('/append', methods=['POST'])
+    def append():
+        seen.append(request.args['n'])
+        return ",".join(seen)
+
+    @app.route('/stream')
+    def stream():
+        return Response((f"part{i};" for i in range(int(request.args['parts']))), mimetype='text/plain')
+
+    return app
+
+
+@pytest.fixture
+def server():
+    server = AsyncHTTPServer(make_app(), port=0, workers=4)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server
+    deadline = time.monotonic() + 5
+    while server.connections and time.monotonic() < deadline:  # Let closed connections finish
+        time.sleep(0.01)
+    loop.call_soon_threadsafe(server.close)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def connect(server):
+    sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+    return sock, sock.makefile("rb")
+
+
+def read_response(stream):
+    """Status, lower-cased headers and body of the next response"""
+    status = int(stream.readline().split()[1])
+    headers = {}
+    while True:
+        line = stream.readline().decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while True:
+            size = int(stream.readline().strip(), 16)
+            chunk = stream.read(size + 2)[:-2]
+            if not size:
+                break
+            body += chunk
+    else:
+        body = stream.read(int(headers.get("content-length", 0)))
+    return status, headers, body
+
+
+def request_bytes(method, target, body=b"", version="HTTP/1.1", headers=()):
+    lines = [f"{method} {target} {version}", "Host: test", f"Content-Length: {len(body)}", *headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+def test_keep_alive_serves_many_requests_on_one_connection(server):
+    sock, stream = connect(server)
+    for i in range(5):
+        sock.sendall(request_bytes("POST", "/echo", f"hello {i}".encode()))
+        status, headers, body = read_response(stream)
+        assert (status, body) == (200, f"hello {i}".encode())
+        assert headers.get("connection") != "close"
+    sock.close()
+
+
+def test_pipelined_requests_apply_and_answer_in_order(server):
+    sock, stream = connect(server)
+    sock.sendall(b"".join(request_bytes("POST", f"/append?n={i}") for i in range(10)))
+    bodies = [read_response(stream)[2] for _ in range(10)]
+    assert bodies[-1] == b",".join(str(i).encode() for i in range(10))
+    assert [body.count(b",") for body in bodies] == list(range(10))
+    sock.close()
+
+
+def test_chunked_bodies_in_both_directions(server):
+    sock, stream = connect(server)
+    sock.sendall(b"POST /echo HTTP/1.1\r\nHost: test\r\nTransfer-Encoding: chunked\r\n\r\n"
+                 b"5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n")
+    assert read_response(stream)[2] == b"hello world"
+
+    sock.sendall(request_bytes("GET", "/stream?parts=1000"))
+    status, headers, body = read_response(stream)
+    assert headers["transfer-encoding"] == "chunked"
+    assert body == b"".join(f"part{i};".encode() for i in range(1000))
+    sock.close()
+
+
+def test_http_1_0_closes_unless_asked_to_keep_alive(server):
+    sock, stream = connect(server)
+    sock.sendall(request_bytes("POST", "/echo", b"x", version="HTTP/1.0", headers=["Connection: keep-alive"]))
+    status, headers, body = read_response(stream)
+    assert headers["connection"] == "keep-alive"
+    sock.sendall(request_bytes("POST", "/echo", b"y", version="HTTP/1.0"))
+    assert read_response(stream)[2] == b"y"
+    assert stream.read() == b""  # Closed by the server
+    sock.close()
+
+
+def test_errors(server):
+    sock, stream = connect(server)
+    sock.sendall(request_bytes("GET", "/missing"))
+    assert read_response(stream)[0] == 404
+    sock.sendall(b"NONSENSE\r\n\r\n")
+    status, headers, _ = read_response(stream)
+    assert status == 400 and headers["connection"] == "close"
+    sock.close()
@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = open_db(tmp_path)
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+@pytest.mark.parametrize("order", [2, 3, 32])
+def test_tree_batches_match_single_key_operations(order):
+    rng = random.Random(order)
+    tree = BPlusTree(order)
+    expected = {}
+    for step in range(30):
+        batch = [(rng.randrange(2000), {"step": step, "i": i}) for i in range(rng.randrange(1, 200))]
+        olds = tree.insert_many(batch)
+        for (key, value), old in zip(batch, olds):
+            assert old == expected.get(key)
+            expected[key] = value  # The last pair for a repeated key wins
+        keys = [rng.randrange(2000) for _ in range(rng.randrange(1, 150))]
+        found = tree.delete_many(keys)
+        seen = set()
+        for key, was_found in zip(keys, found):
+            assert was_found == (key in expected and key not in seen)
+            seen.add(key)
+        for key in keys:
+            expected.pop(key, None)
+
+    probe = [rng.randrange(-10, 2010) for _ in range(1000)]
+    assert tree.search_many(probe) == [expected.get(key) for key in probe]
+    assert list(tree.range()) == sorted(expected.items())
+    assert tree.search_many([]) == []
+
+
+def test_multi_operations_report_per_key_in_input_order(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t", key_type="int")
+    db.insert("t", 5, {"v": 0})
+    assert db.multi_put("t", [(7, {"v": 1}), (5, {"v": 2}), ("x", {}), (7, {"v": 3})]) == [
+        "Record inserted successfully",
+        "Record updated successfully",
+        "Error: Key 'x' does not match the key type of table 't'",
+        "Record updated successfully",
+    ]
+    results = db.multi_get("t", [7, 6, 5, "x"])
+    assert results[0] == {"v": 3} and results[2] == {"v": 2}
+    assert results[1].startswith("Error") and results[3].startswith("Error")
+
+    results = db.multi_delete("t", [5, 6, 5, "x"])
+    assert results[0] == "Record deleted successfully"
+    assert all(result.startswith("Error") for result in results[1:])
+    assert db.read("t", 5).startswith("Error")
+    assert db.multi_get("missing", [1]).startswith("Error")
+    db.close()
+
+
+def test_incomparable_keys_fail_the_whole_batch(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t")
+    assert db.multi_put("t", [(1, {}), ("a", {})]).startswith("Error")
+    assert db.multi_get("t", [1, "a"]).startswith("Error")
+    assert db.multi_delete("t", [1, "a"]).startswith("Error")
+    assert list(db.tables["t"].range()) == []
+    db.close()
+
+
+def test_batches_keep_indexes_and_survive_replay(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t")
+    db.create_index("t", "tag")
+    db.multi_put("t", [(key, {"tag": key % 3}) for key in range(30)])
+    db.multi_put("t", [(key, {"tag": 9}) for key in range(0, 30, 5)])
+    db.multi_delete("t", list(range(0, 30, 2)))
+    db.multi_put("t", [(1, {"tag": 7}), (3, {"tag": 0}), (1, {"tag": 1})])  # 1 ends where it started
+    expected = {key: (9 if key % 5 == 0 else key % 3) for key in range(1, 30, 2)}
+    assert db.query("t", "tag", eq=7) == []
+    assert [r["key"] for r in db.query("t", "tag", eq=9)] == [k for k, tag in expected.items() if tag == 9]
+    db.close()
+
+    db = open_db(tmp_path)
+    assert list(db.tables["t"].range()) == [(key, {"tag": tag}) for key, tag in expected.items()]
+    assert [r["key"] for r in db.query("t", "tag", eq=1)] == [k for k, tag in expected.items() if tag == 1]
+    db.close()
+
+
+def test_batch_endpoints(client):
+    client.post("/create_table", json={"table_name": "t"})
+    body = client.put("/multi_put", json={"table_name": "t", "records": [{"key": 1, "data": {"a": 1}}, {"key": 2}]})
+    assert body.get_json() == {"results": [{"key": 1, "message": "Record inserted successfully"},
+                                           {"key": 2, "message": "Record inserted successfully"}]}
+    body = client.post("/multi_get", json={"table_name": "t", "keys": [2, 3, 1]}).get_json()
+    assert body["results"][0] == {"key": 2, "record": {}}
+    assert body["results"][1]["key"] == 3 and "error" in body["results"][1]
+    assert body["results"][2] == {"key": 1, "record": {"a": 1}}
+    body = client.delete("/multi_delete", json={"table_name": "t", "keys": [1, 1]}).get_json()
+    assert body["results"][0] == {"key": 1, "message": "Record deleted successfully"}
+    assert "error" in body["results"][1]
+
+    assert client.post("/multi_get", json={"table_name": "t", "keys": 1}).status_code == 400
+    assert client.put("/multi_put", json={"table_name": "t", "records": [{"data": {}}]}).status_code == 400
+    assert client.post("/multi_get", json={"table_name": "missing", "keys": []}).status_code == 404
+    assert client.delete("/multi_delete", json={"table_name": "missing", "keys": []}).status_code == 404
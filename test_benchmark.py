@@ -0,0 +1,43 @@
+import json
+from collections import Counter
+
+import pytest
+
+import benchmark
+from db_engine import SimpleDB
+
+
+def test_workloads_are_reproducible():
+    for distribution in benchmark.DISTRIBUTIONS:
+        inserts, lookups = benchmark.workload_keys(distribution, 1000, seed=7)
+        assert sorted(inserts) == list(range(1000))
+        assert len(lookups) == 1000 and set(lookups) <= set(inserts)
+        assert benchmark.workload_keys(distribution, 1000, seed=7) == (inserts, lookups)
+    assert benchmark.workload_keys("sequential", 5, seed=1) == ([0, 1, 2, 3, 4], [0, 1, 2, 3, 4])
+    with pytest.raises(ValueError):
+        benchmark.workload_keys("gaussian", 10, seed=1)
+
+
+def test_zipfian_lookups_favour_a_few_keys():
+    _, lookups = benchmark.workload_keys("zipfian", 10000, seed=3)
+    _, uniform = benchmark.workload_keys("random", 10000, seed=3)
+    hot = sum(count for _, count in Counter(lookups).most_common(10))
+    assert hot > 5 * sum(count for _, count in Counter(uniform).most_common(10))
+
+
+def test_small_suite_writes_json(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    # The http suite closes and replaces the app's database
+    monkeypatch.setattr(app, "db", SimpleDB(str(tmp_path / "app")))
+    output = tmp_path / "results.json"
+    benchmark.suite_main(["--sizes", "300", "--orders", "4", "--distributions", "random",
+                          "--seed", "5", "--output", str(output)])
+
+    report = json.loads(output.read_text())
+    assert report["meta"]["seed"] == 5 and report["meta"]["sizes"] == [300]
+    ops = {(row["suite"], row["op"]) for row in report["results"]}
+    assert {("tree", "insert"), ("tree", "bulk_load"), ("db", "reopen"),
+            ("db", "read_after_reopen"), ("http", "read_record"), ("http", "multi_get")} <= ops
+    assert all(row["distribution"] == "random" and row["order"] == 4 for row in report["results"])
+    assert all(row["seconds"] >= 0 for row in report["results"])
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from bloom import BloomFilter
+from db_engine import BPlusTree, SimpleDB
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = open_db(tmp_path)
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+def test_filter_has_no_false_negatives_and_keeps_its_rate():
+    bloom = BloomFilter.build(range(0, 20000, 2), fp_rate=0.01)
+    assert all(bloom.might_contain(key) for key in range(0, 20000, 2))
+    false_positives = sum(bloom.might_contain(key) for key in range(1, 20000, 2))
+    assert false_positives < 10000 * 0.03
+    assert bloom.might_contain(4.0) and bloom.might_contain(False)  # Equal keys share their bits
+    with pytest.raises(ValueError):
+        BloomFilter(10, fp_rate=1)
+
+
+def test_tree_filter_follows_writes():
+    rng = random.Random(16)
+    tree = BPlusTree(8)
+    tree.enable_bloom(0.01)
+    expected = set()
+    for _ in range(20000):
+        key = rng.randrange(5000)
+        if rng.random() < 0.6:
+            tree.insert(key, {})
+            expected.add(key)
+        else:
+            tree.delete(key)
+            expected.discard(key)
+    tree.bulk_load([(key, {}) for key in range(10000, 12000)])
+    expected.update(range(10000, 12000))
+
+    probe = list(range(-100, 13000))
+    assert [key for key in probe if tree.search(key) is not None] == sorted(expected)
+    assert tree.search_many(probe) == [({} if key in expected else None) for key in probe]
+    stats = tree.bloom.stats()
+    assert stats["negatives"] > 0 and stats["observed_fp_rate"] < 0.05
+    tree.enable_bloom(None)
+    assert tree.bloom is None
+
+
+@pytest.mark.parametrize("storage", ["memory", "paged"])
+def test_filter_survives_checkpoint_and_replay(tmp_path, storage):
+    db = open_db(tmp_path, storage=storage, bloom_fp_rate=0.01)
+    db.create_table("t")
+    db.create_table("plain")
+    for key in range(500):
+        db.insert("t", key, {"k": key})
+    assert db.set_bloom_filter("plain", None) == "Bloom filter of table 'plain' removed"
+    db.checkpoint()
+    db.insert("t", 1000, {"k": 1000})
+    db.close()
+
+    db = open_db(tmp_path, storage=storage)
+    assert db.read("t", 1000) == {"k": 1000}
+    assert db.read("t", 250) == {"k": 250}
+    assert db.read("t", 5000).startswith("Error")
+    assert list(db.bloom_stats()) == ["t"]
+    db.close()
+
+
+def test_set_bloom_filter_validates(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t")
+    assert db.set_bloom_filter("missing", 0.01).startswith("Error")
+    assert db.set_bloom_filter("t", 0).startswith("Error")
+    assert db.set_bloom_filter("t", "x").startswith("Error")
+    assert db.bloom_stats() == {}
+    db.close()
+
+
+def test_bloom_endpoints(client):
+    client.post("/create_table", json={"table_name": "t"})
+    client.post("/insert_record", json={"table_name": "t", "key": 1, "data": {}})
+    assert client.post("/bloom_filter", json={"table_name": "t", "fp_rate": 0.05}).status_code == 200
+    import app
+    app.db.read("t", 12345)
+    stats = client.get("/bloom_stats").get_json()["t"]
+    assert stats["fp_rate"] == 0.05 and stats["checks"] == 1
+    assert client.post("/bloom_filter", json={"table_name": "t", "fp_rate": 2}).status_code == 400
+    assert client.post("/bloom_filter", json={"table_name": "t", "fp_rate": None}).status_code == 200
+    assert client.get("/bloom_stats").get_json() == {}
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from db_engine import BPlusTree
+
+
+def check_tree(tree):
+    """Assert the B+ tree invariants and return the keys in leaf order"""
+    keys, leaf_depths = [], set()
+
+    def walk(node, low, high, depth):
+        node_keys = list(node.keys)
+        assert node_keys == sorted(node_keys)
+        assert all((low is None or low <= key) and (high is None or key < high) for key in node_keys)
+        if node is not tree.root:
+            assert tree.order - 1 <= len(node_keys) <= 2 * tree.order - 1
+        if node.leaf:
+            leaf_depths.add(depth)
+            keys.extend(node_keys)
+            return
+        assert len(node.children) == len(node_keys) + 1
+        bounds = [low, *node_keys, high]
+        for i, child in enumerate(node.children):
+            walk(child, bounds[i], bounds[i + 1], depth + 1)
+
+    walk(tree.root, None, None, 1)
+    assert leaf_depths == {tree.height()}
+    return keys
+
+
+@pytest.mark.parametrize("order", [2, 3, 5, 64])
+def test_random_operations_keep_the_tree_valid(order):
+    rng = random.Random(order)
+    tree = BPlusTree(order)
+    expected = {}
+    for step in range(5000):
+        key = rng.randrange(1000)
+        action = rng.random()
+        if action < 0.5:
+            tree.insert(key, {"step": step})
+            expected[key] = {"step": step}
+        elif action < 0.6:
+            assert tree.update(key, {"updated": step}) == (key in expected)
+            if key in expected:
+                expected[key] = {"updated": step}
+        else:
+            assert tree.delete(key) == (key in expected)
+            expected.pop(key, None)
+
+    assert check_tree(tree) == sorted(expected)
+    for key in range(1000):
+        assert tree.search(key) == expected.get(key)
+
+
+def test_insert_replaces_an_existing_key():
+    tree = BPlusTree(2)
+    for key in range(20):
+        tree.insert(key, {"v": 1})
+    tree.insert(7, {"v": 2})
+    assert tree.search(7) == {"v": 2}
+    assert check_tree(tree) == list(range(20))
+
+
+def test_high_fanout_keeps_the_tree_shallow():
+    wide, narrow = BPlusTree(64), BPlusTree(2)
+    for key in range(50000):
+        wide.insert(key, {})
+        narrow.insert(key, {})
+    assert wide.height() <= 3
+    assert narrow.height() > wide.height()
+    assert check_tree(wide) == list(range(50000))
+
+
+def test_delete_down_to_an_empty_tree():
+    tree = BPlusTree(3)
+    keys = list(range(500))
+    for key in keys:
+        tree.insert(key, {})
+    random.Random(1).shuffle(keys)
+    for key in keys:
+        assert tree.delete(key)
+    assert not tree.delete(0)
+    assert tree.root.leaf and len(tree.root.keys) == 0
+
+
+def test_order_must_be_at_least_two():
+    with pytest.raises(ValueError):
+        BPlusTree(1)
@@ -0,0 +1,105 @@
+import json
+import random
+
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = SimpleDB(str(tmp_path / "db"))
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+def node_sizes(tree):
+    """Key counts of the non-root nodes, and the depth of every leaf"""
+    sizes, depths = [], set()
+
+    def walk(node, depth):
+        if node is not tree.root:
+            sizes.append(len(node.keys))
+        if node.leaf:
+            depths.add(depth)
+        else:
+            for child in node.children:
+                walk(child, depth + 1)
+
+    walk(tree.root, 1)
+    return sizes, depths
+
+
+@pytest.mark.parametrize("order", [2, 3, 64])
+@pytest.mark.parametrize("fill_factor", [0.5, 0.8, 1.0])
+def test_bulk_load_builds_a_valid_tree(order, fill_factor):
+    rng = random.Random(order)
+    keys = rng.sample(range(100000), 5000)
+    tree = BPlusTree(order)
+    assert tree.bulk_load([(key, {"k": key}) for key in keys], fill_factor) == 5000
+
+    assert list(tree.range()) == [(key, {"k": key}) for key in sorted(keys)]
+    assert [k for k, _ in tree.range(reverse=True)] == sorted(keys, reverse=True)
+    sizes, depths = node_sizes(tree)
+    assert len(depths) == 1
+    assert all(order - 1 <= size <= 2 * order - 1 for size in sizes)
+    # The loaded tree stays usable for single-key changes
+    tree.insert(-1, {})
+    assert tree.delete(keys[0])
+    assert tree.search(-1) == {}
+
+
+def test_fuller_leaves_make_a_smaller_tree():
+    items = [(key, {}) for key in range(10000)]
+    packed, loose = BPlusTree(8), BPlusTree(8)
+    packed.bulk_load(items, 1.0)
+    loose.bulk_load(items, 0.5)
+    assert len(node_sizes(packed)[0]) < len(node_sizes(loose)[0])
+
+
+def test_bulk_load_merges_with_existing_records():
+    tree = BPlusTree(4)
+    for key in range(0, 100, 2):
+        tree.insert(key, {"old": key})
+    added = tree.bulk_load([(key, {"new": key}) for key in range(50, 150)] + [(200, {"first": 1}), (200, {})])
+    assert added == 76
+    assert tree.search(50) == {"old": 50}
+    assert tree.search(51) == {"new": 51}
+    assert tree.search(200) == {"first": 1}
+    assert [k for k, _ in tree.range()] == sorted({*range(0, 100, 2), *range(50, 150), 200})
+
+
+def test_bulk_load_rejects_bad_fill_factor():
+    with pytest.raises(ValueError):
+        BPlusTree(4).bulk_load([(1, {})], 0)
+    with pytest.raises(ValueError):
+        BPlusTree(4).bulk_load([(1, {})], 1.5)
+
+
+def test_bulk_insert_endpoint_formats(client):
+    client.post("/create_table", json={"table_name": "t"})
+    response = client.post("/bulk_insert?table_name=t", json=[{"key": 1, "data": {"a": 1}}, {"key": 2}])
+    assert response.get_json() == {"message": "2 records inserted, 0 duplicates skipped"}
+
+    body = {"table_name": "t", "records": [{"key": 2, "data": {}}, {"key": 3, "data": {"c": 3}}]}
+    response = client.post("/bulk_insert", json=body)
+    assert response.get_json() == {"message": "1 records inserted, 1 duplicates skipped"}
+
+    lines = "\n".join(json.dumps({"key": key, "data": {"n": key}}) for key in range(4, 10))
+    response = client.post("/bulk_insert?table_name=t", data=lines, content_type="application/x-ndjson")
+    assert response.get_json() == {"message": "6 records inserted, 0 duplicates skipped"}
+
+    body = client.get("/scan", query_string={"table_name": "t"}).get_json()
+    assert [record["key"] for record in body["records"]] == list(range(1, 10))
+    assert body["records"][2] == {"key": 3, "value": {"c": 3}}
+
+
+def test_bulk_insert_endpoint_errors(client):
+    client.post("/create_table", json={"table_name": "t"})
+    assert client.post("/bulk_insert?table_name=t", json=[{"data": {}}]).status_code == 400
+    assert client.post("/bulk_insert?table_name=t", json=[{"key": 1, "data": 5}]).status_code == 400
+    assert client.post("/bulk_insert?table_name=t", json={"records": 5}).status_code == 400
+    assert client.post("/bulk_insert?table_name=missing", json=[]).status_code == 400
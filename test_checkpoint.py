@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+import time
+
+from db_engine import SimpleDB
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+def segments(db):
+    return sorted(name for name in os.listdir(db.db_dir) if name.startswith("wal.log"))
+
+
+def test_checkpoint_then_reopen(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("a", key_type="int")
+    db.create_table("b")
+    for i in range(100):
+        db.insert("a", i, {"i": i})
+    db.insert("b", "x", {"y": 1})
+    assert db.checkpoint_status()["dirty_tables"] == ["a", "b"]
+    db.checkpoint()
+    assert db.checkpoint_status()["dirty_tables"] == []
+    assert segments(db) == ["wal.log"]
+    assert os.path.getsize(db._wal_path()) == 0
+    db.close()
+
+    db = open_db(tmp_path)
+    assert db.startup_report["replayed_records"] == 0
+    assert db.read("a", 42) == {"i": 42}
+    assert db.read("b", "x") == {"y": 1}
+    db.close()
+
+
+def test_checkpoint_writes_only_dirty_tables(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("a")
+    db.create_table("b")
+    db.insert("a", 1, {})
+    db.insert("b", 1, {})
+    db.checkpoint()
+    b_file = os.path.join(db.db_dir, "b.db")
+    written = os.stat(b_file).st_mtime_ns
+
+    db.insert("a", 2, {})
+    assert db.checkpoint_status()["dirty_tables"] == ["a"]
+    db.checkpoint()
+    assert os.stat(b_file).st_mtime_ns == written
+    db.close()
+
+
+def test_log_after_checkpoint_is_replayed(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t")
+    db.insert("t", 1, {"v": 1})
+    db.checkpoint()
+    db.update("t", 1, {"v": 2})
+    db.insert("t", 2, {"v": 2})
+    db.wal._file.flush()  # Crash: no checkpoint, no close
+    db._dir_lock.close()
+
+    db = open_db(tmp_path)
+    assert db.startup_report["replayed_records"] == 2
+    assert db.read("t", 1) == {"v": 2}
+    assert db.read("t", 2) == {"v": 2}
+    db.close()
+
+
+def test_background_checkpoint_after_write_count(tmp_path):
+    db = open_db(tmp_path, checkpoint_writes=50)
+    db.create_table("t")
+    for i in range(60):
+        db.insert("t", i, {})
+    deadline = time.monotonic() + 5
+    while db.checkpoint_status()["writes_since_checkpoint"] >= 50:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    db.close()
+
+    db = open_db(tmp_path)
+    assert db.startup_report["replayed_records"] < 50
+    assert db.count_range("t") == 60
+    db.close()
+
+
+def test_directory_opens_in_one_process_at_a_time(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t")
+    db.insert("t", 1, {})
+    code = "import sys; from db_engine import SimpleDB; SimpleDB(sys.argv[1])"
+    other = subprocess.run([sys.executable, "-c", code, str(tmp_path / "db")], cwd=os.path.dirname(os.path.abspath(__file__)),
+                           capture_output=True, text=True)
+    assert other.returncode != 0 and "already open" in other.stderr
+    db.close()
+
+    db = open_db(tmp_path)  # Closing released the lock
+    assert db.read("t", 1) == {}
+    db.close()
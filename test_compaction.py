@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = open_db(tmp_path)
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+def sparse_tree(order=4, count=5000):
+    tree = BPlusTree(order)
+    for key in range(count):
+        tree.insert(key, {"k": key})
+    keys = list(range(count))
+    random.Random(19).shuffle(keys)
+    for key in keys[: count * 3 // 4]:
+        tree.delete(key)
+    return tree, sorted(keys[count * 3 // 4:])
+
+
+def test_compact_reclaims_nodes_and_keeps_records():
+    tree, remaining = sparse_tree()
+    report = tree.compact(0.9)
+    assert report["nodes_reclaimed"] > 0 and report["nodes_after"] < report["nodes_before"]
+    assert report["leaf_fill_after"] > report["leaf_fill_before"]
+    assert report["height_reclaimed"] == report["height_before"] - report["height_after"] >= 0
+    assert list(tree.range()) == [(key, {"k": key}) for key in remaining]
+    tree.insert(-1, {})
+    assert tree.delete(remaining[0])
+    assert tree.search(-1) == {}
+    with pytest.raises(ValueError):
+        tree.compact(0)
+
+
+def test_compact_does_not_disturb_an_open_snapshot():
+    tree, remaining = sparse_tree()
+    with tree.snapshot() as snapshot:
+        tree.compact()
+        tree.insert(10**6, {})
+        assert [key for key, _ in snapshot.items()] == remaining
+    assert [key for key, _ in tree.range()] == remaining + [10**6]
+
+
+@pytest.mark.parametrize("storage", ["memory", "paged"])
+def test_database_compaction_covers_indexes(tmp_path, storage):
+    db = open_db(tmp_path, storage=storage, order=4)
+    db.create_table("t")
+    db.create_index("t", "tag")
+    for key in range(2000):
+        db.insert("t", key, {"tag": key % 10})
+    for key in range(2000):
+        if key % 5:
+            db.delete("t", key)
+
+    report = db.compact("t", 1.0)
+    assert report["nodes_reclaimed"] > 0
+    assert report["indexes"]["tag"]["nodes_reclaimed"] > 0
+    assert [r["key"] for r in db.query("t", "tag", eq=5)] == list(range(5, 2000, 10))
+    db.checkpoint()
+    db.close()
+
+    db = open_db(tmp_path, storage=storage, order=4)
+    assert [key for key, _ in db.tables["t"].range()] == list(range(0, 2000, 5))
+    assert db.compact("t", 2).startswith("Error")
+    assert db.compact("missing").startswith("Error")
+    db.close()
+
+
+@pytest.mark.parametrize("threshold, compacted", [(0.55, True), (None, False)])
+def test_checkpoints_compact_sparse_tables(tmp_path, threshold, compacted):
+    db = open_db(tmp_path, order=4, compact_threshold=threshold)
+    db.create_table("t")
+    for key in range(3000):
+        db.insert("t", key, {})
+    for key in range(3000):
+        if key % 4:
+            db.delete("t", key)
+    before = db.tables["t"].stats()
+    db.checkpoint()
+    after = db.tables["t"].stats()
+    assert (after["nodes"] < before["nodes"]) == compacted
+    assert after["keys"] == 750
+    db.close()
+
+
+def test_compact_endpoint(client):
+    client.post("/create_table", json={"table_name": "t", "order": 2})
+    for key in range(100):
+        client.post("/insert_record", json={"table_name": "t", "key": key, "data": {}})
+    for key in range(0, 100, 2):
+        client.delete("/delete_record", json={"table_name": "t", "key": key})
+    body = client.post("/compact", json={"table_name": "t"}).get_json()
+    assert body["nodes_after"] <= body["nodes_before"]
+    assert client.post("/compact", json={"table_name": "t", "fill_factor": "x"}).status_code == 400
+    assert client.post("/compact", json={"table_name": "missing"}).status_code == 400
@@ -0,0 +1,79 @@
+import pytest
+
+from db_engine import KEEP, BPlusTree, SimpleDB
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = open_db(tmp_path)
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+def test_put_chooses_at_the_leaf():
+    tree = BPlusTree(2)
+    for key in range(50):
+        assert tree.insert_if_absent(key, {"v": key})
+    assert not tree.insert_if_absent(7, {"v": "dup"})
+    assert tree.search(7) == {"v": 7}
+    assert tree.upsert(7, {"v": "new"}) == {"v": 7}
+    assert tree.upsert(100, {"v": 100}) is None
+    assert tree.put(8, lambda old: KEEP) == {"v": 8}
+    assert tree.put(-1, lambda old: KEEP) is None
+    assert tree.search(-1) is None
+
+    assert tree.compare_and_set(9, lambda old: old["v"] == 9, {"v": "swapped"}) == ({"v": 9}, True)
+    assert tree.compare_and_set(9, lambda old: old["v"] == 9, {"v": "again"}) == ({"v": "swapped"}, False)
+    assert tree.compare_and_set(500, lambda old: True, {}) == (None, False)
+    assert [k for k, _ in tree.range()] == list(range(50)) + [100]
+
+
+def test_upsert_and_compare_and_set(tmp_path):
+    db = open_db(tmp_path, record_cache_size=10)
+    db.create_table("t")
+    db.create_index("t", "tag")
+    assert db.upsert("t", 1, {"tag": "a", "version": 1}) == "Record inserted successfully"
+    assert db.read("t", 1) == {"tag": "a", "version": 1}  # Now cached
+    assert db.upsert("t", 1, {"tag": "b", "version": 2}) == "Record updated successfully"
+    assert db.read("t", 1) == {"tag": "b", "version": 2}
+
+    assert db.compare_and_set("t", 1, {"tag": "c", "version": 3}, expected_version=2) == "Record updated successfully"
+    assert db.compare_and_set("t", 1, {"tag": "d"}, expected_version=2).endswith("changed by another writer")
+    assert db.compare_and_set("t", 1, {"tag": "d"}, expected={"tag": "c", "version": 3}) == "Record updated successfully"
+    assert db.compare_and_set("t", 2, {}, expected={}).endswith("not found")
+    assert db.compare_and_set("t", 1, {}).startswith("Error")
+    assert db.compare_and_set("t", 1, {}, expected={}, expected_version=1).startswith("Error")
+    assert db.read("t", 1) == {"tag": "d"}
+    assert [r["key"] for r in db.query("t", "tag", eq="d")] == [1]
+    assert db.query("t", "tag", eq="b") == []
+
+    assert db.insert("t", 1, {}).startswith("Error")
+    db.close()
+
+    db = open_db(tmp_path)
+    assert db.read("t", 1) == {"tag": "d"}
+    db.close()
+
+
+def test_conditional_write_endpoints(client):
+    client.post("/create_table", json={"table_name": "t"})
+    response = client.put("/upsert_record", json={"table_name": "t", "key": 1, "data": {"version": 1}})
+    assert response.get_json() == {"message": "Record inserted successfully"}
+    response = client.put("/upsert_record", json={"table_name": "t", "key": 1, "data": {"version": 2}})
+    assert response.get_json() == {"message": "Record updated successfully"}
+    assert client.put("/upsert_record", json={"table_name": "t", "key": 1, "data": 5}).status_code == 400
+
+    cas = {"table_name": "t", "key": 1, "data": {"version": 3}, "expected_version": 2}
+    assert client.put("/cas_record", json=cas).status_code == 200
+    assert client.put("/cas_record", json=cas).status_code == 409
+    assert client.put("/cas_record", json={**cas, "key": 2}).status_code == 404
+    assert client.put("/cas_record", json={**cas, "expected": {}}).status_code == 400
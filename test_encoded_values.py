@@ -0,0 +1,81 @@
+import pickle
+import random
+
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+from encoded_values import EncodedValues
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_encoded_values_behave_like_a_list(compress):
+    values = EncodedValues([{"a": 1}, {"b": "é"}], compress=compress)
+    values.insert(1, {"c": [1, 2]})
+    values.append({"d": None})
+    values[0] = {"a": 2}
+    assert list(values) == [{"a": 2}, {"c": [1, 2]}, {"b": "é"}, {"d": None}]
+    assert values.pop(1) == {"c": [1, 2]}
+    assert list(values[1:]) == [{"b": "é"}, {"d": None}]
+    values.extend(EncodedValues([{"e": 5}]))
+
+    copy = pickle.loads(pickle.dumps(values))
+    assert len(copy) == 4
+    assert list(copy) == list(values)
+    copy.append({"f": 6})
+    assert list(pickle.loads(pickle.dumps(copy)))[-1] == {"f": 6}
+
+
+def test_reads_return_fresh_copies():
+    values = EncodedValues([{"tags": ["x"]}])
+    values[0]["tags"].append("changed")
+    assert values[0] == {"tags": ["x"]}
+
+
+def test_compressed_leaves_pickle_smaller():
+    records = [{"name": f"user-{n}", "email": f"user-{n}@example.com", "active": True} for n in range(200)]
+    plain = len(pickle.dumps(EncodedValues(records)))
+    packed = len(pickle.dumps(EncodedValues(records, compress=True)))
+    assert packed < plain / 2
+
+
+@pytest.mark.parametrize("codec", ["json", "json+zlib"])
+def test_encoded_trees_match_a_dict(codec):
+    rng = random.Random(21)
+    tree = BPlusTree(3, value_codec=codec)
+    expected = {}
+    for step in range(4000):
+        key = rng.randrange(800)
+        if rng.random() < 0.6:
+            tree.insert(key, {"step": step})
+            expected[key] = {"step": step}
+        else:
+            assert tree.delete(key) == (expected.pop(key, None) is not None)
+    copy = pickle.loads(pickle.dumps(tree))
+    assert list(copy.range()) == list(tree.range()) == sorted(expected.items())
+    assert tree.search_many(range(800)) == [expected.get(key) for key in range(800)]
+    with pytest.raises(ValueError):
+        BPlusTree(3, value_codec="msgpack")
+
+
+@pytest.mark.parametrize("storage", ["memory", "paged"])
+def test_codec_tables_survive_checkpoint_and_replay(tmp_path, storage):
+    db = open_db(tmp_path, storage=storage, order=4)
+    assert db.create_table("t", value_codec="json+zlib") == "Table 't' created successfully"
+    for key in range(300):
+        db.insert("t", key, {"k": key, "s": "x" * 20})
+    db.checkpoint()
+    db.update("t", 5, {"k": "updated"})
+    db.close()
+
+    db = open_db(tmp_path, storage=storage, order=4)
+    assert db.tables["t"].value_codec == "json+zlib"
+    assert db.read("t", 5) == {"k": "updated"}
+    assert db.read("t", 299) == {"k": 299, "s": "x" * 20}
+    assert db.create_table("u", value_codec="xml").startswith("Error")
+    db.close()
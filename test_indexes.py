@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from db_engine import SimpleDB
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+def keys_of(result):
+    return [record["key"] for record in result]
+
+
+def test_index_follows_every_write(tmp_path):
+    rng = random.Random(4)
+    db = open_db(tmp_path)
+    db.create_table("users")
+    db.bulk_insert("users", [(i, {"age": i % 50}) for i in range(200)])
+    assert db.create_index("users", "age") == "Index on 'age' created successfully"
+    expected = {i: i % 50 for i in range(200)}
+
+    for _ in range(500):
+        key = rng.randrange(300)
+        action = rng.random()
+        if action < 0.4:
+            if db.insert("users", key, {"age": key % 70}).startswith("Record"):
+                expected[key] = key % 70
+        elif action < 0.7:
+            if db.update("users", key, {"age": key % 30, "x": 1}).startswith("Record"):
+                expected[key] = key % 30
+        else:
+            db.delete("users", key)
+            expected.pop(key, None)
+    db.bulk_insert("users", [(i, {"age": 99}) for i in range(300, 320)])
+    expected.update({i: 99 for i in range(300, 320)})
+
+    assert keys_of(db.query("users", "age", eq=10)) == sorted(k for k, age in expected.items() if age == 10)
+    between = db.query("users", "age", gte=20, lt=25)
+    assert keys_of(between) == [k for k, _ in sorted(expected.items(), key=lambda kv: (kv[1], kv[0]))
+                                if 20 <= expected[k] < 25]
+    assert all(20 <= record["value"]["age"] < 25 for record in between)
+    assert len(db.query("users", "age", gt=98, limit=5)) == 5
+    db.close()
+
+
+def test_values_of_different_types_do_not_mix(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t")
+    db.create_index("t", "v")
+    db.insert("t", 1, {"v": 5})
+    db.insert("t", 2, {"v": "5"})
+    db.insert("t", 3, {"v": 5.0})
+    db.insert("t", 4, {"v": None})
+    db.insert("t", 5, {"other": 5})
+    assert keys_of(db.query("t", "v", eq=5)) == [1, 3]
+    assert keys_of(db.query("t", "v", eq="5")) == [2]
+    assert keys_of(db.query("t", "v", gte=0)) == [1, 3]
+    assert db.query("t", "v", gte=0, lt="z").startswith("Error")
+    assert db.query("t", "v", eq=1, gt=0).startswith("Error")
+    db.close()
+
+
+def test_index_errors(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t")
+    assert db.create_index("missing", "v").startswith("Error")
+    assert db.create_index("t", "a/b").startswith("Error")
+    assert db.query("t", "v", eq=1).startswith("Error")
+    db.create_index("t", "v")
+    assert db.create_index("t", "v").startswith("Error")
+    db.close()
+
+
+@pytest.mark.parametrize("storage", ["memory", "paged"])
+def test_index_survives_checkpoint_and_replay(tmp_path, storage):
+    db = open_db(tmp_path, storage=storage)
+    db.create_table("t")
+    db.create_index("t", "tag")
+    for i in range(100):
+        db.insert("t", i, {"tag": "even" if i % 2 == 0 else "odd"})
+    db.checkpoint()
+    db.create_index("t", "n")
+    for i in range(100, 110):
+        db.insert("t", i, {"tag": "even", "n": i})
+    db.close()
+
+    db = open_db(tmp_path, storage=storage)
+    assert len(db.query("t", "tag", eq="even")) == 60
+    assert keys_of(db.query("t", "n", gte=105)) == list(range(105, 110))
+    db.close()
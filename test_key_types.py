@@ -0,0 +1,88 @@
+from array import array
+
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+from prefix_keys import PrefixKeys
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = open_db(tmp_path)
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+@pytest.mark.parametrize("key_type", ["int", "float", "str"])
+def test_typed_trees_use_arrays_or_prefix_keys(key_type):
+    tree = BPlusTree(4, key_type)
+    keys = [str(n).zfill(4) if key_type == "str" else n for n in range(500)]
+    for key in reversed(keys):
+        tree.insert(key, {"k": key})
+    assert [key for key, _ in tree.range()] == keys
+    assert isinstance(tree.root.keys, PrefixKeys if key_type == "str" else array)
+    assert tree.accepts_key(keys[0]) and not tree.accepts_key(None)
+    assert not tree.accepts_key(True)  # Booleans are not numbers here
+
+
+def test_untyped_trees_take_keys_like_the_ones_they_hold():
+    tree = BPlusTree(4)
+    assert tree.accepts_key("a") and tree.accepts_key(1)
+    assert not tree.accepts_key([1]) and not tree.accepts_key(None)
+    tree.insert(1, {})
+    assert tree.accepts_key(2.5) and not tree.accepts_key("a")
+
+
+@pytest.mark.parametrize("storage", ["memory", "paged"])
+def test_mismatched_keys_are_rejected_by_every_operation(tmp_path, storage):
+    db = open_db(tmp_path, storage=storage, order=4)
+    db.create_table("untyped")
+    db.create_table("ints", key_type="int")
+    for key in range(100):
+        db.insert("untyped", key, {"v": key})
+        db.insert("ints", key, {"v": key})
+    db.set_record_cache_size("untyped", 10)
+
+    for table_name, key in [("untyped", "a"), ("untyped", (1, [])), ("ints", "a"), ("ints", 2 ** 64)]:
+        for result in [db.insert(table_name, key, {}), db.upsert(table_name, key, {}),
+                       db.update(table_name, key, {}), db.delete(table_name, key),
+                       db.compare_and_set(table_name, key, {}, expected_version=1),
+                       db.read(table_name, key)]:
+            assert "does not match the key type" in result
+    assert db.multi_put("untyped", [(1, {"v": 0}), ("a", {})])[1].startswith("Error")
+    assert db.read("untyped", 1) == {"v": 0}
+    assert db.count_range("untyped") == db.count_range("ints") == 100
+    db.close()
+
+
+def test_key_errors_are_bad_requests(client):
+    client.post("/create_table", json={"table_name": "t"})
+    client.post("/insert_record", json={"table_name": "t", "key": 1, "data": {}})
+    for method, path in [("post", "/insert_record"), ("put", "/upsert_record"), ("put", "/update_record"),
+                         ("put", "/cas_record"), ("delete", "/delete_record")]:
+        response = getattr(client, method)(path, json={"table_name": "t", "key": [1], "data": {},
+                                                       "expected_version": 1})
+        assert response.status_code == 400, path
+    assert client.delete("/delete_record", json={"table_name": "t", "key": 2}).status_code == 404
+    assert client.get("/read_record", query_string={"table_name": "t", "key": '"x"'}).status_code == 400
+
+
+def test_read_record_finds_string_keys_that_look_like_numbers(client):
+    client.post("/create_table", json={"table_name": "typed", "key_type": "str"})
+    client.post("/create_table", json={"table_name": "untyped"})
+    for table_name in ["typed", "untyped"]:
+        client.post("/insert_record", json={"table_name": table_name, "key": "10", "data": {"v": 1}})
+        response = client.get("/read_record", query_string={"table_name": table_name, "key": "10"})
+        assert response.get_json() == {"record": {"v": 1}}
+        response = client.get("/read_record", query_string={"table_name": table_name, "key": "11"})
+        assert response.status_code == 404
+    assert client.get("/rank", query_string={"table_name": "typed", "key": "10"}).get_json() == {"key": "10", "rank": 0}
@@ -0,0 +1,131 @@
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+from metrics import LATENCY_BUCKETS, Histogram, Metrics, prometheus
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = open_db(tmp_path, metrics=True)
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram()
+    for seconds in (0.00001, 0.0003, 0.0003, 100.0):
+        histogram.observe(seconds)
+    buckets = histogram.to_dict()["buckets"]
+    assert buckets[str(LATENCY_BUCKETS[0])] == 1
+    assert buckets["0.0005"] == 3
+    assert buckets[str(LATENCY_BUCKETS[-1])] == 3
+    assert buckets["+Inf"] == 4
+    assert histogram.to_dict()["count"] == 4
+
+
+def test_timed_counts_error_results_and_exceptions():
+    metrics = Metrics()
+    ok = metrics.timed("read", lambda table, key: {"k": key})
+    failing = metrics.timed("read", lambda table, key: "Error: Record not found")
+    ok("t", 1)
+    failing("t", 2)
+    with pytest.raises(ZeroDivisionError):
+        metrics.timed("read", lambda table: 1 / 0)("t")
+    entry = metrics.to_dict()["ops"]["read"]["t"]
+    assert entry["count"] == 3 and entry["errors"] == 2
+
+
+def test_tree_stats_describe_the_shape():
+    tree = BPlusTree(2)  # At most 3 keys per node
+    tree.bulk_load([(key, {}) for key in range(27)], fill_factor=1.0)
+    stats = tree.stats()
+    assert stats["keys"] == 27 and stats["leaves"] == 9
+    assert stats["height"] == tree.height() and stats["leaf_fill"] == 1.0
+    assert stats["nodes"] > stats["leaves"]
+    assert "splits" not in stats  # No counters without metrics
+
+
+def test_database_counts_ops_and_tree_changes(tmp_path):
+    db = open_db(tmp_path, metrics=True, order=2)
+    db.create_table("t")
+    for key in range(100):
+        db.insert("t", key, {})
+    for key in range(0, 100, 2):
+        db.delete("t", key)
+    db.read("t", 1)
+    db.read("t", 2)
+    db.checkpoint()
+
+    report = db.metrics_report()
+    assert report["enabled"]
+    assert report["ops"]["insert"]["t"]["count"] == 100
+    assert report["ops"]["read"]["t"]["errors"] == 1
+    assert report["ops"]["checkpoint"][""]["count"] == 1
+    table = report["tables"]["t"]
+    assert table["keys"] == 50
+    assert table["splits"] > 0 and table["merges"] + table["borrows"] > 0
+    db.close()
+
+
+def test_table_structure_is_measured_at_checkpoint(tmp_path):
+    db = open_db(tmp_path, metrics=True, order=2)
+    db.create_table("t")
+    for key in range(100):
+        db.insert("t", key, {})
+    assert db.metrics_report()["tables"]["t"]["keys"] == 100
+    for key in range(0, 100, 2):
+        db.delete("t", key)
+    table = db.metrics_report()["tables"]["t"]
+    assert table["keys"] == 100  # Not walked again on every report
+    assert table["merges"] + table["borrows"] > 0  # Counters stay live
+    db.checkpoint()
+    assert db.metrics_report()["tables"]["t"]["keys"] == 50
+    assert 'simpledb_tree_keys{table="t"} 50' in prometheus(db.metrics_report())
+    db.close()
+
+
+@pytest.mark.parametrize("paged_tree_stats", [False, True])
+def test_paged_tables_are_measured_on_request(tmp_path, paged_tree_stats):
+    db = open_db(tmp_path, metrics=True, order=2, storage="paged", paged_tree_stats=paged_tree_stats)
+    db.create_table("t")
+    for key in range(100):
+        db.insert("t", key, {})
+    db.checkpoint()
+    table = db.metrics_report()["tables"]["t"]
+    assert table["splits"] > 0
+    assert table.get("keys") == (100 if paged_tree_stats else None)
+    assert ('simpledb_tree_keys{table="t"}' in prometheus(db.metrics_report())) == paged_tree_stats
+    db.close()
+
+
+def test_metrics_can_be_off(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t")
+    db.insert("t", 1, {})
+    report = db.metrics_report()
+    assert not report["enabled"] and report["ops"] == {}
+    db.close()
+
+
+def test_metrics_endpoint(client):
+    client.post("/create_table", json={"table_name": "t"})
+    client.post("/insert_record", json={"table_name": "t", "key": 1, "data": {}})
+    client.post("/insert_record", json={"table_name": "t", "key": 1, "data": {}})
+
+    body = client.get("/metrics", query_string={"format": "json"}).get_json()
+    assert body["responses"]["/insert_record"] == {"200": 1, "400": 1}
+    assert body["ops"]["insert"]["t"]["errors"] == 1
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert '# TYPE simpledb_op_duration_seconds histogram' in text
+    assert 'simpledb_op_duration_seconds_count{op="insert",table="t"} 2' in text
+    assert 'simpledb_http_responses_total{endpoint="/insert_record",status="400"} 1' in text
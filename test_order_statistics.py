@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = open_db(tmp_path)
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+def brute_aggregate(expected, field, start, end):
+    records = [value for key, value in sorted(expected.items())
+               if (start is None or start <= key) and (end is None or key < end)]
+    numbers = [r[field] for r in records if isinstance(r.get(field), (int, float))]
+    return {
+        "records": len(records),
+        "count": len(numbers),
+        "sum": sum(numbers),
+        "min": min(numbers, default=None),
+        "max": max(numbers, default=None),
+        "avg": sum(numbers) / len(numbers) if numbers else None,
+    }
+
+
+@pytest.mark.parametrize("order", [2, 3, 16])
+def test_counts_follow_every_write(order):
+    rng = random.Random(order)
+    tree = BPlusTree(order)
+    tree.bulk_load([(key, {"n": key}) for key in range(0, 600, 3)])
+    expected = {key: {"n": key} for key in range(0, 600, 3)}
+    for step in range(3000):
+        key = rng.randrange(700)
+        action = rng.random()
+        if action < 0.5:
+            value = {"n": rng.randrange(-50, 50)} if rng.random() < 0.9 else {"other": 1}
+            tree.insert(key, value)
+            expected[key] = value
+        else:
+            tree.delete(key)
+            expected.pop(key, None)
+        if step % 300 == 0:
+            # Aggregating caches summaries that later writes must drop
+            assert tree.aggregate("n") == brute_aggregate(expected, "n", None, None)
+
+    keys = sorted(expected)
+    assert tree.count_range() == len(keys)
+    for _ in range(100):
+        start, end = sorted(rng.randrange(-10, 710) for _ in range(2))
+        assert tree.count_range(start, end) == sum(start <= key < end for key in keys)
+        assert tree.aggregate("n", start, end) == brute_aggregate(expected, "n", start, end)
+        assert tree.rank(start) == sum(key < start for key in keys)
+    for k in range(len(keys)):
+        assert tree.select(k) == (keys[k], expected[keys[k]])
+    assert tree.select(len(keys)) is None and tree.select(-1) is None
+
+
+@pytest.mark.parametrize("storage", ["memory", "paged"])
+def test_database_order_statistics(tmp_path, storage):
+    db = open_db(tmp_path, storage=storage, order=4)
+    db.create_table("orders")
+    for key in range(1, 301):
+        db.insert("orders", key, {"total": key * 2, "flag": True})
+    db.checkpoint()
+    db.delete("orders", 150)
+    db.close()
+
+    db = open_db(tmp_path, storage=storage, order=4)
+    assert db.count_range("orders", 100, 200) == 99
+    assert db.rank("orders", 151) == 149
+    assert db.select("orders", 0) == {"key": 1, "value": {"total": 2, "flag": True}}
+    assert db.select("orders", 149) == {"key": 151, "value": {"total": 302, "flag": True}}
+    result = db.aggregate("orders", "total", 1, 11)
+    assert result == {"records": 10, "count": 10, "sum": 110, "min": 2, "max": 20, "avg": 11.0}
+    assert db.aggregate("orders", "flag")["count"] == 0  # Booleans are not numbers
+    assert db.select("orders", 299).startswith("Error")
+    assert db.select("orders", "x").startswith("Error")
+    assert db.rank("orders", "x").startswith("Error")
+    assert db.count_range("missing").startswith("Error")
+    db.close()
+
+
+def test_order_statistic_endpoints(client):
+    client.post("/create_table", json={"table_name": "t"})
+    for key in range(10):
+        client.post("/insert_record", json={"table_name": "t", "key": key, "data": {"v": key}})
+    assert client.get("/aggregate", query_string={"table_name": "t", "start": 2, "end": 5}).get_json() == {"records": 3}
+    body = client.get("/aggregate", query_string={"table_name": "t", "field": "v", "start": 5}).get_json()
+    assert body["sum"] == 35 and body["max"] == 9
+    assert client.get("/rank", query_string={"table_name": "t", "key": 4}).get_json() == {"key": 4, "rank": 4}
+    assert client.get("/select", query_string={"table_name": "t", "k": 9}).get_json() == {"key": 9, "value": {"v": 9}}
+    assert client.get("/select", query_string={"table_name": "t", "k": 10}).status_code == 400
+    assert client.get("/aggregate", query_string={"table_name": "missing"}).status_code == 400
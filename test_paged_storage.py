@@ -0,0 +1,151 @@
+import os
+import random
+
+import pytest
+
+from db_engine import SimpleDB
+from paged_storage import PagedBPlusTree
+
+
+def crash(tree):
+    """Push the unsaved nodes into the page file and abandon the tree, as if
+    the process died between checkpoints"""
+    tree._write_back(tree.pool.take_dirty())
+    tree.pager._mm.flush()
+    tree.pager.close()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "t.pages")
+
+
+def test_reopen_reads_checkpointed_tree(path):
+    tree = PagedBPlusTree(path, 4, "int", cache_pages=4)
+    tree.bulk_load([(i, {"i": i}) for i in range(1000)])
+    tree.checkpoint()
+    tree.close()
+
+    tree = PagedBPlusTree.open(path, 4)
+    assert tree.search(500) == {"i": 500}
+    assert [k for k, _ in tree.range(10, 15)] == [10, 11, 12, 13, 14]
+    assert tree._subtree_count(tree.root) == 1000
+    tree.close()
+
+
+def test_crash_rolls_back_to_checkpoint(path):
+    tree = PagedBPlusTree(path, 4, "int", cache_pages=4)
+    for i in range(300):
+        tree.insert(i, {"i": i})
+    tree.checkpoint()
+    saved = list(tree.range())
+
+    for i in range(0, 300, 2):
+        tree.delete(i)
+    for i in range(300, 600):
+        tree.insert(i, {"i": i})
+    tree.update(1, {"i": -1})
+    assert os.path.exists(path + ".journal")
+    crash(tree)
+
+    tree = PagedBPlusTree.open(path, 4)
+    assert not os.path.exists(path + ".journal")
+    assert list(tree.range()) == saved
+    tree.insert(1000, {"i": 1000})
+    tree.checkpoint()
+    tree.close()
+
+    tree = PagedBPlusTree.open(path, 4)
+    assert tree._subtree_count(tree.root) == 301
+    tree.close()
+
+
+def test_crash_after_bulk_load_rolls_back(path):
+    tree = PagedBPlusTree(path, 8, "str", cache_pages=4, value_codec="json")
+    tree.bulk_load([(f"k{i:05d}", {"i": i}) for i in range(2000)])
+    tree.checkpoint()
+    saved = list(tree.range())
+
+    # Streaming rewrites every page of the old tree
+    tree.bulk_load([(f"k{i:05d}", {"new": i}) for i in range(1000, 4000)])
+    tree.compact(1.0)
+    crash(tree)
+
+    tree = PagedBPlusTree.open(path, 4)
+    assert list(tree.range()) == saved
+    tree.close()
+
+
+def test_bulk_load_merges_and_keeps_existing(path):
+    rng = random.Random(7)
+    tree = PagedBPlusTree(path, 4, "int", cache_pages=4)
+    expected = {}
+    for batch_no in range(4):
+        batch = [(rng.randrange(3000), {"batch": batch_no}) for _ in range(1500)]
+        added = 0
+        for key, value in batch:
+            if key not in expected:
+                expected[key] = value
+                added += 1
+        assert tree.bulk_load(batch, rng.choice([0.5, 1.0])) == added
+        for key in rng.sample(sorted(expected), 100):
+            tree.delete(key)
+            del expected[key]
+        assert list(tree.range()) == sorted(expected.items())
+    assert tree._subtree_count(tree.root) == len(expected)
+
+
+def test_bulk_load_rejects_bad_fill_factor(path):
+    tree = PagedBPlusTree(path, 4, cache_pages=4)
+    with pytest.raises(ValueError):
+        tree.bulk_load([(1, {})], 0)
+
+
+def test_bloom_filter_grows_with_the_table(path):
+    tree = PagedBPlusTree(path, 8, "int", cache_pages=4)
+    tree.enable_bloom(0.01)
+    for i in range(5000):
+        tree.insert(i, {"i": i})
+    # Rebuilt between checkpoints once it outgrew its initial capacity
+    assert tree.bloom.capacity >= 5000
+    assert all(tree.search(i) == {"i": i} for i in range(0, 5000, 7))
+    tree.checkpoint()
+    tree.close()
+
+    tree = PagedBPlusTree.open(path, 4)
+    assert tree.bloom is not None
+    assert all(tree.search(i) == {"i": i} for i in range(0, 5000, 7))
+    false_positives = sum(tree.bloom.might_contain(i) for i in range(10000, 20000))
+    assert false_positives < 500
+    tree.close()
+
+
+def test_snapshot_is_not_supported(path):
+    tree = PagedBPlusTree(path, 4, cache_pages=4)
+    with pytest.raises(TypeError):
+        tree.snapshot()
+
+
+def test_paged_db_replays_log_over_rolled_back_pages(tmp_path):
+    def open_db():
+        return SimpleDB(str(tmp_path / "db"), storage="paged", cache_pages=8,
+                        checkpoint_interval=None, checkpoint_writes=None)
+
+    db = open_db()
+    db.create_table("t", key_type="int")
+    db.bulk_insert("t", [(i, {"i": i}) for i in range(500)])
+    db.checkpoint()
+    for i in range(500, 800):
+        db.insert("t", i, {"i": i})
+    db.delete("t", 3)
+    db.update("t", 4, {"i": -4})
+    db.wal._file.flush()
+    crash(db.tables["t"])
+    db._dir_lock.close()
+
+    db = open_db()
+    assert db.read("t", 3).startswith("Error")
+    assert db.read("t", 4) == {"i": -4}
+    assert db.read("t", 799) == {"i": 799}
+    assert db.count_range("t") == 799
+    db.close()
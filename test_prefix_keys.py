@@ -0,0 +1,106 @@
+import pickle
+import random
+from bisect import bisect_left
+
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+from prefix_keys import PrefixKeys
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+def long_key(n):
+    return f"tenant-{n % 3}:user:{n:08d}"
+
+
+def internal_keys(tree):
+    keys, level = [], [tree.root]
+    while level and not level[0].leaf:
+        keys.extend(key for node in level for key in node.keys)
+        level = [child for node in level for child in node.children]
+    return keys
+
+
+def test_prefix_keys_behave_like_a_list():
+    rng = random.Random(20)
+    keys, model = PrefixKeys(), []
+    for _ in range(2000):
+        key = rng.choice(["acct:", "acct:eu:", "b"]) + str(rng.randrange(1000))
+        action = rng.random()
+        if action < 0.5:
+            i = bisect_left(model, key)
+            keys.insert(i, key)
+            model.insert(i, key)
+        elif action < 0.7 and model:
+            i = rng.randrange(len(model))
+            assert keys.pop(i) == model.pop(i)
+        elif model:
+            i = rng.randrange(len(model))
+            keys[i] = model[i] = model[i]
+        assert list(keys) == model and len(keys) == len(model)
+    assert list(keys[10:20]) == model[10:20]
+    assert list(pickle.loads(pickle.dumps(keys))) == model
+
+
+def test_prefix_is_stored_once():
+    keys = PrefixKeys(["order:2024:0001", "order:2024:0002"])
+    assert keys.prefix == "order:2024:000" and keys.suffixes == ["1", "2"]
+    keys.append("other")
+    assert keys.prefix == "o" and keys[0] == "order:2024:0001"
+    assert keys[:2].prefix == "order:2024:000"  # A slice tightens its prefix again
+    with pytest.raises(TypeError):
+        keys.append(1)
+
+
+@pytest.mark.parametrize("key_type", ["str", None])
+def test_string_trees_match_a_dict(key_type):
+    rng = random.Random(5)
+    tree = BPlusTree(3, key_type)
+    expected = {}
+    for _ in range(5000):
+        key = long_key(rng.randrange(2000))
+        if rng.random() < 0.6:
+            tree.insert(key, {"k": key})
+            expected[key] = {"k": key}
+        else:
+            assert tree.delete(key) == (expected.pop(key, None) is not None)
+    assert list(tree.range()) == sorted(expected.items())
+    for n in range(2000):
+        assert tree.search(long_key(n)) == expected.get(long_key(n))
+    # Separators are cut to the first differing character, never whole keys
+    separators = internal_keys(tree)
+    assert separators and sum(map(len, separators)) < sum(len(long_key(0)) for _ in separators)
+
+
+def test_bulk_load_uses_short_separators():
+    tree = BPlusTree(4, "str")
+    keys = [f"{n:05d}:" + "x" * 40 for n in range(3000)]  # Neighbours differ early
+    tree.bulk_load([(key, {}) for key in keys])
+    assert [key for key, _ in tree.range()] == keys
+    assert all(len(key) <= 5 for key in internal_keys(tree))
+    assert tree.search(keys[1234]) == {}
+    assert tree.search(keys[1234] + "x") is None
+
+
+@pytest.mark.parametrize("storage", ["memory", "paged"])
+def test_str_tables_persist(tmp_path, storage):
+    db = open_db(tmp_path, storage=storage, order=4)
+    assert db.create_table("t", key_type="str") == "Table 't' created successfully"
+    for n in range(500):
+        db.insert("t", long_key(n), {"n": n})
+    assert db.insert("t", 5, {}).startswith("Error")
+    db.checkpoint()
+    db.delete("t", long_key(7))
+    db.close()
+
+    db = open_db(tmp_path, storage=storage, order=4)
+    assert db.read("t", long_key(8)) == {"n": 8}
+    assert db.read("t", long_key(7)).startswith("Error")
+    assert len(list(db.tables["t"].range())) == 499
+    assert db.create_table("u", key_type="bytes").startswith("Error")
+    db.close()
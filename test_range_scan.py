@@ -0,0 +1,92 @@
+import pickle
+import random
+
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = SimpleDB(str(tmp_path / "db"))
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+@pytest.mark.parametrize("order", [2, 3, 64])
+def test_range_matches_sorted_keys(order):
+    rng = random.Random(order)
+    tree = BPlusTree(order)
+    expected = {}
+    for _ in range(3000):
+        key = rng.randrange(1000)
+        if rng.random() < 0.6:
+            tree.insert(key, {"k": key})
+            expected[key] = {"k": key}
+        else:
+            tree.delete(key)
+            expected.pop(key, None)
+    keys = sorted(expected)
+
+    assert list(tree.range()) == [(key, expected[key]) for key in keys]
+    assert [k for k, _ in tree.range(reverse=True)] == keys[::-1]
+    for _ in range(50):
+        start, end = sorted(rng.randrange(-10, 1010) for _ in range(2))
+        limit = rng.choice([None, 1, 7])
+        inside = [key for key in keys if start <= key < end]
+        assert [k for k, _ in tree.range(start, end, limit=limit)] == inside[:limit]
+        assert [k for k, _ in tree.range(start, end, reverse=True, limit=limit)] == inside[::-1][:limit]
+    assert list(tree.range(limit=0)) == []
+
+
+def test_range_is_lazy():
+    tree = BPlusTree(4)
+    for key in range(100):
+        tree.insert(key, {})
+    rows = tree.range(10)
+    assert next(rows) == (10, {})
+    assert next(rows) == (11, {})
+
+
+def test_leaf_chain_survives_pickling():
+    tree = BPlusTree(3)
+    for key in range(200):
+        tree.insert(key, {"k": key})
+    for key in range(0, 200, 3):
+        tree.delete(key)
+    copy = pickle.loads(pickle.dumps(tree))
+    assert list(copy.range()) == list(tree.range())
+    assert list(copy.range(50, 60, reverse=True)) == list(tree.range(50, 60, reverse=True))
+
+
+def test_scan_pages_through_a_table(client):
+    client.post("/create_table", json={"table_name": "t"})
+    for key in range(25):
+        client.post("/insert_record", json={"table_name": "t", "key": key, "data": {"k": key}})
+
+    for reverse, expected in (("false", list(range(25))), ("true", list(range(24, -1, -1)))):
+        seen, cursor = [], None
+        while True:
+            args = {"table_name": "t", "limit": 10, "reverse": reverse}
+            if cursor:
+                args["cursor"] = cursor
+            body = client.get("/scan", query_string=args).get_json()
+            seen.extend(record["key"] for record in body["records"])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == expected
+
+    body = client.get("/scan", query_string={"table_name": "t", "start": 5, "end": 9}).get_json()
+    assert [record["key"] for record in body["records"]] == [5, 6, 7, 8]
+    assert body["next_cursor"] is None
+
+
+def test_scan_rejects_bad_parameters(client):
+    client.post("/create_table", json={"table_name": "t"})
+    assert client.get("/scan", query_string={"table_name": "missing"}).status_code == 404
+    assert client.get("/scan", query_string={"table_name": "t", "limit": 0}).status_code == 400
+    assert client.get("/scan", query_string={"table_name": "t", "limit": "x"}).status_code == 400
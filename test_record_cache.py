@@ -0,0 +1,124 @@
+import os
+
+import pytest
+
+from db_engine import RecordCache, SimpleDB
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = open_db(tmp_path)
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+def test_cache_evicts_the_least_recently_used_entry():
+    cache = RecordCache(2)
+    cache.put(1, {"a": 1}, cache.token())
+    cache.put(2, {"b": 2}, cache.token())
+    assert cache.get(1) == {"a": 1}  # 2 is now the oldest
+    cache.put(3, {"c": 3}, cache.token())
+    assert cache.get(2) is None
+    assert cache.get(3) == {"c": 3}
+    assert cache.stats() == {"capacity": 2, "size": 2, "hits": 2, "misses": 1,
+                             "evictions": 1, "hit_rate": 2 / 3}
+    cache.resize(1)
+    assert cache.stats()["size"] == 1
+    with pytest.raises(ValueError):
+        RecordCache(0)
+
+
+def test_a_fill_raced_by_an_invalidation_is_dropped():
+    cache = RecordCache(4)
+    token = cache.token()
+    cache.invalidate(1)  # A writer changed some key after the reader looked it up
+    cache.put(1, {"old": True}, token)
+    assert cache.get(1) is None
+    cache.put([1], {}, cache.token())  # Unhashable keys are skipped, not an error
+    assert cache.get([1]) is None
+
+
+def test_reads_are_served_from_the_cache_and_writes_invalidate(tmp_path):
+    db = open_db(tmp_path, record_cache_size=10)
+    db.create_table("t")
+    for key in range(5):
+        db.insert("t", key, {"v": key})
+    assert db.read("t", 1) == {"v": 1}
+    assert db.read("t", 1) == {"v": 1}
+    assert db.record_cache_stats()["t"]["hits"] == 1
+
+    db.read("t", 2)
+    db.read("t", 3)
+    db.read("t", 4)
+    db.update("t", 1, {"v": "new"})
+    db.delete("t", 2)
+    db.multi_put("t", [(3, {"v": "put"})])
+    db.multi_delete("t", [4])
+    assert db.read("t", 1) == {"v": "new"}
+    assert db.read("t", 2).startswith("Error")
+    assert db.read("t", 3) == {"v": "put"}
+    assert db.read("t", 4).startswith("Error")
+    db.close()
+
+
+def test_cache_sizes_per_table(tmp_path):
+    db = open_db(tmp_path, record_cache_sizes={"hot": 2})
+    db.create_table("hot")
+    db.create_table("cold")
+    db.insert("hot", 1, {})
+    db.insert("cold", 1, {})
+    db.read("hot", 1)
+    db.read("cold", 1)
+    assert list(db.record_cache_stats()) == ["hot"]
+
+    assert db.set_record_cache_size("cold", 5) == "Record cache of table 'cold' set to 5 records"
+    db.read("cold", 1)
+    assert db.record_cache_stats()["cold"]["capacity"] == 5
+    db.set_record_cache_size("hot", 0)
+    assert list(db.record_cache_stats()) == ["cold"]
+    assert db.set_record_cache_size("cold", -1).startswith("Error")
+    assert db.set_record_cache_size("missing", 1).startswith("Error")
+    db.close()
+
+
+def test_drop_table_is_replayed(tmp_path):
+    db = open_db(tmp_path, record_cache_size=10)
+    db.create_table("t")
+    db.insert("t", 1, {})
+    db.read("t", 1)
+    db.save_db()
+    assert os.path.exists(tmp_path / "db_data" / "t.db")
+    assert db.drop_table("t") == "Table 't' dropped successfully"
+    assert not os.path.exists(tmp_path / "db_data" / "t.db")
+    assert db.record_cache_stats() == {}
+    assert db.read("t", 1).startswith("Error")
+    assert db.drop_table("t").startswith("Error")
+    db.close()
+
+    db = open_db(tmp_path)
+    assert "t" not in db.tables
+    db.create_table("t")
+    assert db.read("t", 1).startswith("Error")
+    db.close()
+
+
+def test_cache_endpoints(client):
+    client.post("/create_table", json={"table_name": "t"})
+    client.post("/insert_record", json={"table_name": "t", "key": 1, "data": {}})
+    assert client.post("/record_cache", json={"table_name": "t", "size": 3}).status_code == 200
+    import app
+    app.db.read("t", 1)
+    app.db.read("t", 1)
+    assert client.get("/cache_stats").get_json()["t"]["hits"] == 1
+    assert client.post("/record_cache", json={"table_name": "t", "size": "x"}).status_code == 400
+    assert client.delete("/drop_table", json={"table_name": "t"}).status_code == 200
+    assert client.delete("/drop_table", json={"table_name": "t"}).status_code == 404
@@ -0,0 +1,177 @@
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import replication
+from db_engine import SimpleDB
+from replication import ReplicaDB, ReplicationServer
+
+KEY = b"test key"
+
+
+@pytest.fixture(autouse=True)
+def fast_intervals(monkeypatch):
+    monkeypatch.setattr(replication, "HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setattr(replication, "RECONNECT_INTERVAL", 0.05)
+
+
+@pytest.fixture
+def primary(tmp_path):
+    db = SimpleDB(str(tmp_path / "primary"), wal=False, checkpoint_interval=None, checkpoint_writes=None)
+    yield db
+    db.close()
+
+
+def start_replica(tmp_path, server, name="replica"):
+    replica = ReplicaDB(str(tmp_path / name), server.address, KEY)
+    assert replica.wait_synced(10)
+    return replica
+
+
+def wait_caught_up(replica, server, timeout=10):
+    deadline = time.monotonic() + timeout
+    while replica.applied_seq < server.log.last_seq or replica.session != server.log.session:
+        assert time.monotonic() < deadline, replica.replication_status()
+        time.sleep(0.01)
+
+
+def assert_same_tables(replica, db):
+    assert sorted(replica.tables) == sorted(db.tables)
+    for table_name in db.tables:
+        assert list(replica.tables[table_name].range()) == list(db.tables[table_name].range())
+
+
+def test_replica_copies_and_follows(tmp_path, primary):
+    primary.create_table("users", key_type="int", value_codec="json")
+    primary.bulk_insert("users", [(i, {"v": i}) for i in range(3000)])
+    primary.create_index("users", "v")
+    server = ReplicationServer(primary, ("127.0.0.1", 0), KEY)
+    replica = start_replica(tmp_path, server)
+    try:
+        assert replica.read("users", 2999) == {"v": 2999}
+        assert "v" in replica.tables["users"].indexes
+
+        primary.create_table("events")
+        for i in range(200):
+            primary.insert("events", i, {"i": i})
+        primary.update("users", 1, {"v": -1})
+        primary.delete("users", 2)
+        primary.drop_table("events")
+        wait_caught_up(replica, server)
+        assert_same_tables(replica, primary)
+        assert replica.query("users", "v", eq=-1) == [{"key": 1, "value": {"v": -1}}]
+        deadline = time.monotonic() + 10
+        while server.status()["replicas"][0]["acked_seq"] < server.log.last_seq:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        replica.close()
+        server.close()
+
+
+def test_replica_copies_paged_tables(tmp_path):
+    db = SimpleDB(str(tmp_path / "primary"), storage="paged", cache_pages=8, wal=False,
+                  checkpoint_interval=None, checkpoint_writes=None)
+    db.create_table("t", key_type="int")
+    db.bulk_insert("t", [(i, {"v": i}) for i in range(5000)])
+    server = ReplicationServer(db, ("127.0.0.1", 0), KEY)
+    replica = start_replica(tmp_path, server)
+    try:
+        db.delete("t", 0)
+        wait_caught_up(replica, server)
+        assert_same_tables(replica, db)
+    finally:
+        replica.close()
+        server.close()
+        db.close()
+
+
+def test_subscribe_resumes_within_backlog(primary):
+    primary.create_table("t")
+    server = ReplicationServer(primary, ("127.0.0.1", 0), KEY, backlog=10)
+    try:
+        for i in range(5):
+            primary.insert("t", i, {})
+        with Client(server.address, authkey=KEY) as conn:
+            conn.send(("subscribe", server.log.session, 2))
+            kind, last_seq, batch = conn.recv()
+            assert kind == "records"
+            assert [seq for seq, _, _ in batch] == [3, 4, 5]
+            assert last_seq == 5
+            assert conn.recv()[0] == "heartbeat"
+    finally:
+        server.close()
+
+
+@pytest.mark.parametrize("stale", ["session", "seq"])
+def test_subscribe_outside_backlog_gets_snapshot(primary, stale):
+    primary.create_table("t")
+    server = ReplicationServer(primary, ("127.0.0.1", 0), KEY, backlog=10)
+    try:
+        for i in range(50):
+            primary.insert("t", i, {})
+        session = "0" * 16 if stale == "session" else server.log.session
+        with Client(server.address, authkey=KEY) as conn:
+            conn.send(("subscribe", session, 1))
+            assert conn.recv() == ("reset", server.log.session)
+    finally:
+        server.close()
+
+
+def test_replica_resyncs_after_primary_restart(tmp_path, primary):
+    primary.create_table("t")
+    primary.insert("t", "a", {"n": 1})
+    server = ReplicationServer(primary, ("127.0.0.1", 0), KEY)
+    replica = start_replica(tmp_path, server)
+    try:
+        old_session = server.log.session
+        server.close()
+        primary.insert("t", "b", {"n": 2})  # Not logged for any replica
+
+        server = ReplicationServer(primary, server.address, KEY)
+        primary.insert("t", "c", {"n": 3})
+        wait_caught_up(replica, server)
+        assert replica.session != old_session
+        assert_same_tables(replica, primary)
+    finally:
+        replica.close()
+        server.close()
+
+
+def test_authkey_is_required(primary):
+    with pytest.raises(ValueError):
+        ReplicationServer(primary, ("127.0.0.1", 0), b"")
+    with pytest.raises(ValueError):
+        ReplicaDB("unused", ("127.0.0.1", 1), None)
+
+    server = ReplicationServer(primary, ("127.0.0.1", 0), KEY)
+    try:
+        with pytest.raises(AuthenticationError):
+            Client(server.address, authkey=b"wrong key")
+    finally:
+        server.close()
+
+
+@pytest.mark.parametrize("env", [{"SIMPLEDB_REPLICATION_LISTEN": "127.0.0.1:0"}, {"SIMPLEDB_SHARDS": "2"}])
+def test_app_starts_its_database_once(tmp_path, env):
+    # Runs app.py as the server would, stopping in app.run(); with the
+    # reloader on, a second process would bind the listener again
+    code = ("import flask, runpy, sys\n"
+            "flask.Flask.run = lambda self, **options: print('reloader', options.get('use_reloader'))\n"
+            "app = runpy.run_path(sys.argv[1], run_name='__main__')\n"
+            "if app['replication'] is not None:\n"
+            "    print('listening', app['replication'].address[1] > 0)\n"
+            "    app['replication'].close()\n"
+            "app['db'].close()\n")
+    repo = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-c", code, os.path.join(repo, "app.py")],
+                            cwd=tmp_path, env={**os.environ, **env, "PYTHONPATH": repo, "SIMPLEDB_REPLICATION_KEY": "test key"},
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert "reloader False" in result.stdout
+    assert ("listening True" in result.stdout) == ("SIMPLEDB_REPLICATION_LISTEN" in env)
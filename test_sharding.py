@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from sharding import Partitioner, ShardedDB
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ShardedDB(str(tmp_path / "db"), 2, order=4, checkpoint_interval=None, checkpoint_writes=None)
+    yield db
+    db.close()
+
+
+def test_range_partitioner():
+    partitioner = Partitioner(3, [10, 20])
+    assert [partitioner.shard_for(k) for k in (-1, 9, 10, 19, 20, 99)] == [0, 0, 1, 1, 2, 2]
+    assert partitioner.shards_for_range(None, None) == [0, 1, 2]
+    assert partitioner.shards_for_range(12, 15) == [1]
+    assert partitioner.shards_for_range(5, 15) == [0, 1]
+    with pytest.raises(TypeError):
+        partitioner.shard_for("a")
+
+
+def test_hash_partitioner_is_stable():
+    partitioner = Partitioner(4)
+    assert [partitioner.shard_for(k) for k in range(100)] == [Partitioner(4).shard_for(k) for k in range(100)]
+    # Keys that compare equal go to the same shard
+    assert partitioner.shard_for(1) == partitioner.shard_for(1.0)
+    assert len({partitioner.shard_for(k) for k in range(100)}) == 4
+
+
+@pytest.mark.parametrize("boundaries", [None, [150]])
+def test_routing_and_ordered_scans(db, boundaries):
+    assert db.create_table("t", boundaries=boundaries) == "Table 't' created successfully"
+    rng = random.Random(5)
+    expected = {}
+    for _ in range(1000):
+        key = rng.randrange(300)
+        if rng.random() < 0.7:
+            db.upsert("t", key, {"k": key})
+            expected[key] = {"k": key}
+        else:
+            db.delete("t", key)
+            expected.pop(key, None)
+
+    table = db.tables.get("t")
+    assert list(table.range()) == sorted(expected.items())
+    assert list(table.range(100, 200, reverse=True)) == \
+        sorted(((k, v) for k, v in expected.items() if 100 <= k < 200), reverse=True)
+    assert list(table.range(limit=5)) == sorted(expected.items())[:5]
+    assert db.count_range("t") == len(expected)
+    keys = [-1, *sorted(expected)[:10]]
+    assert db.multi_get("t", keys) == [expected.get(k, f"Error: Record with key '{k}' not found") for k in keys]
+
+
+def test_range_partitioned_keys_stay_on_their_shard(db):
+    db.create_table("t", boundaries=["m"])
+    for word in ("apple", "kiwi", "mango", "zebra"):
+        db.insert("t", word, {"w": word})
+    first, second = (shard.call("count_range", "t") for shard in db.shards)
+    assert (first, second) == (2, 2)
+    assert db.read("t", 1).startswith("Error")
+
+
+def test_create_table_validates_boundaries(db):
+    assert db.create_table("t", boundaries=[1, 2]).startswith("Error")
+    assert db.create_table("t", boundaries="m").startswith("Error")
+    assert "t" not in db.partitions
+    assert db.create_table("t", boundaries=[1]) == "Table 't' created successfully"
+    assert db.create_table("t").startswith("Error")
+
+
+def test_catalog_survives_restart(tmp_path):
+    name = str(tmp_path / "db")
+    db = ShardedDB(name, 2, checkpoint_interval=None, checkpoint_writes=None)
+    db.create_table("t", boundaries=[100])
+    db.bulk_insert("t", [(i, {"i": i}) for i in range(200)])
+    db.save_db()
+    db.close()
+
+    db = ShardedDB(name, 2, checkpoint_interval=None, checkpoint_writes=None)
+    try:
+        assert db.partitions["t"].boundaries == [100]
+        assert db.read("t", 150) == {"i": 150}
+        assert db.count_range("t", 50, 150) == 100
+    finally:
+        db.close()
+    with pytest.raises(ValueError):
+        ShardedDB(name, 3)
@@ -0,0 +1,128 @@
+import random
+import threading
+
+import pytest
+
+from db_engine import BPlusTree, SimpleDB
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+@pytest.mark.parametrize("order", [2, 3, 64])
+def test_snapshot_survives_writes(order):
+    rng = random.Random(order)
+    tree = BPlusTree(order)
+    for i in range(1000):
+        tree.insert(i, {"v": i})
+    snapshot = tree.snapshot()
+    frozen = dict(snapshot.range())
+
+    for _ in range(3000):
+        key = rng.randrange(1500)
+        if rng.random() < 0.5:
+            tree.insert(key, {"v": -key})
+        elif rng.random() < 0.5:
+            tree.update(key, {"u": key})
+        else:
+            tree.delete(key)
+    tree.bulk_load([(rng.randrange(3000), {"b": 1}) for _ in range(200)])
+    tree.compact(1.0)
+
+    assert dict(snapshot.range()) == frozen
+    assert [k for k, _ in snapshot.range(10, 20, reverse=True, limit=3)] == [19, 18, 17]
+    assert snapshot.search(500) == {"v": 500}
+    assert snapshot.search(1200) is None
+
+
+def test_released_snapshot_stops_copying():
+    tree = BPlusTree(3)
+    for i in range(100):
+        tree.insert(i, {})
+    with tree.snapshot() as snapshot:
+        tree.insert(100, {})
+        assert tree._shared_epoch >= 0
+    with pytest.raises(ValueError):
+        snapshot.search(1)
+    tree.insert(101, {})
+    assert tree._shared_epoch == -1
+
+
+def test_db_snapshot_is_consistent_across_tables(tmp_path):
+    db = open_db(tmp_path, order=3)
+    db.create_table("a")
+    db.create_table("b")
+    for i in range(100):
+        db.insert("a", i, {"i": i})
+        db.insert("b", i, {"i": i})
+
+    with db.snapshot() as snapshot:
+        for i in range(100):
+            db.delete("a", i)
+            db.update("b", i, {"i": -i})
+        assert snapshot.read("a", 5) == {"i": 5}
+        assert snapshot.read("b", 5) == {"i": 5}
+        assert snapshot.read("c", 5).startswith("Error")
+        assert len(list(snapshot.tables["a"].range())) == 100
+    assert db.read("a", 5).startswith("Error")
+    assert db.read("b", 5) == {"i": -5}
+    assert db.snapshot(["missing"]).startswith("Error")
+    db.close()
+
+
+def test_db_snapshot_leaves_out_paged_tables(tmp_path):
+    db = open_db(tmp_path, storage="paged", cache_pages=8)
+    db.create_table("t")
+    db.insert("t", 1, {})
+    snapshot = db.snapshot()
+    assert snapshot.tables == {}
+    assert db.snapshot(["t"]).startswith("Error")
+    db.close()
+
+
+def test_db_snapshot_does_not_load_tables(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("a")
+    db.create_table("b")
+    db.insert("a", 1, {})
+    db.insert("b", 1, {})
+    db.checkpoint()  # Otherwise replaying the log would load both
+    db.close()
+
+    db = open_db(tmp_path)
+    db.read("a", 1)
+    with db.snapshot() as snapshot:
+        assert list(snapshot.tables) == ["a"]
+        assert not db.tables.is_loaded("b")
+    with db.snapshot(["b"]) as snapshot:
+        assert snapshot.read("b", 1) == {}
+    db.close()
+
+
+def test_snapshot_scan_during_concurrent_writes():
+    tree = BPlusTree(4, "int")
+    tree.bulk_load([(i, {"v": 0}) for i in range(5000)])
+    snapshot = tree.snapshot()
+    stop = threading.Event()
+
+    def writer():
+        rng = random.Random(1)
+        while not stop.is_set():
+            key = rng.randrange(6000)
+            if rng.random() < 0.5:
+                tree.insert(key, {"v": 1})
+            else:
+                tree.delete(key)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(5):
+            assert list(snapshot.range()) == [(i, {"v": 0}) for i in range(5000)]
+    finally:
+        stop.set()
+        thread.join()
+    snapshot.release()
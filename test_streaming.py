@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from db_engine import SimpleDB
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Importing app opens its database in the working directory
+    import app
+    db = SimpleDB(str(tmp_path / "db"))
+    monkeypatch.setattr(app, "db", db)
+    yield app.app.test_client()
+    db.close()
+
+
+def fill(client, count):
+    client.post("/create_table", json={"table_name": "t"})
+    for key in range(count):
+        client.post("/insert_record", json={"table_name": "t", "key": key, "data": {"k": key}})
+
+
+def test_read_records_streams_every_record(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, "STREAM_CHUNK_BYTES", 100)
+    fill(client, 50)
+    response = client.get("/read_records", query_string={"table_name": "t"})
+    assert response.is_streamed
+    parts = [part.decode() if isinstance(part, bytes) else part for part in response.response]
+    assert len(parts) > 1
+    body = json.loads("".join(parts))
+    assert body == {"records": [{"key": key, "value": {"k": key}} for key in range(50)]}
+
+
+def test_export_formats(client):
+    fill(client, 30)
+    response = client.get("/export", query_string={"table_name": "t"})
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == [{"key": key, "value": {"k": key}} for key in range(30)]
+
+    response = client.get("/export", query_string={"table_name": "t", "format": "JSON"})
+    assert response.mimetype == "application/json"
+    assert [row["key"] for row in json.loads(response.get_data())] == list(range(30))
+
+
+def test_export_of_an_empty_table(client):
+    client.post("/create_table", json={"table_name": "t"})
+    assert client.get("/export", query_string={"table_name": "t"}).get_data() == b""
+    assert json.loads(client.get("/export", query_string={"table_name": "t", "format": "json"}).get_data()) == []
+    assert json.loads(client.get("/read_records", query_string={"table_name": "t"}).get_data()) == {"records": []}
+
+
+def test_export_is_a_consistent_snapshot(client):
+    import app
+    fill(client, 10)
+    response = client.get("/export", query_string={"table_name": "t"})
+    parts = iter(response.response)
+    # Writes made while the stream is open do not show up in it
+    app.db.insert("t", 100, {"k": 100})
+    app.db.delete("t", 0)
+    rows = [json.loads(line) for line in "".join(
+        part.decode() if isinstance(part, bytes) else part for part in parts).splitlines()]
+    assert [row["key"] for row in rows] == list(range(10))
+
+
+def test_streaming_errors(client):
+    fill(client, 1)
+    assert client.get("/read_records", query_string={"table_name": "missing"}).status_code == 404
+    assert client.get("/export", query_string={"table_name": "missing"}).status_code == 404
+    assert client.get("/export", query_string={"table_name": "t", "format": "xml"}).status_code == 400
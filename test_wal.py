@@ -0,0 +1,107 @@
+import os
+import struct
+import zlib
+
+import pytest
+
+from db_engine import SimpleDB
+from wal import WriteAheadLog
+
+
+def open_db(tmp_path, **options):
+    options.setdefault("checkpoint_interval", None)
+    options.setdefault("checkpoint_writes", None)
+    return SimpleDB(str(tmp_path / "db"), **options)
+
+
+def crash(db):
+    """Abandon a database the way a killed process would: no checkpoint,
+    no close, only what already reached the log file survives"""
+    db.wal._file.flush()
+    db._dir_lock.close()  # The directory lock dies with the process
+
+
+def test_replay_after_crash(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("users", key_type="int")
+    for i in range(100):
+        db.insert("users", i, {"n": i})
+    db.update("users", 5, {"n": -5})
+    db.delete("users", 6)
+    db.bulk_insert("users", [(i, {"n": i}) for i in range(100, 150)])
+    db.create_index("users", "n")
+    crash(db)
+
+    db = open_db(tmp_path)
+    assert db.startup_report["replayed_records"] == 105
+    assert db.read("users", 5) == {"n": -5}
+    assert db.read("users", 6).startswith("Error")
+    assert db.read("users", 149) == {"n": 149}
+    assert db.count_range("users") == 149
+    assert db.query("users", "n", eq=-5) == [{"key": 5, "value": {"n": -5}}]
+    db.close()
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    db = open_db(tmp_path)
+    db.create_table("t")
+    db.insert("t", "a", {"v": 1})
+    db.insert("t", "b", {"v": 2})
+    crash(db)
+    path = db._wal_path()
+    intact = os.path.getsize(path)
+    with open(path, "ab") as f:
+        # A frame whose payload was cut short by the crash
+        f.write(struct.pack("<II", 100, 0) + b"partial")
+
+    db = open_db(tmp_path)
+    assert db.read("t", "a") == {"v": 1}
+    assert db.read("t", "b") == {"v": 2}
+    assert os.path.getsize(path) == intact  # New records must not follow the torn one
+    db.insert("t", "c", {"v": 3})
+    crash(db)
+
+    db = open_db(tmp_path)
+    assert db.read("t", "c") == {"v": 3}
+    db.close()
+
+
+def test_replay_stops_at_bad_checksum(tmp_path):
+    path = str(tmp_path / "wal.log")
+    wal = WriteAheadLog(path, "off")
+    wal.append(("insert", "t", 1, {}))
+    wal.close()
+    payload = b"not the checksummed bytes"
+    with open(path, "ab") as f:
+        f.write(struct.pack("<II", len(payload), zlib.crc32(payload) ^ 1) + payload)
+    wal = WriteAheadLog(path, "off")
+    wal.append(("insert", "t", 2, {}))
+    wal.close()
+    assert list(WriteAheadLog.replay(path)) == [("insert", "t", 1, {}), ("insert", "t", 2, {})]
+
+
+def test_unknown_sync_policy(tmp_path):
+    with pytest.raises(ValueError):
+        WriteAheadLog(str(tmp_path / "wal.log"), "sometimes")
+
+
+def test_group_commit_from_threads(tmp_path):
+    import threading
+
+    db = open_db(tmp_path)
+    db.create_table("t", key_type="int")
+
+    def writer(base):
+        for i in range(base, base + 200):
+            db.insert("t", i, {"i": i})
+
+    threads = [threading.Thread(target=writer, args=(n * 1000,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    crash(db)
+
+    db = open_db(tmp_path)
+    assert db.count_range("t") == 800
+    db.close()
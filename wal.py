@@ -0,0 +1,177 @@
+from typing import Any, Iterator, List, Optional, Tuple
+import glob
+import os
+import pickle
+import struct
+import threading
+import zlib
+
+# How a committed record is made durable:
+#   "always"   - fsync before the write returns; concurrent writers share
+#                one fsync (group commit)
+#   "interval" - a background thread fsyncs every sync_interval seconds,
+#                so at most that much acknowledged work can be lost
+#   "off"      - records are handed to the OS and never explicitly synced
+SYNC_POLICIES = ("always", "interval", "off")
+
+# Each record is framed as <length><crc32><pickled payload>, so a torn
+# write at the end of the file is detected and ignored on replay.
+_HEADER = struct.Struct("<II")
+
+class WriteAheadLog:
+    def __init__(self, path: str, sync_policy: str = "always", sync_interval: float = 0.05):
+        if sync_policy not in SYNC_POLICIES:
+            raise ValueError(f"Unknown sync policy '{sync_policy}'")
+        self.path = path
+        self.sync_policy = sync_policy
+        self.sync_interval = sync_interval
+        valid_length = 0
+        for valid_length, _ in self._scan(path):
+            pass
+        if os.path.exists(path) and os.path.getsize(path) > valid_length:
+            # Drop a torn tail so new records are not appended after it
+            with open(path, "r+b") as f:
+                f.truncate(valid_length)
+        self._file = open(path, "ab")
+        self._lock = threading.Lock()  # Serializes appends
+        self._sync_cond = threading.Condition()
+        self._written_lsn = 0  # Last record handed to the file
+        self._synced_lsn = 0  # Last record known to be on disk
+        self._syncing = False
+        self._closed = False
+        self._flusher = None
+        if sync_policy == "interval":
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def append(self, record: Tuple[Any, ...], commit: bool = True) -> int:
+        """Append a record and return its log sequence number
+
+        With commit=False the caller must call commit(lsn) before
+        acknowledging the write, which lets it release its own locks first.
+        """
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        frame = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            self._file.write(frame)
+            self._file.flush()
+            self._written_lsn += 1
+            lsn = self._written_lsn
+        if commit:
+            self.commit(lsn)
+        return lsn
+
+    def commit(self, lsn: int):
+        """Make lsn as durable as the sync policy requires"""
+        if self.sync_policy == "always":
+            self.sync(lsn)
+
+    def sync(self, lsn: Optional[int] = None):
+        """Block until every record up to lsn is on disk
+
+        The first waiting thread becomes the leader and issues a single
+        fsync covering everything written so far; the others wait for it.
+        """
+        with self._sync_cond:
+            if lsn is None:
+                lsn = self._written_lsn
+            while self._synced_lsn < lsn:
+                if not self._syncing:
+                    self._syncing = True
+                    break
+                self._sync_cond.wait()
+            else:
+                return
+
+        target = 0
+        try:
+            with self._lock:
+                target = self._written_lsn
+                self._file.flush()
+                # A duplicate descriptor stays valid if rotate() closes the file
+                fd = os.dup(self._file.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        finally:
+            with self._sync_cond:
+                self._syncing = False
+                self._synced_lsn = max(self._synced_lsn, target)
+                self._sync_cond.notify_all()
+
+    def _flush_loop(self):
+        while not self._closed:
+            with self._sync_cond:
+                self._sync_cond.wait(self.sync_interval)
+            if not self._closed and self._synced_lsn < self._written_lsn:
+                self.sync()
+
+    def rotate(self) -> str:
+        """Seal the current file as a numbered segment and start a new one
+
+        Returns the sealed segment's path, which can be removed once a
+        checkpoint covers everything written before the rotation.
+        """
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            segments = self._segments(self.path)
+            seq = int(segments[-1].rsplit(".", 1)[1]) + 1 if segments else 1
+            sealed = f"{self.path}.{seq}"
+            os.replace(self.path, sealed)
+            self._file = open(self.path, "ab")
+            with self._sync_cond:
+                self._synced_lsn = self._written_lsn
+        return sealed
+
+    @staticmethod
+    def remove_segments(upto: str):
+        """Delete a sealed segment and every segment sealed before it"""
+        path, seq = upto.rsplit(".", 1)
+        for segment in WriteAheadLog._segments(path):
+            if int(segment.rsplit(".", 1)[1]) <= int(seq):
+                os.remove(segment)
+
+    @staticmethod
+    def _segments(path: str) -> List[str]:
+        """Sealed segments of a log, oldest first"""
+        segments = [p for p in glob.glob(glob.escape(path) + ".*") if p.rsplit(".", 1)[1].isdigit()]
+        return sorted(segments, key=lambda p: int(p.rsplit(".", 1)[1]))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._sync_cond:
+            self._sync_cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self.sync_policy != "off":
+            self.sync()
+        self._file.close()
+
+    @staticmethod
+    def replay(path: str) -> Iterator[Tuple[Any, ...]]:
+        """Yield the intact records of the sealed segments and the
+        current log file in order"""
+        for segment in WriteAheadLog._segments(path) + [path]:
+            for _, record in WriteAheadLog._scan(segment):
+                yield record
+
+    @staticmethod
+    def _scan(path: str) -> Iterator[Tuple[int, Tuple[Any, ...]]]:
+        """Yield (end offset, record) for each intact record"""
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                length, checksum = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    return  # Torn tail from a crash mid-append
+                yield f.tell(), pickle.loads(payload)